@@ -0,0 +1,4 @@
+"""
+Shared helpers for the Python API handlers
+Underscore-prefixed so Vercel does not deploy it as a function
+"""
@@ -0,0 +1,77 @@
+"""
+Local verification of Supabase access tokens
+Supabase signs its JWTs with the project's JWT secret (HS256), so a handler
+that has the secret can check a token and read its claims without a
+round-trip to the database.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Dict, Optional
+
+CLOCK_SKEW_SECONDS = 30
+
+
+class InvalidToken(Exception):
+    """Malformed, forged or expired token"""
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+
+def bearer_token(authorization: str) -> Optional[str]:
+    """Token from an 'Authorization: Bearer <token>' header value"""
+    scheme, _, token = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
+
+def verify_jwt(token: str, secret: str, now: Optional[float] = None) -> Dict:
+    """Claims of an HS256 token signed with `secret`; raises InvalidToken"""
+    try:
+        header_b64, payload_b64, signature_b64 = token.split('.')
+        header = json.loads(_b64decode(header_b64))
+        signature = _b64decode(signature_b64)
+    except ValueError:
+        raise InvalidToken('Malformed token')
+    if not isinstance(header, dict):
+        raise InvalidToken('Malformed token')
+
+    # Only HS256 - never trust the header to pick a weaker algorithm
+    if header.get('alg') != 'HS256':
+        raise InvalidToken(f"Unsupported token algorithm: {header.get('alg')}")
+    expected = hmac.new(secret.encode(), f'{header_b64}.{payload_b64}'.encode(), hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise InvalidToken('Bad token signature')
+
+    try:
+        claims = json.loads(_b64decode(payload_b64))
+    except ValueError:
+        raise InvalidToken('Malformed token')
+    if not isinstance(claims, dict):
+        raise InvalidToken('Malformed token')
+
+    now = time.time() if now is None else now
+    try:
+        if 'exp' in claims and now > float(claims['exp']) + CLOCK_SKEW_SECONDS:
+            raise InvalidToken('Token expired')
+        if 'nbf' in claims and now < float(claims['nbf']) - CLOCK_SKEW_SECONDS:
+            raise InvalidToken('Token not yet valid')
+    except (TypeError, ValueError):
+        raise InvalidToken('Malformed token')
+    return claims
+
+
+def claim(claims: Dict, path: str):
+    """Nested claim by dotted path, e.g. 'app_metadata.role'; None if absent"""
+    value = claims
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
@@ -0,0 +1,146 @@
+"""
+JSON response encoding shared by the Python API handlers
+Compact JSON (orjson when it is installed, else the stdlib without the
+default whitespace), sparse responses from a `fields` spec, and gzip or
+brotli compression negotiated from Accept-Encoding once a body is big
+enough to be worth it.
+"""
+
+import gzip
+import json
+import os
+from typing import Dict, List, Optional, Tuple, Union
+
+from . import tracing
+
+try:
+    import orjson
+except ImportError:  # stdlib json is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Bodies smaller than this go out as is: below ~1 KB the compressed size
+# barely differs and the Content-Encoding round trip is not worth it
+COMPRESS_MIN_BYTES = int(os.environ.get('API_COMPRESS_MIN_BYTES', 1024))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # brotli's 11 is far slower for a few percent
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+# Top-level keys a sparse response always keeps
+ENVELOPE_FIELDS = ('success', 'error')
+
+
+def _default(value):
+    # ISO 8601 for dates either way; orjson only calls this for other types
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def dumps(data) -> bytes:
+    """Compact JSON; datetimes become ISO strings, other unknown types str()"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=_default)
+        except TypeError:
+            pass  # e.g. non-string keys or ints past 64 bits, which the stdlib takes
+    return json.dumps(data, separators=(',', ':'), default=_default).encode()
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Best content coding the client accepts: br (if available), then gzip"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for coding in (('br',) if brotli is not None else ()) + ('gzip',):
+        if accepted.get(coding, accepted.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _include(value, paths: List[List[str]]):
+    if isinstance(value, list):
+        return [_include(item, paths) for item in value]
+    if not isinstance(value, dict):
+        return value
+    nested: Dict[str, List[List[str]]] = {}
+    for head, *rest in paths:
+        nested.setdefault(head, []).append(rest)
+    kept = {}
+    for key, rests in nested.items():
+        if key in value:
+            # 'a' and 'a.b' together: 'a' wins and is kept whole
+            kept[key] = value[key] if [] in rests else _include(value[key], rests)
+    return kept
+
+
+def _exclude(value, path: List[str]):
+    if isinstance(value, list):
+        return [_exclude(item, path) for item in value]
+    if not isinstance(value, dict) or path[0] not in value:
+        return value
+    if len(path) == 1:
+        return {key: item for key, item in value.items() if key != path[0]}
+    return {**value, path[0]: _exclude(value[path[0]], path[1:])}
+
+
+def select_fields(data, spec: Union[str, List[str], None]):
+    """Sparse copy of a response; `data` itself is never modified
+
+    spec lists dotted paths, comma-separated or as a list. Plain paths keep
+    only those fields, '-' paths drop them. Paths pass through lists, so
+    'matches.vehicle' is the vehicle of every match, e.g.
+    '-trip,-matches.vehicle,-matches.breakdown'.
+    """
+    if isinstance(spec, str):
+        spec = spec.split(',')
+    include, exclude = [], []
+    for field in spec or []:
+        field = str(field).strip()
+        if field.startswith('-'):
+            exclude.append(field[1:].split('.'))
+        elif field:
+            include.append(field.split('.'))
+
+    if include and isinstance(data, dict):
+        envelope = {key: data[key] for key in ENVELOPE_FIELDS if key in data}
+        data = {**envelope, **_include(data, include)}
+    for path in exclude:
+        data = _exclude(data, path)
+    return data
+
+
+def encode_response(data, accept_encoding: str = '',
+                    fields: Union[str, List[str], None] = None) -> Tuple[bytes, Dict[str, str]]:
+    """Body and content headers for a JSON response: sparse, compact, compressed"""
+    with tracing.span('encode') as span:
+        if fields:
+            data = select_fields(data, fields)
+        body = dumps(data)
+        headers = {'Vary': 'Accept-Encoding'}
+        coding = negotiate(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+        if coding:
+            span.set(bytes_raw=len(body), encoding=coding)
+            body = compress(body, coding)
+            headers['Content-Encoding'] = coding
+        span.set(bytes=len(body))
+    return body, headers
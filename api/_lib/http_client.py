@@ -0,0 +1,223 @@
+"""
+Pooled HTTP client shared by the Python API handlers
+Keeps keep-alive connections open per host so warm invocations skip the
+TCP+TLS handshake that urllib.request.urlopen pays on every call.
+"""
+
+import http.client
+import json
+import os
+import threading
+import urllib.parse
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from . import tracing
+
+DEFAULT_TIMEOUT = 10  # seconds
+MAX_IDLE_CONNECTIONS = 8  # per host
+
+# Upstream hosts (overridable so benchmarks can point at local stubs)
+GEMINI_BASE_URL = os.environ.get('GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com')
+GOOGLE_PLACES_BASE_URL = os.environ.get('GOOGLE_PLACES_BASE_URL', 'https://maps.googleapis.com')
+YELP_BASE_URL = os.environ.get('YELP_BASE_URL', 'https://api.yelp.com')
+
+# Errors that mean a reused keep-alive socket was closed by the server
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class HTTPError(Exception):
+    """Non-2xx response from an upstream service"""
+
+    def __init__(self, status: int, reason: str, body: bytes = b''):
+        super().__init__(f"HTTP {status}: {reason}")
+        self.code = status
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+
+class HTTPResponse:
+    """Fully-read upstream response"""
+
+    def __init__(self, status: int, headers: http.client.HTTPMessage, body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body.decode()) if self.body else None
+
+
+class PooledHTTPClient:
+    """Thread-safe keep-alive connection pool for a single host"""
+
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None,
+                 timeout: float = DEFAULT_TIMEOUT, max_idle: int = MAX_IDLE_CONNECTIONS,
+                 name: str = ''):
+        parsed = urllib.parse.urlparse(base_url)
+        self.scheme = parsed.scheme or 'https'
+        self.host = parsed.hostname or ''
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip('/')
+        self.default_headers = dict(headers or {})
+        self.timeout = timeout
+        self.max_idle = max_idle
+        # Upstream calls are traced as 'http.<name>' spans
+        self.span_name = f"http.{name or self.host}"
+
+        self._idle = []
+        self._lock = threading.Lock()
+
+        # Counters for benchmarks / diagnostics
+        self.connections_opened = 0
+        self.requests_sent = 0
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        conn_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        with self._lock:
+            self.connections_opened += 1
+        return conn_class(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        """Return (connection, reused)"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _release(self, conn: http.client.HTTPConnection, reusable: bool):
+        if reusable:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    return
+        conn.close()
+
+    def _open(self, method: str, path: str, params: Optional[Dict] = None,
+              json_body=None, data: Optional[bytes] = None,
+              headers: Optional[Dict[str, str]] = None):
+        """Send a request and return (connection, response) with the body unread"""
+        url = self.base_path + path
+        if params:
+            url += ('&' if '?' in url else '?') + urllib.parse.urlencode(params)
+
+        all_headers = dict(self.default_headers)
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            all_headers['Content-Type'] = 'application/json'
+        if headers:
+            all_headers.update(headers)
+
+        conn, reused = self._acquire()
+        try:
+            try:
+                response = self._send(conn, method, url, data, all_headers)
+            except _STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # Idle socket was closed server-side - retry once on a fresh one
+                conn.close()
+                conn = self._new_connection()
+                response = self._send(conn, method, url, data, all_headers)
+        except Exception:
+            conn.close()
+            raise
+        return conn, response
+
+    def request(self, method: str, path: str, **kwargs) -> HTTPResponse:
+        """Send a request and read the whole response; raises HTTPError on non-2xx"""
+        with tracing.span(self.span_name, method=method, path=tracing.url_path(path)) as span:
+            conn, response = self._open(method, path, **kwargs)
+            try:
+                body = response.read()
+            except Exception:
+                conn.close()
+                raise
+            span.set(status=response.status, bytes=len(body))
+
+        self._release(conn, not response.will_close)
+
+        if response.status >= 400:
+            raise HTTPError(response.status, response.reason, body)
+        return HTTPResponse(response.status, response.msg, body)
+
+    @contextmanager
+    def stream(self, method: str, path: str, **kwargs):
+        """Yield the raw http.client response so the body can be read incrementally
+
+        The connection goes back to the pool only if the body was fully read.
+        """
+        with tracing.span(self.span_name, method=method, path=tracing.url_path(path)) as span:
+            conn, response = self._open(method, path, **kwargs)
+            span.set(status=response.status)
+            if response.status >= 400:
+                body = response.read()
+                self._release(conn, not response.will_close)
+                raise HTTPError(response.status, response.reason, body)
+            try:
+                yield response
+            except BaseException:
+                conn.close()
+                raise
+        self._release(conn, response.isclosed() and not response.will_close)
+
+    def _send(self, conn, method, url, data, headers) -> http.client.HTTPResponse:
+        with self._lock:
+            self.requests_sent += 1
+        conn.request(method, url, body=data, headers=headers)
+        return conn.getresponse()
+
+    def get(self, path: str, **kwargs) -> HTTPResponse:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> HTTPResponse:
+        return self.request('POST', path, **kwargs)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+# Clients live at module level so warm invocations reuse open connections
+_clients: Dict[tuple, PooledHTTPClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url: str, headers: Optional[Dict[str, str]] = None,
+               timeout: float = DEFAULT_TIMEOUT, name: str = '') -> PooledHTTPClient:
+    """Return the process-wide client for this base URL + default headers"""
+    key = (base_url, tuple(sorted((headers or {}).items())), timeout)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = PooledHTTPClient(base_url, headers, timeout, name=name)
+            _clients[key] = client
+        return client
+
+
+def supabase_client(url: str, api_key: str) -> PooledHTTPClient:
+    """PostgREST client with apikey/Authorization set once"""
+    return get_client(url, {
+        'apikey': api_key,
+        'Authorization': f'Bearer {api_key}',
+    }, name='supabase')
+
+
+def gemini_client() -> PooledHTTPClient:
+    return get_client(GEMINI_BASE_URL, timeout=30, name='gemini')
+
+
+def google_places_client() -> PooledHTTPClient:
+    return get_client(GOOGLE_PLACES_BASE_URL, name='places')
+
+
+def yelp_client(api_key: str) -> PooledHTTPClient:
+    return get_client(YELP_BASE_URL, {'Authorization': f'Bearer {api_key}'}, name='yelp')
@@ -0,0 +1,312 @@
+"""
+Event ingestion for the analytics API
+normalize_event() checks one tracked event against the `events` table's
+column types and constraints and shapes it into a row. EventBuffer holds
+rows in memory and writes them with one bulk insert once it has
+max_events of them or the oldest is max_age seconds old. A failed write
+is retried with backoff. If it still fails, the rows go to a local
+JSON-lines spill file, which the next flush replays. A bulk insert that
+is rejected outright (e.g. a user_id with no account) is split in halves
+until only the offending rows are left out.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .http_client import HTTPError
+
+# Optional varchar columns of the events table and their lengths
+EVENT_FIELDS = {
+    'page': 255,
+    'utm_source': 100,
+    'utm_campaign': 100,
+    'country': 2,
+    'region': 100,
+}
+EVENT_TYPE_LENGTH = 50
+DEVICE_CLASSES = ('mobile', 'desktop', 'tablet')
+MAX_PAYLOAD_BYTES = 16 * 1024
+
+
+def _uuid(value, field: str) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a UUID string')
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        raise ValueError(f'{field} must be a UUID') from None
+
+
+def normalize_event(data: Dict) -> Dict:
+    """The events row for one tracked event; raises ValueError if invalid"""
+    if not isinstance(data, dict):
+        raise ValueError('event must be an object')
+    user_id = data.get('user_id')
+    event_type = data.get('event_type')
+    if not user_id or not event_type:
+        raise ValueError('user_id and event_type required')
+    user_id = _uuid(user_id, 'user_id')
+    if not isinstance(event_type, str) or len(event_type) > EVENT_TYPE_LENGTH:
+        raise ValueError(f'event_type must be a string of at most {EVENT_TYPE_LENGTH} characters')
+
+    ts = data.get('ts') or datetime.now().isoformat()
+    if not isinstance(ts, str):
+        raise ValueError('ts must be an ISO 8601 string')
+    try:
+        datetime.fromisoformat(ts.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('ts must be an ISO 8601 timestamp') from None
+
+    payload = data.get('payload', {})
+    if not isinstance(payload, dict):
+        raise ValueError('payload must be an object')
+    payload = json.dumps(payload)
+    if len(payload) > MAX_PAYLOAD_BYTES:
+        raise ValueError(f'payload larger than {MAX_PAYLOAD_BYTES} bytes')
+
+    # Every row gets the same keys: PostgREST bulk inserts require it
+    event = {'user_id': user_id, 'event_type': event_type, 'ts': ts}
+    session_id = data.get('session_id')
+    event['session_id'] = None if session_id is None else _uuid(session_id, 'session_id')
+    for field, length in EVENT_FIELDS.items():
+        value = data.get(field)
+        if value is not None and (not isinstance(value, str) or len(value) > length):
+            raise ValueError(f'{field} must be a string of at most {length} characters')
+        event[field] = value
+    device_class = data.get('device_class')
+    if device_class is not None and device_class not in DEVICE_CLASSES:
+        raise ValueError(f"device_class must be one of: {', '.join(DEVICE_CLASSES)}")
+    event['device_class'] = device_class
+    event['payload'] = payload
+    return event
+
+
+def _permanent(error: Exception) -> bool:
+    """Rejected rows (bad data, constraint violations) will fail every retry"""
+    return isinstance(error, HTTPError) and 400 <= error.code < 500 and error.code not in (408, 429)
+
+
+def rejection_message(error: Exception) -> str:
+    """PostgREST's own message for a refused insert, if it sent one"""
+    if isinstance(error, HTTPError):
+        try:
+            return json.loads(error.body)['message']
+        except (ValueError, TypeError, KeyError):
+            pass
+    return str(error)
+
+
+def insert_isolating(insert: Callable[[List[Dict]], None], rows: List[Dict]
+                     ) -> Tuple[List[Tuple[int, Exception]], List[int]]:
+    """Insert rows, splitting a permanently rejected insert in halves so only bad rows are lost
+
+    Returns (rejected, unwritten): (position, error) for each row the
+    database refuses, and positions left unwritten by a transient error
+    partway through the split (the rest of the rows are written). A
+    transient error on the first, whole insert is raised instead, since
+    nothing has been written yet.
+    """
+    try:
+        insert(rows)
+        return [], []
+    except Exception as e:
+        if not _permanent(e):
+            raise
+        if len(rows) == 1:
+            return [(0, e)], []
+
+    rejected, unwritten = [], []
+    middle = len(rows) // 2
+    for offset, half in ((0, rows[:middle]), (middle, rows[middle:])):
+        try:
+            half_rejected, half_unwritten = insert_isolating(insert, half)
+        except Exception:
+            half_rejected, half_unwritten = [], list(range(len(half)))
+        rejected.extend((offset + position, error) for position, error in half_rejected)
+        unwritten.extend(offset + position for position in half_unwritten)
+    return rejected, unwritten
+
+
+class EventBuffer:
+    """Thread-safe in-memory event queue flushed in bulk by a background thread
+
+    Rows are acknowledged before they are written, so an instance that is
+    frozen or killed with rows still queued loses them; close() at exit
+    flushes what it can.
+    """
+
+    def __init__(self, insert: Callable[[List[Dict]], None], max_events: int = 500,
+                 max_age: float = 2.0, retries: int = 3, backoff: float = 0.2,
+                 spill_path: str = ''):
+        self.insert = insert
+        self.max_events = max_events
+        self.max_age = max_age
+        self.retries = retries
+        self.backoff = backoff
+        self.spill_path = spill_path
+
+        self._rows: List[Dict] = []
+        self._oldest = 0.0  # monotonic time the oldest queued row arrived
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one flush (and spill file writer) at a time
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        self.accepted = 0
+        self.written = 0
+        self.flushes = 0
+        self.retried = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+
+    def add(self, rows: List[Dict]) -> int:
+        """Queue rows for the next flush; returns how many are queued"""
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            self.accepted += len(rows)
+            queued = len(self._rows)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='event-buffer', daemon=True)
+                self._thread.start()
+        if queued >= self.max_events:
+            self._wake.set()
+        return queued
+
+    def _run(self):
+        while not self._closed:
+            with self._lock:
+                due = self._oldest + self.max_age - time.monotonic() if self._rows else self.max_age
+            if due > 0 and self._wake.wait(due):
+                self._wake.clear()
+            try:
+                self.flush(only_due=True)
+            except Exception as e:
+                print(f"Error flushing events: {e}")
+
+    def flush(self, only_due: bool = False) -> int:
+        """Write queued and spilled rows now; returns how many were written
+
+        only_due: skip the flush unless the buffer is full or old enough.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if only_due and len(self._rows) < self.max_events and (
+                    not self._rows or time.monotonic() - self._oldest < self.max_age
+                ):
+                    return 0
+                rows, self._rows = self._rows, []
+
+            spilled = self._read_spill()
+            # Upstream still down: leave the backlog for a later flush
+            replayed, still_spilled = self._write_all(spilled, stop_on_failure=True)
+            written, failed = self._write_all(rows)
+            if spilled or failed:
+                self._write_spill(still_spilled + failed)
+
+            self.flushes += 1
+            self.written += replayed + written
+            self.replayed += replayed
+            if self.spill_path:
+                self.spilled += len(failed)
+            return replayed + written
+
+    def _write_all(self, rows: List[Dict], stop_on_failure: bool = False):
+        """Insert rows in max_events chunks; returns (rows written, rows failed)"""
+        written, failed = 0, []
+        for start in range(0, len(rows), self.max_events):
+            chunk = rows[start:start + self.max_events]
+            if failed and stop_on_failure:
+                failed.extend(chunk)
+                continue
+            count, unwritten = self._write(chunk)
+            written += count
+            failed.extend(unwritten)
+        return written, failed
+
+    def _write(self, chunk: List[Dict]) -> Tuple[int, List[Dict]]:
+        """Insert with retries; returns (rows written, rows to spill)
+
+        Rows the database refuses are dropped one by one rather than with
+        the whole chunk, which may hold other clients' events.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                rejected, unwritten = insert_isolating(self.insert, chunk)
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"Error inserting {len(chunk)} events after {attempt + 1} attempts: {e}")
+                    return 0, chunk
+                self.retried += 1
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            if rejected:
+                print(f"Error inserting events, dropping {len(rejected)} rejected rows: "
+                      f"{rejection_message(rejected[0][1])}")
+            self.dropped += len(rejected)
+            return len(chunk) - len(rejected) - len(unwritten), [chunk[i] for i in unwritten]
+        return 0, chunk
+
+    def _read_spill(self) -> List[Dict]:
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return []
+        rows = []
+        try:
+            with open(self.spill_path) as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        pass  # hand-edited or truncated file: keep the rest
+        except OSError as e:
+            print(f"Error reading event spill file: {e}")
+        return rows
+
+    def _write_spill(self, rows: List[Dict]):
+        """Replace the spill file with the rows still unwritten"""
+        if not self.spill_path:
+            self.dropped += len(rows)
+            return
+        if not rows:
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
+            return
+        try:
+            temp_path = f'{self.spill_path}.tmp'
+            with open(temp_path, 'w') as f:
+                for row in rows:
+                    f.write(json.dumps(row) + '\n')
+            os.replace(temp_path, self.spill_path)
+        except OSError as e:
+            print(f"Error writing event spill file, dropping {len(rows)} events: {e}")
+            self.dropped += len(rows)
+
+    def close(self):
+        """Stop the flusher and write whatever is queued"""
+        self._closed = True
+        self._wake.set()
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = len(self._rows)
+        return {
+            'queued': queued,
+            'accepted': self.accepted,
+            'written': self.written,
+            'flushes': self.flushes,
+            'retried': self.retried,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'dropped': self.dropped,
+        }
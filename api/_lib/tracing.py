@@ -0,0 +1,263 @@
+"""
+Request-scoped tracing for the Python API handlers
+Each request handled with tracing on gets a trace: timed spans around the
+handler stages and every upstream HTTP call, reported back to the caller
+as a Server-Timing header and logged as one JSON line when the request
+ends. Set API_TRACE_EXPORT to also append the spans as OTLP/JSON (one
+ExportTraceServiceRequest per line) for a local collector or viewer.
+
+Tracing is off unless API_TRACING or API_TRACE_EXPORT is set; then span()
+is one context variable lookup returning a shared no-op.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+import urllib.parse
+from typing import Callable, Dict, List, Optional
+
+TRACE_EXPORT_PATH = os.environ.get('API_TRACE_EXPORT', '')
+TRACING_ENABLED = os.environ.get('API_TRACING', '').lower() in ('1', 'true', 'on') or bool(TRACE_EXPORT_PATH)
+SERVICE_NAME = os.environ.get('API_TRACE_SERVICE', 'api')
+
+_TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('trace', default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar('span', default=None)
+_export_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'error')
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes
+        self.error = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+class Trace:
+    """All spans of one request; spans may be recorded from worker threads"""
+
+    def __init__(self, name: str, traceparent: str = ''):
+        match = _TRACEPARENT.match(traceparent.strip().lower())
+        self.trace_id = match.group(1) if match else os.urandom(16).hex()
+        self.root = Span(name, match.group(2) if match else None, {})
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def record(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def server_timing(self) -> str:
+        """Server-Timing value: spans summed by name, then the total so far"""
+        totals: Dict[str, List[float]] = {}
+        with self._lock:
+            for span in self.spans:
+                total = totals.setdefault(span.name, [0.0, 0])
+                total[0] += span.duration_ms
+                total[1] += 1
+        metrics = [
+            f'{name};dur={duration:.1f}' + (f';desc="{count} calls"' if count > 1 else '')
+            for name, (duration, count) in totals.items()
+        ]
+        metrics.append(f'total;dur={self.root.duration_ms:.1f}')
+        return ', '.join(metrics)
+
+    def log_line(self) -> str:
+        return json.dumps({
+            'trace_id': self.trace_id,
+            'name': self.root.name,
+            'status': self.root.attributes.get('http.status_code'),
+            'duration_ms': round(self.root.duration_ms, 2),
+            'spans': [
+                {
+                    'name': span.name,
+                    'ms': round(span.duration_ms, 2),
+                    **({'error': span.error} if span.error else {}),
+                    **span.attributes
+                }
+                for span in self.spans
+            ]
+        }, default=str)
+
+    def otlp(self) -> dict:
+        """The trace as an OTLP/JSON ExportTraceServiceRequest"""
+        def encode(span: Span, kind: int) -> dict:
+            encoded = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': kind,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns),
+                'attributes': [
+                    {'key': key, 'value': _otlp_value(value)}
+                    for key, value in span.attributes.items()
+                ],
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+            }
+            if span.parent_id:
+                encoded['parentSpanId'] = span.parent_id
+            return encoded
+
+        # SpanKind: 2 = server, 3 = client (upstream calls), 1 = internal
+        spans = [encode(self.root, 2)] + [
+            encode(span, 3 if span.name.startswith('http.') else 1) for span in self.spans
+        ]
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans': [{'scope': {'name': 'api._lib.tracing'}, 'spans': spans}]
+        }]}
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class _NoopSpan:
+    """Returned by span() when no trace is active"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _ActiveSpan:
+    __slots__ = ('trace', 'span', '_token')
+
+    def __init__(self, trace: Trace, name: str, attributes: Dict):
+        self.trace = trace
+        self.span = Span(name, _current_span.get() or trace.root.span_id, attributes)
+
+    def __enter__(self):
+        self._token = _current_span.set(self.span.span_id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end_ns = time.time_ns()
+        if exc is not None:
+            self.span.error = f'{exc_type.__name__}: {exc}'
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            pass  # closed from another context, e.g. an abandoned streaming generator
+        self.trace.record(self.span)
+        return False
+
+    def set(self, **attributes):
+        """Attach attributes known only once the work is done (status, sizes)"""
+        self.span.attributes.update(attributes)
+
+
+def span(name: str, **attributes):
+    """Time a block as a span of the current request's trace
+
+    `name` doubles as the Server-Timing metric, so keep it a single token
+    (e.g. 'auth', 'encode', 'http.supabase').
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _ActiveSpan(trace, name, attributes)
+
+
+def wrap(fn: Callable) -> Callable:
+    """Carry the current trace into a thread pool worker running fn"""
+    trace = _current_trace.get()
+    if trace is None:
+        return fn
+    parent = _current_span.get()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+    return run
+
+
+def url_path(url: str) -> str:
+    """Path without the query string, which can carry API keys"""
+    return urllib.parse.urlsplit(url).path
+
+
+def add_server_timing(handler):
+    """Send the Server-Timing header; call from the handler's end_headers"""
+    trace = _current_trace.get()
+    if trace is not None:
+        handler.send_header('Server-Timing', trace.server_timing())
+
+
+def _finish(trace: Trace):
+    trace.root.end_ns = time.time_ns()
+    print(trace.log_line())
+    if TRACE_EXPORT_PATH:
+        line = json.dumps(trace.otlp(), default=str)
+        try:
+            with _export_lock, open(TRACE_EXPORT_PATH, 'a') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            print(f"Error exporting trace: {e}")
+
+
+def traced(method: Callable) -> Callable:
+    """Decorate a handler's do_GET/do_POST to trace each request it serves"""
+    if not TRACING_ENABLED:
+        return method
+
+    @functools.wraps(method)
+    def run(handler, *args, **kwargs):
+        trace = Trace(
+            f'{handler.command} {url_path(handler.path)}',
+            handler.headers.get('traceparent', '')
+        )
+        send_response = handler.send_response
+
+        def record_status(code, message=None):
+            trace.root.attributes['http.status_code'] = int(code)
+            send_response(code, message)
+
+        handler.send_response = record_status
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(None)
+        try:
+            return method(handler, *args, **kwargs)
+        finally:
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            del handler.send_response
+            _finish(trace)
+    return run
+
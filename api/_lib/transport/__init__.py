@@ -0,0 +1,4 @@
+"""
+Medical transport matching engine
+Fleet-scale building blocks for api/transport-optimizer.py
+"""
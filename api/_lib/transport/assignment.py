@@ -0,0 +1,201 @@
+"""
+Global trip-to-driver assignment for batches of trips
+Drivers are expanded into one slot per free seat (capacity - currentLoad),
+so a plain rectangular assignment is capacity-aware. Trips and drivers are
+split into independent groups (no shared candidate pairs) and each group
+is solved exactly with the Hungarian method: serve as many trips as
+possible, then maximize the total match score. Groups past the size cap,
+groups the exact solver is not expected to finish within the remaining
+latency budget, and groups left over once it runs out are planned greedily.
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Greedy plans only
+    np = None
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # Built-in Hungarian below
+    linear_sum_assignment = None
+
+# Leaving a trip unserved costs more than any plan's total score, so the
+# solver maximizes trips served first; masked pairs cost more still.
+UNSERVED_COST = 1e6
+MASKED_COST = 1e12
+
+# Exact solve time per trip x cost-matrix cell, in nanoseconds, measured
+# with benchmarks/bench_assignment.py and rounded up. SciPy's solver cannot
+# be interrupted once started, so a group is only handed to it when this
+# estimate fits in what is left of the budget.
+SCIPY_NS_PER_UNIT = 0.1
+BUILTIN_NS_PER_UNIT = 0.5
+
+Pair = Tuple[int, int, float]  # (trip index, driver row, score)
+
+
+class BudgetExceeded(Exception):
+    """The exact solver ran past its deadline"""
+
+
+def hungarian(cost, deadline: Optional[float] = None) -> List[int]:
+    """Minimum-cost assignment of every row to a distinct column (rows <= columns)
+
+    Returns the column chosen for each row. Adds one row at a time along a
+    shortest augmenting path, with the inner Dijkstra step vectorized over
+    columns. Raises BudgetExceeded once time.perf_counter() passes `deadline`.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.intp)  # owner[j]: 1-based row holding column j, 0 = free
+    way = np.zeros(m + 1, dtype=np.intp)
+
+    for i in range(1, n + 1):
+        if deadline is not None and time.perf_counter() > deadline:
+            raise BudgetExceeded()
+        owner[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            improved = free & (reduced < minv[1:])
+            minv[1:][improved] = reduced[improved]
+            way[1:][improved] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            u[owner[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    assignment = [0] * n
+    for j in range(1, m + 1):
+        if owner[j]:
+            assignment[owner[j] - 1] = j - 1
+    return assignment
+
+
+def greedy_assignment(pairs: List[Pair], slots: Dict[int, int]) -> Dict[int, int]:
+    """Best-scoring pairs first, skipping trips already planned and full drivers"""
+    remaining = dict(slots)
+    plan = {}
+    for trip, row, _ in sorted(pairs, key=lambda pair: (-pair[2], pair[0], pair[1])):
+        if trip in plan or remaining.get(row, 0) <= 0:
+            continue
+        plan[trip] = row
+        remaining[row] -= 1
+    return plan
+
+
+def exact_assignment(pairs: List[Pair], slots: Dict[int, int],
+                     deadline: Optional[float] = None) -> Dict[int, int]:
+    """Optimal plan for one group of pairs (raises BudgetExceeded)"""
+    trips = sorted({trip for trip, _, _ in pairs})
+    trip_index = {trip: i for i, trip in enumerate(trips)}
+    rows = sorted(slots)
+    first_seat = {}
+    seat_rows = []
+    for row in rows:
+        first_seat[row] = len(seat_rows)
+        seat_rows.extend([row] * slots[row])
+    seats = len(seat_rows)
+
+    # One column per seat, then a private "unserved" column per trip
+    cost = np.full((len(trips), seats + len(trips)), MASKED_COST)
+    cost[np.arange(len(trips)), seats + np.arange(len(trips))] = UNSERVED_COST
+    for trip, row, score in pairs:
+        start = first_seat[row]
+        cost[trip_index[trip], start:start + slots[row]] = -score
+
+    if linear_sum_assignment is not None:
+        chosen = linear_sum_assignment(cost)[1].tolist()
+    else:
+        chosen = hungarian(cost, deadline)
+
+    return {trip: seat_rows[seat] for trip, seat in zip(trips, chosen) if seat < seats}
+
+
+def connected_groups(pairs: List[Pair]) -> List[List[Pair]]:
+    """Split pairs into groups that share no trip or driver"""
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for trip, row, _ in pairs:
+        parent[find(("trip", trip))] = find(("driver", row))
+
+    groups: Dict[tuple, List[Pair]] = {}
+    for pair in pairs:
+        groups.setdefault(find(("driver", pair[1])), []).append(pair)
+    return list(groups.values())
+
+
+def estimated_solve_ms(trip_count: int, cells: int) -> float:
+    """Pessimistic exact-solve time for a group with this many trips and cost cells"""
+    rate = SCIPY_NS_PER_UNIT if linear_sum_assignment is not None else BUILTIN_NS_PER_UNIT
+    return trip_count * cells * rate / 1e6
+
+
+def assign_trips(pairs: List[Pair], slots: Dict[int, int],
+                 budget_ms: float, max_cells: int) -> Tuple[Dict[int, int], str, Optional[str]]:
+    """Plan trips onto drivers: (trip -> driver row, solver used, fallback reason)
+
+    The solver is "hungarian" when every group was solved exactly, "greedy"
+    when none was, and "mixed" otherwise.
+    """
+    if np is None:
+        return greedy_assignment(pairs, slots), "greedy", "numpy unavailable"
+
+    deadline = time.perf_counter() + budget_ms / 1000
+    plan = {}
+    exact_groups = greedy_groups = 0
+    reasons = set()
+    # Small groups first, so a tight budget still solves most of the batch exactly
+    for group in sorted(connected_groups(pairs), key=len):
+        group_slots = {row: slots[row] for _, row, _ in group}
+        trip_count = len({trip for trip, _, _ in group})
+        cells = trip_count * (sum(group_slots.values()) + trip_count)
+        remaining_ms = (deadline - time.perf_counter()) * 1000
+        if cells > max_cells:
+            reasons.add(f"group of {trip_count} trips exceeds {max_cells} cells")
+        elif remaining_ms <= 0:
+            reasons.add("latency budget spent")
+        elif estimated_solve_ms(trip_count, cells) > remaining_ms:
+            reasons.add(f"group of {trip_count} trips too large for the remaining budget")
+        else:
+            try:
+                plan.update(exact_assignment(group, group_slots, deadline))
+                exact_groups += 1
+                continue
+            except BudgetExceeded:
+                reasons.add("latency budget spent")
+        plan.update(greedy_assignment(group, group_slots))
+        greedy_groups += 1
+
+    if not greedy_groups:
+        return plan, "hungarian", None
+    solver = "mixed" if exact_groups else "greedy"
+    return plan, solver, "; ".join(sorted(reasons))
@@ -0,0 +1,219 @@
+"""
+Compact fleet store with compiled compatibility bitmasks
+Each driver's status, equipment, certification, free seat and vehicle
+types are packed into one integer, and each trip's requirements into
+another, so a compatibility check is a single AND. Columns live in
+array.array buffers (NumPy can view them without copying); the driver
+dicts are only read back to build responses and rejection reasons.
+"""
+
+import threading
+from array import array
+from typing import Dict, List
+
+ACTIVE_STATUSES = ("available", "on-route")
+
+# Requirement bits
+ACTIVE = 1 << 0
+OXYGEN = 1 << 1
+HAS_SEAT = 1 << 2
+ATTENDANT = 1 << 3
+# Informational, never required by a trip
+ON_ROUTE = 1 << 4
+# Bits 8..62: one per vehicle type a loaded driver offers
+VEHICLE_TYPES_START = 8
+VEHICLE_TYPES_END = 62
+# Required by trips asking for a type no driver offers; never set on a driver
+UNKNOWN_VEHICLE_TYPE = 1 << 63
+
+_vehicle_type_bits: Dict[str, int] = {}
+_vehicle_type_lock = threading.Lock()
+
+
+def vehicle_type_bit(vehicle_type: str) -> int:
+    """Bit for a vehicle type, allocated the first time a driver offers it"""
+    bit = _vehicle_type_bits.get(vehicle_type)
+    if bit is None:
+        with _vehicle_type_lock:
+            bit = _vehicle_type_bits.get(vehicle_type)
+            if bit is None:
+                position = VEHICLE_TYPES_START + len(_vehicle_type_bits)
+                if position > VEHICLE_TYPES_END:
+                    raise ValueError("Too many distinct vehicle types for a 64-bit mask")
+                bit = _vehicle_type_bits[vehicle_type] = 1 << position
+    return bit
+
+
+def required_vehicle_type_bit(vehicle_type: str) -> int:
+    """Bit a trip needs for a vehicle type; never allocates, since the type
+    comes from the request (unknown types get the sentinel no driver has)"""
+    return _vehicle_type_bits.get(vehicle_type, UNKNOWN_VEHICLE_TYPE)
+
+
+for _vehicle_type in ("standard", "wheelchair", "stretcher"):
+    vehicle_type_bit(_vehicle_type)
+
+
+def validate_driver(driver: Dict):
+    """Raise ValueError unless the driver has every field the store compiles"""
+    if not isinstance(driver, dict):
+        raise ValueError("driver must be an object")
+    try:
+        if not isinstance(driver["id"], str) or not isinstance(driver["status"], str):
+            raise ValueError("driver id and status must be strings")
+        for axis in ("lat", "lng"):
+            if isinstance(driver["location"][axis], bool) or not isinstance(driver["location"][axis], (int, float)):
+                raise ValueError(f"driver location.{axis} must be a number")
+        vehicle = driver["vehicle"]
+        if not isinstance(vehicle["type"], list) or not all(isinstance(t, str) for t in vehicle["type"]):
+            raise ValueError("driver vehicle.type must be a list of strings")
+        if not isinstance(vehicle["oxygenEquipped"], bool):
+            raise ValueError("driver vehicle.oxygenEquipped must be a boolean")
+        for value, field in ((vehicle["capacity"], "vehicle.capacity"), (driver["currentLoad"], "currentLoad")):
+            if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+                raise ValueError(f"driver {field} must be a non-negative integer")
+        if not isinstance(driver["certifications"], list):
+            raise ValueError("driver certifications must be a list")
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"driver is missing {e}") from None
+
+
+def compile_driver(driver: Dict) -> int:
+    """Everything a driver offers, as a bitmask"""
+    mask = 0
+    if driver["status"] in ACTIVE_STATUSES:
+        mask |= ACTIVE
+    if driver["status"] == "on-route":
+        mask |= ON_ROUTE
+    if driver["vehicle"]["oxygenEquipped"]:
+        mask |= OXYGEN
+    if driver["currentLoad"] < driver["vehicle"]["capacity"]:
+        mask |= HAS_SEAT
+    if "medical-attendant" in driver["certifications"]:
+        mask |= ATTENDANT
+    for vehicle_type in driver["vehicle"]["type"]:
+        mask |= vehicle_type_bit(vehicle_type)
+    return mask
+
+
+def compile_trip(trip: Dict) -> int:
+    """Everything a trip needs, as a bitmask; compatible iff driver & need == need"""
+    requirements = trip["requirements"]
+    mask = ACTIVE | HAS_SEAT | required_vehicle_type_bit(requirements["vehicleType"])
+    if requirements["oxygenRequired"]:
+        mask |= OXYGEN
+    if requirements["attendantNeeded"]:
+        mask |= ATTENDANT
+    return mask
+
+
+def rejection_reasons(driver: Dict, trip: Dict, driver_mask: int, trip_mask: int) -> List[str]:
+    """Decode the unmet bits into the messages is_compatible has always used"""
+    missing = trip_mask & ~driver_mask
+    reasons = []
+    if missing & ACTIVE:
+        reasons.append(f"Driver is {driver['status']}")
+    vehicle_type = trip["requirements"]["vehicleType"]
+    if missing & required_vehicle_type_bit(vehicle_type):
+        reasons.append(f"Vehicle doesn't support {vehicle_type}")
+    if missing & OXYGEN:
+        reasons.append("Vehicle lacks oxygen equipment")
+    if missing & HAS_SEAT:
+        reasons.append("Driver at full capacity")
+    if missing & ATTENDANT:
+        reasons.append("Driver lacks medical attendant certification")
+    return reasons
+
+
+def load_balance_score(current_load: int, max_capacity: int) -> float:
+    """Same values as calculate_load_balance_score, kept per driver in the store"""
+    if max_capacity == 0:
+        return 0
+    utilization = current_load / max_capacity
+    if utilization == 0:
+        return 80
+    elif utilization < 0.5:
+        return 100
+    elif utilization < 0.8:
+        return 70
+    return 30
+
+
+class FleetStore:
+    """Column store for a driver list, one row per driver
+
+    Driver dicts are never mutated: an update swaps in a new dict, so a
+    copy() of the store stays consistent while the original keeps
+    changing. Rows are only ever appended. Columns must not grow while
+    NumPy views of them exist, so views go over copies.
+    """
+
+    __slots__ = ("drivers", "lat", "lng", "capacity", "load", "mask", "load_score")
+
+    def __init__(self, drivers: List[Dict]):
+        self.drivers = list(drivers)
+        self.lat = array("d", (d["location"]["lat"] for d in self.drivers))
+        self.lng = array("d", (d["location"]["lng"] for d in self.drivers))
+        self.capacity = array("i", (d["vehicle"]["capacity"] for d in self.drivers))
+        self.load = array("i", (d["currentLoad"] for d in self.drivers))
+        self.mask = array("Q", (compile_driver(d) for d in self.drivers))
+        self.load_score = array("d", (
+            load_balance_score(d["currentLoad"], d["vehicle"]["capacity"]) for d in self.drivers
+        ))
+
+    def move(self, row: int, lat: float, lng: float):
+        """Record a new position for one driver"""
+        self.drivers[row] = {**self.drivers[row], "location": {"lat": lat, "lng": lng}}
+        self.lat[row] = lat
+        self.lng[row] = lng
+
+    def replace(self, row: int, driver: Dict):
+        """Swap in a new dict for one driver and recompile its row
+
+        Everything is compiled before any column changes, so a malformed
+        driver leaves the row as it was.
+        """
+        mask = compile_driver(driver)
+        score = load_balance_score(driver["currentLoad"], driver["vehicle"]["capacity"])
+        self.drivers[row] = driver
+        self.lat[row] = driver["location"]["lat"]
+        self.lng[row] = driver["location"]["lng"]
+        self.capacity[row] = driver["vehicle"]["capacity"]
+        self.load[row] = driver["currentLoad"]
+        self.mask[row] = mask
+        self.load_score[row] = score
+
+    def refresh(self, row: int):
+        """Recompile one driver after its dict changed (status, load, vehicle)"""
+        self.replace(row, self.drivers[row])
+
+    def append(self, driver: Dict) -> int:
+        """Add a driver as a new row; returns the row. Raises ValueError,
+        without touching the store, if the driver is malformed"""
+        validate_driver(driver)
+        values = (
+            driver["location"]["lat"],
+            driver["location"]["lng"],
+            driver["vehicle"]["capacity"],
+            driver["currentLoad"],
+            compile_driver(driver),
+            load_balance_score(driver["currentLoad"], driver["vehicle"]["capacity"]),
+        )
+        self.drivers.append(driver)
+        for column, value in zip((self.lat, self.lng, self.capacity, self.load, self.mask, self.load_score), values):
+            column.append(value)
+        return len(self.drivers) - 1
+
+    def copy(self) -> "FleetStore":
+        """Point-in-time copy (columns memcpy'd, driver dicts shared)"""
+        store = object.__new__(FleetStore)
+        store.drivers = list(self.drivers)
+        for column in ("lat", "lng", "capacity", "load", "mask", "load_score"):
+            setattr(store, column, getattr(self, column)[:])
+        return store
+
+    def free_seats(self, row: int) -> int:
+        return self.capacity[row] - self.load[row]
+
+    def __len__(self):
+        return len(self.drivers)
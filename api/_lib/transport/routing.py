@@ -0,0 +1,301 @@
+"""
+Travel time engines for the transport optimizer
+HaversineEngine is the straight-line estimate at a flat average speed.
+RoadNetworkEngine routes over a local road graph: an OSM XML extract
+(.osm / .osm.gz) compiled into CSR adjacency arrays, with drivers and
+pickups snapped to the nearest graph node, A* for single pairs and one
+reverse Dijkstra per pickup for many drivers. Origin -> destination times
+are cached per snapped node pair in a bounded LRU. Everything runs offline
+from local files; pairs that cannot be routed fall back to haversine.
+"""
+
+import gzip
+import heapq
+import json
+import os
+import xml.etree.ElementTree as ElementTree
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..cache import TTLCache
+from .spatial import GridIndex, distance_miles
+
+AVERAGE_SPEED_MPH = 30
+MAX_SNAP_MILES = 2.0
+MAX_ROUTE_MINUTES = 240  # searches stop here; farther pairs use haversine
+HEURISTIC_SPEED_MPH = 85  # above any posted limit, so A* never overestimates
+
+# Default speeds (mph) by OSM highway class when a way has no maxspeed tag
+HIGHWAY_SPEEDS_MPH = {
+    "motorway": 65, "motorway_link": 45,
+    "trunk": 55, "trunk_link": 40,
+    "primary": 45, "primary_link": 35,
+    "secondary": 40, "secondary_link": 30,
+    "tertiary": 35, "tertiary_link": 25,
+    "unclassified": 30, "residential": 25,
+    "living_street": 10, "service": 15, "road": 25,
+}
+
+Point = Tuple[float, float]  # (lat, lng)
+
+
+def haversine_minutes(origin: Point, destination: Point) -> float:
+    """Straight-line travel minutes, as calculate_driver_match estimates them"""
+    distance = round(distance_miles(origin[0], origin[1], destination[0], destination[1]), 2)
+    return (distance / AVERAGE_SPEED_MPH) * 60
+
+
+def _parse_maxspeed(value: Optional[str]) -> Optional[float]:
+    """OSM maxspeed tag in mph ('45 mph', '80' km/h), or None"""
+    if not value:
+        return None
+    value = value.strip().lower()
+    try:
+        if value.endswith("mph"):
+            return float(value[:-3])
+        return float(value.split()[0]) * 0.621371
+    except (ValueError, IndexError):
+        return None
+
+
+class RoadGraph:
+    """Directed road graph in CSR form: forward edges and their reverse"""
+
+    def __init__(self, lat: array, lng: array, sources: array, targets: array, seconds: array):
+        self.lat = lat
+        self.lng = lng
+        self.forward = self._csr(len(lat), sources, targets, seconds)
+        self.reverse = self._csr(len(lat), targets, sources, seconds)
+        self._snap_index = GridIndex(cell_miles=0.5)
+        for node in range(len(lat)):
+            self._snap_index.update(node, lat[node], lng[node])
+        self._edges = (sources, targets, seconds)
+
+    @staticmethod
+    def _csr(node_count: int, sources: array, targets: array, seconds: array):
+        """(indptr, neighbours, weights) with each node's edges contiguous"""
+        order = sorted(range(len(sources)), key=sources.__getitem__)
+        indptr = array("l", [0] * (node_count + 1))
+        for source in sources:
+            indptr[source + 1] += 1
+        for node in range(node_count):
+            indptr[node + 1] += indptr[node]
+        neighbours = array("l", (targets[i] for i in order))
+        weights = array("f", (seconds[i] for i in order))
+        return indptr, neighbours, weights
+
+    @classmethod
+    def from_osm(cls, path: str) -> "RoadGraph":
+        """Compile drivable ways from an OSM XML extract"""
+        opener = gzip.open if path.endswith(".gz") else open
+        coords: Dict[str, Point] = {}
+        ways = []
+        with opener(path, "rb") as f:
+            for _, element in ElementTree.iterparse(f, events=("end",)):
+                if element.tag == "node":
+                    coords[element.get("id")] = (float(element.get("lat")), float(element.get("lon")))
+                    element.clear()
+                elif element.tag == "way":
+                    tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                    highway = tags.get("highway")
+                    if highway in HIGHWAY_SPEEDS_MPH:
+                        refs = [nd.get("ref") for nd in element.iter("nd")]
+                        speed = _parse_maxspeed(tags.get("maxspeed")) or HIGHWAY_SPEEDS_MPH[highway]
+                        oneway = tags.get("oneway", "yes" if highway.startswith("motorway") else "no")
+                        ways.append((refs, speed, oneway))
+                    element.clear()
+
+        node_ids: Dict[str, int] = {}
+        lat, lng = array("d"), array("d")
+        sources, targets, seconds = array("l"), array("l"), array("f")
+
+        def node(ref):
+            if ref not in node_ids:
+                node_ids[ref] = len(lat)
+                lat.append(coords[ref][0])
+                lng.append(coords[ref][1])
+            return node_ids[ref]
+
+        for refs, speed, oneway in ways:
+            refs = [ref for ref in refs if ref in coords]
+            for a, b in zip(refs, refs[1:]):
+                (lat_a, lng_a), (lat_b, lng_b) = coords[a], coords[b]
+                travel = distance_miles(lat_a, lng_a, lat_b, lng_b) / speed * 3600
+                u, v = node(a), node(b)
+                edges = []
+                if oneway != "-1":
+                    edges.append((u, v))
+                if oneway in ("no", "false", "0", "-1"):
+                    edges.append((v, u))
+                for source, target in edges:
+                    sources.append(source)
+                    targets.append(target)
+                    seconds.append(travel)
+
+        return cls(lat, lng, sources, targets, seconds)
+
+    def save(self, path: str):
+        """Write the compiled graph; load() reads it back without re-parsing OSM"""
+        sources, targets, seconds = self._edges
+        with open(path, "wb") as f:
+            f.write(json.dumps({"nodes": len(self.lat), "edges": len(sources)}).encode() + b"\n")
+            for column in (self.lat, self.lng, sources, targets, seconds):
+                column.tofile(f)
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        """Compiled graph file (.csr) or an OSM extract"""
+        if not path.endswith(".csr"):
+            return cls.from_osm(path)
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            columns = []
+            for typecode, count in (("d", "nodes"), ("d", "nodes"), ("l", "edges"), ("l", "edges"), ("f", "edges")):
+                column = array(typecode)
+                column.fromfile(f, header[count])
+                columns.append(column)
+        return cls(*columns)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def snap(self, point: Point) -> Optional[int]:
+        """Nearest graph node within MAX_SNAP_MILES"""
+        found = self._snap_index.nearest(point[0], point[1], 1)
+        if not found or found[0][0] > MAX_SNAP_MILES:
+            return None
+        return found[0][1]
+
+    def _lower_bound_seconds(self, a: int, b: int) -> float:
+        return distance_miles(self.lat[a], self.lng[a], self.lat[b], self.lng[b]) / HEURISTIC_SPEED_MPH * 3600
+
+    def shortest_seconds(self, origin: int, destination: int,
+                         limit: float = MAX_ROUTE_MINUTES * 60) -> Optional[float]:
+        """A* over forward edges with a straight-line-at-top-speed heuristic"""
+        indptr, neighbours, weights = self.forward
+        best = {origin: 0.0}
+        heap = [(self._lower_bound_seconds(origin, destination), 0.0, origin)]
+        while heap:
+            _, elapsed, node = heapq.heappop(heap)
+            if node == destination:
+                return elapsed
+            if elapsed > best.get(node, float("inf")) or elapsed > limit:
+                continue
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = neighbours[edge]
+                total = elapsed + weights[edge]
+                if total < best.get(neighbour, float("inf")):
+                    best[neighbour] = total
+                    heapq.heappush(heap, (total + self._lower_bound_seconds(neighbour, destination), total, neighbour))
+        return None
+
+    def seconds_to(self, destination: int, origins: Sequence[int],
+                   limit: float = MAX_ROUTE_MINUTES * 60) -> Dict[int, float]:
+        """Travel seconds from each origin to one destination: a single
+        Dijkstra over reverse edges that stops once every origin is settled"""
+        indptr, neighbours, weights = self.reverse
+        pending = set(origins)
+        settled: Dict[int, float] = {}
+        best = {destination: 0.0}
+        heap = [(0.0, destination)]
+        while heap and pending:
+            elapsed, node = heapq.heappop(heap)
+            if elapsed > best[node]:
+                continue
+            if elapsed > limit:
+                break
+            if node in pending:
+                settled[node] = elapsed
+                pending.discard(node)
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = neighbours[edge]
+                total = elapsed + weights[edge]
+                if total < best.get(neighbour, float("inf")):
+                    best[neighbour] = total
+                    heapq.heappush(heap, (total, neighbour))
+        return settled
+
+
+class HaversineEngine:
+    """Straight-line distance at AVERAGE_SPEED_MPH"""
+
+    name = "haversine"
+    road = False
+
+    def travel_minutes(self, origins: Sequence[Point], destination: Point) -> List[float]:
+        return [haversine_minutes(origin, destination) for origin in origins]
+
+    def stats(self) -> dict:
+        return {"engine": self.name}
+
+
+class RoadNetworkEngine:
+    """Road graph routing with a bounded origin -> destination time cache"""
+
+    name = "road-network"
+    road = True
+
+    def __init__(self, graph: RoadGraph, max_entries: int = 200_000, ttl: float = 24 * 3600):
+        self.graph = graph
+        self.matrix = TTLCache(max_entries, ttl)
+        self.searches = 0
+        self.fallbacks = 0
+
+    def travel_minutes(self, origins: Sequence[Point], destination: Point) -> List[float]:
+        """Minutes from each origin to the destination, haversine where unroutable"""
+        target = self.graph.snap(destination)
+        nodes = [self.graph.snap(origin) for origin in origins] if target is not None else []
+
+        seconds: Dict[int, Optional[float]] = {}
+        missing = []
+        for node in set(nodes):
+            if node is None:
+                continue
+            cached = self.matrix.get(f"{node}>{target}")
+            if cached is None:
+                missing.append(node)
+            else:
+                seconds[node] = cached
+
+        if len(missing) == 1:
+            self.searches += 1
+            found = self.graph.shortest_seconds(missing[0], target)
+            routed = {} if found is None else {missing[0]: found}
+        elif missing:
+            self.searches += 1
+            routed = self.graph.seconds_to(target, missing)
+        else:
+            routed = {}
+        for node, value in routed.items():
+            self.matrix.set(f"{node}>{target}", value)
+            seconds[node] = value
+
+        minutes = []
+        for i, origin in enumerate(origins):
+            value = seconds.get(nodes[i]) if nodes else None
+            if value is None:
+                self.fallbacks += 1
+                minutes.append(haversine_minutes(origin, destination))
+            else:
+                minutes.append(value / 60)
+        return minutes
+
+    def stats(self) -> dict:
+        return {
+            "engine": self.name,
+            "nodes": len(self.graph),
+            "edges": len(self.graph.forward[1]),
+            "searches": self.searches,
+            "fallbacks": self.fallbacks,
+            "matrixCache": self.matrix.stats(),
+        }
+
+
+def load_travel_engine(path: str = ""):
+    """Road network engine for a local graph file, else the haversine engine"""
+    if path and os.path.exists(path):
+        try:
+            return RoadNetworkEngine(RoadGraph.load(path))
+        except (OSError, ValueError, KeyError, ElementTree.ParseError) as e:
+            print(f"Road graph unavailable ({path}): {e}")
+    return HaversineEngine()
@@ -0,0 +1,217 @@
+"""
+Vectorized driver scoring for the transport optimizer
+Holds the fleet as column arrays and scores every driver against a trip in
+one NumPy pass. Mirrors calculate_driver_match in api/transport-optimizer.py;
+only the top-k drivers are turned back into full match dicts.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Union
+
+try:
+    import numpy as np
+except ImportError:  # Scalar path in the handler is used instead
+    np = None
+
+from .fleet import ON_ROUTE, FleetStore, compile_trip
+
+EARTH_RADIUS_MILES = 3959
+AVERAGE_SPEED_MPH = 30
+PROXIMITY_CUTOFF_MILES = 10  # calculate_proximity_score is 0 from here on
+
+SCORE_WEIGHTS = {
+    "proximity": 0.40,
+    "routeDeviation": 0.20,
+    "timeWindow": 0.25,
+    "loadBalance": 0.10,
+    "compatibility": 0.05
+}
+
+
+def max_score_beyond(distance_miles: float, trip: Dict, now: datetime, routed: bool = False) -> float:
+    """Highest score a compatible driver further than distance_miles from the pickup can reach
+
+    Every factor but proximity (and, on straight-line estimates, time
+    window) is taken at its best. Used to tell when a pruned candidate set
+    provably holds the same top matches as a full-fleet scan.
+    """
+    # Scored distances are rounded to 2 places, so allow for rounding down
+    distance = max(0.0, distance_miles - 0.005)
+    proximity = max(0.0, 100 - distance * 10)
+    time_window = 100.0
+    if not routed:
+        # Arrival only gets later with distance; past the window it costs points
+        arrival = now + timedelta(minutes=distance / AVERAGE_SPEED_MPH * 60)
+        latest = datetime.fromisoformat(trip["pickup"]["timeWindow"]["latest"])
+        if arrival > latest:
+            time_window = max(0.0, 100 - (arrival - latest).total_seconds() / 60 * 5)
+    return (
+        proximity * SCORE_WEIGHTS["proximity"] +
+        100 * SCORE_WEIGHTS["routeDeviation"] +
+        time_window * SCORE_WEIGHTS["timeWindow"] +
+        100 * SCORE_WEIGHTS["loadBalance"] +
+        100 * SCORE_WEIGHTS["compatibility"]
+    )
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def haversine_miles(lat1, lng1, lat2, lng2):
+    """Great-circle distance in miles; array-friendly version of calculate_distance"""
+    lat1_rad = np.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    delta_lat = np.radians(lat2 - lat1)
+    delta_lng = np.radians(lng2 - lng1)
+
+    a = (np.sin(delta_lat / 2) ** 2 +
+         np.cos(lat1_rad) * np.cos(lat2_rad) *
+         np.sin(delta_lng / 2) ** 2)
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_MILES * c
+
+
+def round_like_python(values, ndigits: int):
+    """np.round, except values sitting on a rounding tie use Python's round()
+
+    Python rounds the exact decimal value of a float, np.round rounds
+    values * 10**ndigits; they only disagree right at .5 boundaries.
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
+
+
+def timedelta_microseconds(minutes):
+    """Whole microseconds of timedelta(minutes=m), element-wise
+
+    Matches CPython's float handling (integer part times the unit, fraction
+    rounded half-even) so arrival times agree with the scalar path exactly.
+    """
+    whole = np.trunc(minutes)
+    fraction = minutes - whole
+    return whole.astype(np.int64) * 60_000_000 + np.rint(fraction * 60_000_000.0).astype(np.int64)
+
+
+class FleetArrays:
+    """NumPy views over a FleetStore's columns (shared memory, no copies)"""
+
+    __slots__ = ("store", "drivers", "lat", "lng", "capacity", "load", "mask", "load_score")
+
+    def __init__(self, fleet: Union[FleetStore, List[Dict]]):
+        self.store = fleet if isinstance(fleet, FleetStore) else FleetStore(fleet)
+        self.drivers = self.store.drivers
+        self.lat = np.frombuffer(self.store.lat, dtype=np.float64)
+        self.lng = np.frombuffer(self.store.lng, dtype=np.float64)
+        self.capacity = np.frombuffer(self.store.capacity, dtype=np.int32)
+        self.load = np.frombuffer(self.store.load, dtype=np.int32)
+        self.mask = np.frombuffer(self.store.mask, dtype=np.uint64)
+        self.load_score = np.frombuffer(self.store.load_score, dtype=np.float64)
+
+    def move(self, row: int, lat: float, lng: float):
+        """Record a new position for one driver"""
+        self.store.move(row, lat, lng)
+
+    def take(self, rows) -> "FleetArrays":
+        """Sub-fleet holding copies of only the given rows, in that order"""
+        rows = np.asarray(rows, dtype=np.intp)
+        subset = object.__new__(FleetArrays)
+        subset.store = None
+        subset.drivers = [self.drivers[i] for i in rows]
+        for column in ("lat", "lng", "capacity", "load", "mask", "load_score"):
+            setattr(subset, column, getattr(self, column)[rows])
+        return subset
+
+    def __len__(self):
+        return len(self.drivers)
+
+
+def score_fleet(fleet: FleetArrays, trip: Dict, now: Optional[datetime] = None,
+                travel_minutes=None) -> Dict:
+    """Score every driver for a trip; returns arrays keyed like the match breakdown
+
+    `travel_minutes` (one per driver, e.g. from a road network engine)
+    replaces the straight-line estimate for arrival time.
+    """
+    now = now or datetime.now()
+
+    # Compatibility: one AND across the fleet against the compiled requirements
+    required = np.uint64(compile_trip(trip))
+    compatible = (fleet.mask & required) == required
+
+    pickup = trip["pickup"]["coordinates"]
+    distance = round_like_python(haversine_miles(fleet.lat, fleet.lng, pickup["lat"], pickup["lng"]), 2)
+    if travel_minutes is None:
+        travel_minutes = (distance / AVERAGE_SPEED_MPH) * 60
+    else:
+        travel_minutes = np.asarray(travel_minutes, dtype=np.float64)
+
+    proximity = np.where(distance == 0, 100.0, round_like_python(np.maximum(0, 100 - distance * 10), 2))
+
+    # Time window fit, parsed once per trip rather than once per driver.
+    # Work in integer microseconds like datetime arithmetic does.
+    window = trip["pickup"]["timeWindow"]
+    travel_us = timedelta_microseconds(travel_minutes)
+    start_us = (datetime.fromisoformat(window["earliest"]) - now) // timedelta(microseconds=1)
+    end_us = (datetime.fromisoformat(window["latest"]) - now) // timedelta(microseconds=1)
+    minutes_early = ((start_us - travel_us) / 10 ** 6) / 60
+    minutes_late = ((travel_us - end_us) / 10 ** 6) / 60
+    time_window = np.where(
+        minutes_early > 0,
+        np.maximum(50, 100 - minutes_early * 2),
+        np.where(minutes_late > 0, np.maximum(0, 100 - minutes_late * 5), 100.0)
+    )
+
+    load_balance = fleet.load_score  # kept current per driver by the store
+
+    route_deviation = np.where((fleet.mask & np.uint64(ON_ROUTE)) != 0, 20.0, 100.0)
+
+    total = (
+        proximity * SCORE_WEIGHTS["proximity"] +
+        route_deviation * SCORE_WEIGHTS["routeDeviation"] +
+        time_window * SCORE_WEIGHTS["timeWindow"] +
+        load_balance * SCORE_WEIGHTS["loadBalance"] +
+        100 * SCORE_WEIGHTS["compatibility"]
+    )
+
+    return {
+        "compatible": compatible,
+        "distance": distance,
+        "travelMinutes": travel_minutes,
+        "proximityScore": proximity,
+        "routeDeviationScore": route_deviation,
+        "timeWindowScore": time_window,
+        "loadBalanceScore": load_balance,
+        "score": np.where(compatible, round_like_python(total, 2), 0.0)
+    }
+
+
+def rank_fleet(fleet: FleetArrays, trip: Dict, k: Optional[int] = None,
+               now: Optional[datetime] = None, rows: Optional[List[int]] = None,
+               travel_minutes=None) -> List[int]:
+    """Indices of the k best drivers, highest score first (stable on ties)
+
+    With `rows`, only those drivers are scored (e.g. spatial index
+    candidates); returned indices still refer to the full fleet, and
+    `travel_minutes` lines up with `rows`.
+    """
+    if rows is not None:
+        ranked = rank_fleet(fleet.take(rows), trip, k, now, travel_minutes=travel_minutes)
+        return [rows[i] for i in ranked]
+    if len(fleet) == 0:
+        return []
+    scores = score_fleet(fleet, trip, now, travel_minutes)["score"]
+    k = len(fleet) if k is None else min(k, len(fleet))
+    if k < len(fleet):
+        # Partial selection, then order only the survivors
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        threshold = scores[candidates].min()
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(fleet))
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return order[:k].tolist()
@@ -0,0 +1,187 @@
+"""
+Spatial index over driver positions for candidate pruning
+A uniform lat/lng grid (geohash-style bucketing): each driver lives in one
+cell, a radius query only visits the cells overlapping the search box and
+then filters by exact haversine distance. Positions can be moved one
+driver at a time as new location pings arrive, and snapshot() hands out
+consistent read-only copies without re-bucketing unchanged cells.
+"""
+
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+
+EARTH_RADIUS_MILES = 3959
+MILES_PER_DEGREE_LAT = 2 * math.pi * EARTH_RADIUS_MILES / 360
+
+
+def distance_miles(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Unrounded haversine distance in miles"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lng = math.radians(lng2 - lng1)
+
+    a = (math.sin(delta_lat / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) *
+         math.sin(delta_lng / 2) ** 2)
+    return EARTH_RADIUS_MILES * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class _GridQueries(ABC):
+    """Radius and k-nearest queries over cell buckets; subclasses supply the data"""
+
+    cell_degrees: float
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def _scan(self, buckets: Dict[Tuple[int, int], Iterable[Hashable]],
+              position: Callable[[Hashable], Tuple[float, float]],
+              lat: float, lng: float, radius_miles: float) -> List[Tuple[float, Hashable]]:
+        lat_span = radius_miles / MILES_PER_DEGREE_LAT
+        # Longitude degrees shrink with latitude; size the box for the widest row
+        widest = min(abs(lat) + lat_span, 89.9)
+        lng_span = min(radius_miles / (MILES_PER_DEGREE_LAT * math.cos(math.radians(widest))), 180)
+
+        low_row, low_col = self._cell(lat - lat_span, lng - lng_span)
+        high_row, high_col = self._cell(lat + lat_span, lng + lng_span)
+
+        # Scan whichever is smaller: the cells in the box or the occupied cells
+        box = (high_row - low_row + 1) * (high_col - low_col + 1)
+        if box <= len(buckets):
+            cells = (
+                (row, col)
+                for row in range(low_row, high_row + 1)
+                for col in range(low_col, high_col + 1)
+            )
+        else:
+            cells = [
+                (row, col) for row, col in buckets
+                if low_row <= row <= high_row and low_col <= col <= high_col
+            ]
+
+        results = []
+        for cell in cells:
+            for key in buckets.get(cell, ()):
+                point_lat, point_lng = position(key)
+                distance = distance_miles(lat, lng, point_lat, point_lng)
+                if distance <= radius_miles:
+                    results.append((distance, key))
+        results.sort(key=lambda item: item[0])
+        return results
+
+    @abstractmethod
+    def within(self, lat: float, lng: float, radius_miles: float) -> List[Tuple[float, Hashable]]:
+        """(distance, key) for every point within radius_miles, nearest first"""
+
+    def nearest(self, lat: float, lng: float, k: int) -> List[Tuple[float, Hashable]]:
+        """The k nearest points, found by widening the search radius"""
+        if k <= 0 or not len(self):
+            return []
+        radius = self.cell_degrees * MILES_PER_DEGREE_LAT
+        while True:
+            found = self.within(lat, lng, radius)
+            if len(found) >= k or radius >= math.pi * EARTH_RADIUS_MILES:
+                return found[:k]
+            radius *= 2
+
+    def candidates(self, lat: float, lng: float, radius_miles: float,
+                   min_count: Optional[int] = None) -> List[Hashable]:
+        """Keys within the radius, topped up with the nearest points up to min_count"""
+        found = self.within(lat, lng, radius_miles)
+        if min_count and len(found) < min_count:
+            found = self.nearest(lat, lng, min_count)
+        return [key for _, key in found]
+
+    @abstractmethod
+    def __len__(self):
+        """Number of points indexed"""
+
+
+class GridIndex(_GridQueries):
+    """Thread-safe point index bucketed into fixed-size lat/lng cells"""
+
+    def __init__(self, cell_miles: float = 5.0):
+        self.cell_degrees = cell_miles / MILES_PER_DEGREE_LAT
+        self._cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._points: Dict[Hashable, Tuple[float, float, Tuple[int, int]]] = {}  # key -> (lat, lng, cell)
+        self._lock = threading.Lock()
+        # Frozen copies of each cell as of the last snapshot, and cells changed since
+        self._frozen: Dict[Tuple[int, int], FrozenSet[Hashable]] = {}
+        self._dirty: Set[Tuple[int, int]] = set()
+
+    def update(self, key: Hashable, lat: float, lng: float):
+        """Insert a point or move it to a new position"""
+        cell = self._cell(lat, lng)
+        with self._lock:
+            previous = self._points.get(key)
+            if previous is not None and previous[2] != cell:
+                self._discard(key, previous[2])
+            self._points[key] = (lat, lng, cell)
+            bucket = self._cells.setdefault(cell, set())
+            if key not in bucket:
+                bucket.add(key)
+                self._dirty.add(cell)
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            previous = self._points.pop(key, None)
+            if previous is not None:
+                self._discard(key, previous[2])
+
+    def _discard(self, key: Hashable, cell: Tuple[int, int]):
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(key)
+            self._dirty.add(cell)
+            if not bucket:
+                del self._cells[cell]
+
+    def within(self, lat: float, lng: float, radius_miles: float) -> List[Tuple[float, Hashable]]:
+        """(distance, key) for every point within radius_miles, nearest first"""
+        with self._lock:
+            return self._scan(self._cells, lambda key: self._points[key][:2], lat, lng, radius_miles)
+
+    def snapshot(self, position: Callable[[Hashable], Tuple[float, float]]) -> "GridSnapshot":
+        """Read-only copy of the buckets; only cells changed since the last
+        snapshot are re-frozen. `position` must read a matching point-in-time
+        copy of the coordinates."""
+        with self._lock:
+            for cell in self._dirty:
+                bucket = self._cells.get(cell)
+                if bucket:
+                    self._frozen[cell] = frozenset(bucket)
+                else:
+                    self._frozen.pop(cell, None)
+            self._dirty.clear()
+            return GridSnapshot(self.cell_degrees, dict(self._frozen), position, len(self._points))
+
+    def __len__(self):
+        return len(self._points)
+
+    def stats(self) -> dict:
+        return {
+            'points': len(self._points),
+            'cells': len(self._cells),
+            'cellMiles': round(self.cell_degrees * MILES_PER_DEGREE_LAT, 2),
+        }
+
+
+class GridSnapshot(_GridQueries):
+    """Immutable view of a GridIndex at one point in time"""
+
+    def __init__(self, cell_degrees: float, cells: Dict[Tuple[int, int], FrozenSet[Hashable]],
+                 position: Callable[[Hashable], Tuple[float, float]], size: int):
+        self.cell_degrees = cell_degrees
+        self._cells = cells
+        self._position = position
+        self._size = size
+
+    def within(self, lat: float, lng: float, radius_miles: float) -> List[Tuple[float, Hashable]]:
+        """(distance, key) for every point within radius_miles, nearest first"""
+        return self._scan(self._cells, self._position, lat, lng, radius_miles)
+
+    def __len__(self):
+        return self._size
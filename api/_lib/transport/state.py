@@ -0,0 +1,145 @@
+"""
+Live fleet state for the transport optimizer
+FleetState takes a stream of driver events (position pings, status
+changes, trip accept/complete) and keeps the derived structures current
+as each one lands: the column store with compatibility masks and
+load-balance scores, and the spatial grid. Match requests read a
+FleetSnapshot, an immutable versioned copy shared by every reader until
+the next write, so a request sees one consistent fleet however many
+events arrive while it runs.
+"""
+
+import threading
+from typing import Dict, List, Optional
+
+from .fleet import FleetStore, validate_driver
+from .scoring import FleetArrays, numpy_available
+from .spatial import GridIndex, GridSnapshot
+
+
+class FleetSnapshot:
+    """The fleet as of one version: store copy, NumPy views and grid copy"""
+
+    __slots__ = ("version", "store", "arrays", "index", "rows")
+
+    def __init__(self, version: int, store: FleetStore, index: GridSnapshot, rows: Dict[str, int]):
+        self.version = version
+        self.store = store
+        self.arrays = FleetArrays(store) if numpy_available() else None
+        self.index = index
+        self.rows = rows
+
+    @property
+    def drivers(self) -> List[Dict]:
+        return self.store.drivers
+
+    def __len__(self):
+        return len(self.store)
+
+
+class FleetState:
+    """Thread-safe live fleet with O(1) event updates and versioned snapshots"""
+
+    def __init__(self, drivers: List[Dict], cell_miles: float = 5.0):
+        self._lock = threading.Lock()
+        self.store = FleetStore(drivers)
+        self.index = GridIndex(cell_miles)
+        for row, driver in enumerate(self.store.drivers):
+            self.index.update(row, driver["location"]["lat"], driver["location"]["lng"])
+        self.rows = {driver["id"]: row for row, driver in enumerate(self.store.drivers)}
+        self.version = 0  # bumped by every applied event
+        self.snapshots_built = 0
+        self._snapshot: Optional[FleetSnapshot] = None
+
+    def _row(self, driver_id: str) -> int:
+        row = self.rows.get(driver_id)
+        if row is None:
+            raise KeyError(f"Unknown driver: {driver_id}")
+        return row
+
+    def _changed(self) -> int:
+        self.version += 1
+        return self.version
+
+    def ping(self, driver_id: str, lat: float, lng: float) -> int:
+        """New position report; returns the fleet version it produced"""
+        with self._lock:
+            row = self._row(driver_id)
+            self.store.move(row, lat, lng)
+            self.index.update(row, lat, lng)
+            return self._changed()
+
+    def set_status(self, driver_id: str, status: str) -> int:
+        with self._lock:
+            row = self._row(driver_id)
+            self.store.replace(row, {**self.store.drivers[row], "status": status})
+            return self._changed()
+
+    def accept_trip(self, driver_id: str) -> int:
+        """Take one seat; refuses a driver with none free"""
+        with self._lock:
+            row = self._row(driver_id)
+            driver = self.store.drivers[row]
+            if driver["currentLoad"] >= driver["vehicle"]["capacity"]:
+                raise ValueError(f"Driver {driver_id} at full capacity")
+            self.store.replace(row, {
+                **driver,
+                "currentLoad": driver["currentLoad"] + 1,
+                "status": "on-route" if driver["status"] == "available" else driver["status"]
+            })
+            return self._changed()
+
+    def complete_trip(self, driver_id: str) -> int:
+        """Free one seat; a driver with no load left becomes available"""
+        with self._lock:
+            row = self._row(driver_id)
+            driver = self.store.drivers[row]
+            load = max(0, driver["currentLoad"] - 1)
+            status = "available" if load == 0 and driver["status"] == "on-route" else driver["status"]
+            self.store.replace(row, {**driver, "currentLoad": load, "status": status})
+            return self._changed()
+
+    def add_driver(self, driver: Dict) -> int:
+        """New driver; a malformed one raises ValueError and changes nothing"""
+        validate_driver(driver)
+        with self._lock:
+            if driver["id"] in self.rows:
+                raise ValueError(f"Driver {driver['id']} already exists")
+            row = self.store.append(driver)
+            self.index.update(row, driver["location"]["lat"], driver["location"]["lng"])
+            # Copy on write: earlier snapshots keep their own id -> row map
+            self.rows = {**self.rows, driver["id"]: row}
+            return self._changed()
+
+    def apply(self, event: Dict) -> int:
+        """Apply one event dict: {"type": "ping"|"status"|"accept"|"complete"|"add", ...}"""
+        kind = event.get("type")
+        if kind == "ping":
+            return self.ping(event["driverId"], float(event["lat"]), float(event["lng"]))
+        if kind == "status":
+            return self.set_status(event["driverId"], event["status"])
+        if kind == "accept":
+            return self.accept_trip(event["driverId"])
+        if kind == "complete":
+            return self.complete_trip(event["driverId"])
+        if kind == "add":
+            return self.add_driver(event["driver"])
+        raise ValueError(f"Unknown fleet event type: {kind}")
+
+    def snapshot(self) -> FleetSnapshot:
+        """Consistent read-only fleet; rebuilt only when a write happened since the last one"""
+        with self._lock:
+            if self._snapshot is None or self._snapshot.version != self.version:
+                store = self.store.copy()
+                index = self.index.snapshot(lambda row: (store.lat[row], store.lng[row]))
+                self._snapshot = FleetSnapshot(self.version, store, index, self.rows)
+                self.snapshots_built += 1
+            return self._snapshot
+
+    def stats(self) -> dict:
+        return {
+            "drivers": len(self.store),
+            "version": self.version,
+            "snapshotsBuilt": self.snapshots_built,
+            "index": self.index.stats(),
+        }
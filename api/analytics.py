@@ -5,277 +5,909 @@ Provides business intelligence data from Supabase analytics views
 """
 
 from http.server import BaseHTTPRequestHandler
+import atexit
+import csv
+import io
+import itertools
 import json
 import os
+import sys
+import tempfile
 import urllib.parse
-import urllib.request
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+import hashlib
+import math
+import re
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib import tracing
+from _lib.auth import InvalidToken, bearer_token, claim, verify_jwt
+from _lib.cache import TTLCache, cache_key
+from _lib.encoding import dumps, encode_response
+from _lib.http_client import HTTPError, supabase_client
+from _lib.ingest import EventBuffer, insert_isolating, normalize_event, rejection_message
 
 # Environment variables
 SUPABASE_URL = os.environ.get('VITE_SUPABASE_URL', '')
 SUPABASE_KEY = os.environ.get('VITE_SUPABASE_ANON_KEY', '')
+# refresh_analytics_snapshots is SECURITY DEFINER, so only service_role may run it
+SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
+
+# Rows per request when paging through events
+EVENTS_PAGE_SIZE = 1000
+
+# Monthly price per paid tier; the analytics_revenue RPC is given this table
+TIER_PRICING = {'pro': 99, 'enterprise': 499}
+AVG_LIFETIME_MONTHS = 12  # Assumption behind the simple average LTV
+
+# Superadmin role lookups by user ID. Denials expire sooner so a fresh
+# grant shows up quickly; failed lookups are never cached.
+SUPERADMIN_CACHE_TTL = float(os.environ.get('ANALYTICS_AUTH_CACHE_TTL', 300))
+SUPERADMIN_NEGATIVE_TTL = float(os.environ.get('ANALYTICS_AUTH_NEGATIVE_TTL', 30))
+SUPERADMIN_CACHE = TTLCache(max_entries=1024, ttl=SUPERADMIN_CACHE_TTL)
+
+# With the project's JWT secret set, a Bearer token carrying the role claim
+# is verified locally and no role lookup is needed at all
+SUPABASE_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET', '')
+JWT_ROLE_CLAIM = os.environ.get('ANALYTICS_JWT_ROLE_CLAIM', 'app_metadata.role')
+
+# Endpoints served by AnalyticsAPI.query; several can be requested at once
+# (endpoint=overview,funnel,churn or a POST with "queries")
+ENDPOINTS = ('overview', 'signups', 'funnel', 'ai_usage', 'engagement', 'benchmarks', 'churn', 'revenue')
+MAX_BATCH_QUERIES = 16
+
+# Full exports (?export=<name>&format=ndjson|csv), streamed to the client a
+# page at a time so memory stays flat however many rows there are. Pages
+# follow a unique `key` (keyset: key > last seen) where the rows have one,
+# else Range headers over a stable `order`. `since` names the column the
+# ?since= filter applies to.
+EXPORTS = {
+    'engagement': {'relation': 'analytics_user_engagement', 'key': 'user_id'},
+    'churn': {'relation': 'analytics_churn_risk', 'key': 'user_id'},
+    'funnel': {'relation': 'analytics_conversion_funnel', 'order': 'naics_code,country'},
+    'benchmarks': {'relation': 'analytics_industry_benchmarks', 'order': 'naics_code,country'},
+    'signups': {'relation': 'analytics_daily_signups', 'order': 'signup_date.desc,source,campaign'},
+    'ai_usage': {'relation': 'analytics_ai_usage', 'order': 'usage_date.desc,app_name'},
+    'revenue': {
+        'relation': 'user_profiles',
+        'select': 'id,tier,created_at,generation_count',
+        'filter': 'tier=neq.free',
+        'key': 'id',
+        'since': 'created_at'
+    },
+    'events': {'relation': 'events', 'key': 'event_id', 'since': 'ts'},
+}
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv; charset=utf-8'}
+EXPORT_PAGE_SIZE = int(os.environ.get('ANALYTICS_EXPORT_PAGE_SIZE', 1000))
+
+# Materialized snapshots of the heavy views, rebuilt from incremental
+# per-user rollups (supabase/migrations/20251023_analytics_snapshots.sql).
+# Reads report the snapshot's age; one older than ANALYTICS_SNAPSHOT_MAX_AGE
+# seconds gets refreshed in the background. Until that migration is
+# deployed the live views are read instead.
+SNAPSHOT_TABLES = {
+    'analytics_user_engagement': 'analytics_user_engagement_snapshot',
+    'analytics_conversion_funnel': 'analytics_conversion_funnel_snapshot',
+    'analytics_industry_benchmarks': 'analytics_industry_benchmarks_snapshot',
+    'analytics_churn_risk': 'analytics_churn_risk_snapshot',
+}
+SNAPSHOT_MAX_AGE = float(os.environ.get('ANALYTICS_SNAPSHOT_MAX_AGE', 300))
+SNAPSHOT_STATE = TTLCache(max_entries=1, ttl=15)  # the analytics_snapshot_state row
+_snapshot_refresh_lock = threading.Lock()
+
+# Query results shared by every request on this instance, keyed by endpoint
+# and the options it reads, so a dashboard polling unchanged data is served
+# without touching Supabase. Each result carries an ETag over its data; a
+# poll sending it back in If-None-Match gets an empty 304.
+RESULT_CACHE_TTL = float(os.environ.get('ANALYTICS_RESULT_TTL', 30))
+RESULT_CACHE = TTLCache(max_entries=256, ttl=RESULT_CACHE_TTL)
+ENDPOINT_OPTIONS = {
+    'overview': ('concurrent',),
+    'signups': ('days',),
+    'ai_usage': ('days',),
+    'engagement': ('limit',),
+}
+# The view behind each snapshot-backed endpoint, for its freshness entry
+ENDPOINT_VIEWS = {
+    'funnel': 'analytics_conversion_funnel',
+    'engagement': 'analytics_user_engagement',
+    'benchmarks': 'analytics_industry_benchmarks',
+    'churn': 'analytics_churn_risk',
+}
+
+# Browser caching per endpoint: (max-age, stale-while-revalidate) seconds.
+# The slow views change at snapshot speed, so a dashboard may show them
+# stale for a while as it revalidates in the background.
+CACHE_CONTROL = {
+    'overview': (15, 60),
+    'signups': (60, 600),
+    'funnel': (60, 600),
+    'ai_usage': (60, 600),
+    'engagement': (60, 600),
+    'benchmarks': (300, 3600),
+    'churn': (60, 600),
+    'revenue': (60, 600),
+}
+
+# Tracking one of these events drops the affected user's cached role on
+# this instance; other warm instances catch up within the cache TTL
+ROLE_CHANGE_EVENTS = ('role_changed',)
+
+def parse_timestamp(value: str) -> datetime:
+    """PostgREST timestamptz; fromisoformat before 3.11 wants 0, 3 or 6 fractional digits"""
+    value = re.sub(r'\.(\d+)', lambda m: '.' + m.group(1)[:6].ljust(6, '0'), value.replace('Z', '+00:00'))
+    return datetime.fromisoformat(value)
+
+def invalidate_superadmin(user_id: Optional[str] = None):
+    """Forget the cached role for one user (or everyone) after a role change"""
+    if user_id is None:
+        SUPERADMIN_CACHE.clear()
+    else:
+        SUPERADMIN_CACHE.delete(user_id)
+
+def insert_events(rows: List[Dict]):
+    """One bulk insert into events; raises HTTPError if PostgREST refuses it"""
+    supabase_client(SUPABASE_URL, SUPABASE_KEY).post(
+        "/rest/v1/events",
+        json_body=rows,
+        headers={'Prefer': 'return=minimal'}
+    )
+
+# Event ingestion: "direct" inserts before answering, "buffered" answers
+# 202 at once and leaves the write to EVENT_BUFFER, which flushes in bulk
+# and spills to ANALYTICS_EVENT_SPILL when Supabase stays unreachable.
+# A request can pick either with "mode".
+INGEST_MODE = os.environ.get('ANALYTICS_INGEST_MODE', 'direct')
+INGEST_MODES = ('direct', 'buffered')
+MAX_EVENTS_PER_REQUEST = 1000
+EVENT_BUFFER = EventBuffer(
+    insert_events,
+    max_events=int(os.environ.get('ANALYTICS_BUFFER_MAX_EVENTS', 500)),
+    max_age=float(os.environ.get('ANALYTICS_BUFFER_MAX_AGE', 2)),
+    spill_path=os.environ.get(
+        'ANALYTICS_EVENT_SPILL', os.path.join(tempfile.gettempdir(), 'analytics-events-spill.jsonl')
+    )
+)
+atexit.register(EVENT_BUFFER.close)
+
+def ndjson_chunk(rows: List[Dict]) -> bytes:
+    return b''.join(dumps(row) + b'\n' for row in rows)
+
+class CSVChunker:
+    """Encode pages of rows as CSV; the first page fixes the columns"""
+    
+    def __init__(self):
+        self.columns = None
+    
+    def __call__(self, rows: List[Dict]) -> bytes:
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if self.columns is None:
+            self.columns = list(rows[0])
+            writer.writerow(self.columns)
+        for row in rows:
+            writer.writerow([
+                '' if value is None else json.dumps(value) if isinstance(value, (dict, list)) else value
+                for value in (row.get(column) for column in self.columns)
+            ])
+        return out.getvalue().encode()
+
+class HyperLogLog:
+    """Fixed-memory distinct counter (~0.8% standard error at p=14)"""
+    
+    def __init__(self, precision: int = 14):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+    
+    def add(self, value: str):
+        h = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def count(self) -> int:
+        estimate = self.alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Small-range correction (linear counting)
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
 
 class AnalyticsAPI:
     """Analytics data fetcher for superadmin dashboard"""
     
-    def __init__(self):
-        self.base_url = SUPABASE_URL
-        self.api_key = SUPABASE_KEY
+    def __init__(self, strict: bool = False):
+        self.db = supabase_client(SUPABASE_URL, SUPABASE_KEY)
+        # Strict: getters raise upstream errors instead of returning empty
+        # data, so a batch can report them per section
+        self.strict = strict
+        # Per view read: where the rows came from and how old they are
+        self.freshness = {}
+        # Set when a getter swallowed an error: its empty result is not cached
+        self.degraded = False
     
-    def _is_superadmin(self, user_id: str) -> bool:
-        """Check if user is superadmin"""
+    def _is_superadmin(self, user_id: str, claims: Optional[dict] = None) -> bool:
+        """Check if user is superadmin
+        
+        A verified token's role claim decides without a lookup; otherwise
+        the role comes from SUPERADMIN_CACHE or, on a miss, user_profiles.
+        """
+        role = claim(claims, JWT_ROLE_CLAIM) if claims else None
+        if role is not None:
+            return role == 'superadmin'
+        
+        cached = SUPERADMIN_CACHE.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
-            url = f"{self.base_url}/rest/v1/user_profiles?id=eq.{user_id}&select=role"
-            
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
-            
-            return data and len(data) > 0 and data[0].get('role') == 'superadmin'
+            data = self.db.get(f"/rest/v1/user_profiles?id=eq.{user_id}&select=role").json()
             
         except Exception as e:
             print(f"Error checking superadmin: {e}")
             return False
+        
+        is_superadmin = bool(data) and data[0].get('role') == 'superadmin'
+        SUPERADMIN_CACHE.set(user_id, is_superadmin, None if is_superadmin else SUPERADMIN_NEGATIVE_TTL)
+        return is_superadmin
+    
+    def _count_rows(self, path: str) -> int:
+        """Exact row count for a PostgREST query via the Content-Range header"""
+        response = self.db.get(f"/rest/v1/{path}", headers={'Prefer': 'count=exact'})
+        return int(response.headers.get('Content-Range', '0-0/0').split('/')[-1])
     
-    def get_overview_stats(self) -> dict:
-        """Get high-level overview statistics"""
+    def _count_total_users(self) -> int:
+        return self._count_rows("user_profiles?select=count")
+    
+    def _count_active_users_7d(self) -> int:
+        """Distinct users with events in the last 7 days, counted in Postgres"""
+        seven_days_ago = (datetime.now() - timedelta(days=7)).isoformat()
         try:
-            # Total users
-            url = f"{self.base_url}/rest/v1/user_profiles?select=count"
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            req.add_header('Prefer', 'count=exact')
-            
-            with urllib.request.urlopen(req) as response:
-                total_users = int(response.headers.get('Content-Range', '0-0/0').split('/')[-1])
-            
-            # Active users (last 7 days)
-            seven_days_ago = (datetime.now() - timedelta(days=7)).isoformat()
-            url = f"{self.base_url}/rest/v1/events?ts=gte.{seven_days_ago}&select=user_id"
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            
-            with urllib.request.urlopen(req) as response:
-                events_data = json.loads(response.read().decode())
-                active_users = len(set(e['user_id'] for e in events_data if e['user_id']))
-            
-            # Total AI generations
-            url = f"{self.base_url}/rest/v1/events?event_type=eq.ai_generation_completed&select=count"
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            req.add_header('Prefer', 'count=exact')
-            
-            with urllib.request.urlopen(req) as response:
-                total_generations = int(response.headers.get('Content-Range', '0-0/0').split('/')[-1])
-            
-            # Revenue (paid users)
-            url = f"{self.base_url}/rest/v1/user_profiles?tier=neq.free&select=count"
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            req.add_header('Prefer', 'count=exact')
-            
-            with urllib.request.urlopen(req) as response:
-                paid_users = int(response.headers.get('Content-Range', '0-0/0').split('/')[-1])
+            response = self.db.post("/rest/v1/rpc/analytics_active_users", json_body={'since': seven_days_ago})
+            return int(response.json())
+        
+        except HTTPError as e:
+            # RPC not deployed yet - fall back to paging through the events
+            if e.code != 404:
+                raise
+            print("analytics_active_users RPC missing, streaming events instead")
+            return self._estimate_distinct_users(seven_days_ago)
+    
+    def _estimate_distinct_users(self, since: str) -> int:
+        """Stream events page by page and dedupe user IDs with HyperLogLog
+        
+        Memory stays at one page plus the fixed-size sketch no matter how
+        many events fall inside the window.
+        """
+        sketch = HyperLogLog()
+        path = f"/rest/v1/events?ts=gte.{since}&user_id=not.is.null&select=user_id&order=event_id"
+        offset = 0
+        
+        while True:
+            page = self.db.get(path, headers={
+                'Range-Unit': 'items',
+                'Range': f'{offset}-{offset + EVENTS_PAGE_SIZE - 1}'
+            }).json()
             
-            return {
-                'total_users': total_users,
-                'active_users_7d': active_users,
-                'total_ai_generations': total_generations,
-                'paid_users': paid_users,
-                'mrr_estimate': paid_users * 99,  # Assuming $99/month
-                'conversion_rate': round((paid_users / max(total_users, 1)) * 100, 2)
-            }
+            for event in page:
+                sketch.add(event['user_id'])
             
+            if len(page) < EVENTS_PAGE_SIZE:
+                break
+            offset += EVENTS_PAGE_SIZE
+        
+        return sketch.count()
+    
+    def _count_ai_generations(self) -> int:
+        return self._count_rows("events?event_type=eq.ai_generation_completed&select=count")
+    
+    def _count_paid_users(self) -> int:
+        return self._count_rows("user_profiles?tier=neq.free&select=count")
+    
+    def _revenue_summary(self, cohorts: bool = False) -> dict:
+        """Per-tier users, MRR and generations, aggregated in Postgres
+        
+        {'tiers': [{'tier', 'users', 'mrr', 'generations'}], 'cohorts': [...]};
+        cohorts (monthly signup cohorts with realized LTV) only when asked for.
+        """
+        return self.db.post(
+            "/rest/v1/rpc/analytics_revenue",
+            json_body={'prices': TIER_PRICING, 'include_cohorts': cohorts}
+        ).json()
+    
+    def _revenue_from_profiles(self) -> dict:
+        """Fallback until the analytics_revenue RPC is deployed: one pass over
+        every paid user's profile, no cohorts"""
+        paid_users = self.db.get("/rest/v1/user_profiles?tier=neq.free&select=tier,generation_count").json()
+        tiers = {}
+        for user in paid_users:
+            tier = tiers.setdefault(user['tier'], {'tier': user['tier'], 'users': 0, 'mrr': 0, 'generations': 0})
+            tier['users'] += 1
+            tier['mrr'] += TIER_PRICING.get(user['tier'], 0)
+            tier['generations'] += user.get('generation_count') or 0
+        return {'tiers': sorted(tiers.values(), key=lambda tier: tier['tier']), 'cohorts': []}
+    
+    def _paid_totals(self) -> dict:
+        """Paid users and MRR for the overview"""
+        try:
+            tiers = self._revenue_summary()['tiers']
+        except HTTPError as e:
+            if e.code != 404:
+                raise
+            print("analytics_revenue RPC missing, counting paid users instead")
+            paid_users = self._count_paid_users()
+            return {'users': paid_users, 'mrr': paid_users * TIER_PRICING['pro']}
+        return {
+            'users': sum(tier['users'] for tier in tiers),
+            'mrr': round(sum(tier['mrr'] for tier in tiers))
+        }
+    
+    def _fetch_metric(self, name: str, fetch):
+        """Run one overview sub-query; a failure only zeroes that metric"""
+        try:
+            return fetch()
         except Exception as e:
-            print(f"Error getting overview stats: {e}")
-            return {
-                'total_users': 0,
-                'active_users_7d': 0,
-                'total_ai_generations': 0,
-                'paid_users': 0,
-                'mrr_estimate': 0,
-                'conversion_rate': 0
-            }
+            print(f"Error getting {name}: {e}")
+            self.degraded = True
+            return 0
+    
+    def get_overview_stats(self, concurrent: bool = True) -> dict:
+        """Get high-level overview statistics
+        
+        The sub-queries are independent, so by default they are fanned out
+        over a thread pool and the overview costs one round-trip of latency
+        (the slowest query) instead of the sum of all four.
+        """
+        queries = {
+            'total_users': self._count_total_users,
+            'active_users_7d': self._count_active_users_7d,
+            'total_ai_generations': self._count_ai_generations,
+            'paid': self._paid_totals,
+        }
+        
+        if concurrent:
+            with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+                futures = {
+                    name: pool.submit(tracing.wrap(self._fetch_metric), name, fetch)
+                    for name, fetch in queries.items()
+                }
+                metrics = {name: future.result() for name, future in futures.items()}
+        else:
+            metrics = {name: self._fetch_metric(name, fetch) for name, fetch in queries.items()}
+        
+        total_users = metrics['total_users']
+        paid = metrics['paid'] or {'users': 0, 'mrr': 0}
+        paid_users = paid['users']
+        
+        return {
+            'total_users': total_users,
+            'active_users_7d': metrics['active_users_7d'],
+            'total_ai_generations': metrics['total_ai_generations'],
+            'paid_users': paid_users,
+            'mrr_estimate': paid['mrr'],
+            'conversion_rate': round((paid_users / max(total_users, 1)) * 100, 2)
+        }
+    
+    def refresh_snapshots(self, max_age: float = 0) -> dict:
+        """Fold new events into the snapshots unless they are younger than max_age seconds"""
+        if not SUPABASE_SERVICE_KEY:
+            # Snapshots are served as they are (or views read live if never built)
+            print("SUPABASE_SERVICE_ROLE_KEY is not set, not refreshing analytics snapshots")
+            return SNAPSHOT_STATE.get('state') or {}
+        state = supabase_client(SUPABASE_URL, SUPABASE_SERVICE_KEY).post(
+            "/rest/v1/rpc/refresh_analytics_snapshots",
+            json_body={'max_age': f'{max_age} seconds'}
+        ).json()
+        SNAPSHOT_STATE.set('state', state)
+        return state
+    
+    def _refresh_in_background(self):
+        """Best effort: a frozen serverless instance may not finish it, which
+        is why the migration also schedules refreshes with pg_cron"""
+        if not _snapshot_refresh_lock.acquire(blocking=False):
+            return
+        
+        def run():
+            try:
+                self.refresh_snapshots(SNAPSHOT_MAX_AGE)
+            except Exception as e:
+                print(f"Error refreshing analytics snapshots: {e}")
+            finally:
+                _snapshot_refresh_lock.release()
+        
+        threading.Thread(target=run, daemon=True).start()
+    
+    def _snapshot_freshness(self) -> Optional[dict]:
+        """Age of the snapshots; None while they have never been built"""
+        state = SNAPSHOT_STATE.get('state')
+        if state is None:
+            rows = self.db.get("/rest/v1/analytics_snapshot_state?id=eq.1&select=refreshed_at,watermark").json()
+            state = rows[0] if rows else {}
+            SNAPSHOT_STATE.set('state', state)
+        if not state.get('refreshed_at'):
+            # Never built: build it now rather than serve empty snapshots
+            state = self.refresh_snapshots()
+        if not state.get('refreshed_at'):
+            return None  # another request holds the first build
+        
+        refreshed_at = parse_timestamp(state['refreshed_at'])
+        age = (datetime.now(timezone.utc) - refreshed_at).total_seconds()
+        if age > SNAPSHOT_MAX_AGE:
+            self._refresh_in_background()
+        return {'source': 'snapshot', 'refreshed_at': state['refreshed_at'], 'age_seconds': round(age, 1)}
+    
+    def _read_view(self, view: str, query: str) -> list:
+        """Rows of an analytics view, from its snapshot when one is deployed"""
+        snapshot = SNAPSHOT_TABLES.get(view)
+        if snapshot:
+            try:
+                freshness = self._snapshot_freshness()
+                if freshness:
+                    rows = self.db.get(f"/rest/v1/{snapshot}?{query}").json()
+                    self.freshness[view] = freshness
+                    return rows
+            except HTTPError as e:
+                if e.code != 404:
+                    raise
+                print(f"{snapshot} missing, reading {view} live")
+        
+        rows = self.db.get(f"/rest/v1/{view}?{query}").json()
+        self.freshness[view] = {'source': 'live'}
+        return rows
+    
+    def export_pages(self, name: str, since: Optional[str] = None) -> Iterator[List[Dict]]:
+        """Every row of an export, EXPORT_PAGE_SIZE rows per page
+        
+        Views with a snapshot are exported from the snapshot table, or live
+        until the snapshot migration is deployed.
+        """
+        export = EXPORTS[name]
+        key = export.get('key')
+        query = f"select={export.get('select', '*')}&order={key or export['order']}"
+        if export.get('filter'):
+            query += f"&{export['filter']}"
+        if since and export.get('since'):
+            query += f"&{export['since']}=gte.{urllib.parse.quote(since)}"
+        
+        relations = [SNAPSHOT_TABLES[export['relation']]] if export['relation'] in SNAPSHOT_TABLES else []
+        relations.append(export['relation'])
+        last, offset = None, 0
+        while True:
+            if key:
+                after = f"&{key}=gt.{urllib.parse.quote(str(last))}" if last is not None else ''
+                path_query, headers = f"{query}{after}&limit={EXPORT_PAGE_SIZE}", None
+            else:
+                path_query, headers = query, {
+                    'Range-Unit': 'items',
+                    'Range': f'{offset}-{offset + EXPORT_PAGE_SIZE - 1}'
+                }
+            
+            try:
+                page = self.db.get(f"/rest/v1/{relations[0]}?{path_query}", headers=headers).json()
+            except HTTPError as e:
+                # First page only: a missing snapshot falls back to the live view
+                if e.code != 404 or len(relations) == 1 or offset or last is not None:
+                    raise
+                print(f"{relations.pop(0)} missing, exporting {relations[0]} live")
+                continue
+            
+            if page:
+                yield page
+            if len(page) < EXPORT_PAGE_SIZE:
+                return
+            last = page[-1][key] if key else None
+            offset += len(page)
     
     def get_daily_signups(self, days: int = 30) -> list:
         """Get daily signup data from analytics view"""
         try:
-            url = f"{self.base_url}/rest/v1/analytics_daily_signups?order=signup_date.desc&limit={days}"
-            
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
+            data = self.db.get(f"/rest/v1/analytics_daily_signups?order=signup_date.desc&limit={days}").json()
             
             return data
             
         except Exception as e:
+            if self.strict:
+                raise
+            self.degraded = True
             print(f"Error getting daily signups: {e}")
             return []
     
     def get_conversion_funnel(self) -> list:
         """Get conversion funnel data by industry"""
         try:
-            url = f"{self.base_url}/rest/v1/analytics_conversion_funnel?order=total_signups.desc"
-            
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
+            data = self._read_view('analytics_conversion_funnel', "order=total_signups.desc")
             
             return data
             
         except Exception as e:
+            if self.strict:
+                raise
+            self.degraded = True
             print(f"Error getting conversion funnel: {e}")
             return []
     
     def get_ai_usage(self, days: int = 30) -> list:
         """Get AI tool usage statistics"""
         try:
-            url = f"{self.base_url}/rest/v1/analytics_ai_usage?order=usage_date.desc&limit={days * 3}"
-            
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
+            data = self.db.get(f"/rest/v1/analytics_ai_usage?order=usage_date.desc&limit={days * 3}").json()
             
             return data
             
         except Exception as e:
+            if self.strict:
+                raise
+            self.degraded = True
             print(f"Error getting AI usage: {e}")
             return []
     
     def get_user_engagement(self, limit: int = 100) -> list:
         """Get user engagement metrics"""
         try:
-            url = f"{self.base_url}/rest/v1/analytics_user_engagement?order=total_events.desc&limit={limit}"
-            
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
+            data = self._read_view('analytics_user_engagement', f"order=total_events.desc&limit={limit}")
             
             return data
             
         except Exception as e:
+            if self.strict:
+                raise
+            self.degraded = True
             print(f"Error getting user engagement: {e}")
             return []
     
     def get_industry_benchmarks(self) -> list:
         """Get industry benchmark data (K-anonymous)"""
         try:
-            url = f"{self.base_url}/rest/v1/analytics_industry_benchmarks?order=total_users.desc"
-            
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
+            data = self._read_view('analytics_industry_benchmarks', "order=total_users.desc")
             
             return data
             
         except Exception as e:
+            if self.strict:
+                raise
+            self.degraded = True
             print(f"Error getting industry benchmarks: {e}")
             return []
     
     def get_churn_risk(self) -> list:
         """Get users at risk of churning"""
         try:
-            url = f"{self.base_url}/rest/v1/analytics_churn_risk?order=days_inactive.desc&limit=50"
-            
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
+            data = self._read_view('analytics_churn_risk', "order=days_inactive.desc&limit=50")
             
             return data
             
         except Exception as e:
+            if self.strict:
+                raise
+            self.degraded = True
             print(f"Error getting churn risk: {e}")
             return []
     
     def get_revenue_metrics(self) -> dict:
         """Calculate revenue and LTV metrics"""
         try:
-            # Get all paid users with their subscription info
-            url = f"{self.base_url}/rest/v1/user_profiles?tier=neq.free&select=id,tier,created_at,generation_count"
-            
-            req = urllib.request.Request(url)
-            req.add_header('apikey', self.api_key)
-            req.add_header('Authorization', f'Bearer {self.api_key}')
-            
-            with urllib.request.urlopen(req) as response:
-                paid_users = json.loads(response.read().decode())
-            
-            # Calculate metrics
-            tier_pricing = {'pro': 99, 'enterprise': 499}
+            # Per-tier counts and sums plus signup cohorts, in one small row set
+            try:
+                summary = self._revenue_summary(cohorts=True)
+            except HTTPError as e:
+                if e.code != 404:
+                    raise
+                print("analytics_revenue RPC missing, aggregating paid profiles instead")
+                summary = self._revenue_from_profiles()
             
-            mrr = sum(tier_pricing.get(user['tier'], 0) for user in paid_users)
+            tiers = summary['tiers']
+            paid_users = sum(tier['users'] for tier in tiers)
+            mrr = round(sum(tier['mrr'] for tier in tiers))
             arr = mrr * 12
             
             # Average LTV (simplified: MRR * average lifetime in months)
-            avg_lifetime_months = 12  # Assumption
-            avg_ltv = (mrr / max(len(paid_users), 1)) * avg_lifetime_months
+            avg_ltv = (mrr / max(paid_users, 1)) * AVG_LIFETIME_MONTHS
             
             return {
                 'mrr': mrr,
                 'arr': arr,
-                'paid_users': len(paid_users),
+                'paid_users': paid_users,
                 'avg_ltv': round(avg_ltv, 2),
                 'tier_breakdown': {
-                    'pro': len([u for u in paid_users if u['tier'] == 'pro']),
-                    'enterprise': len([u for u in paid_users if u['tier'] == 'enterprise'])
-                }
+                    'pro': 0,
+                    'enterprise': 0,
+                    **{tier['tier']: tier['users'] for tier in tiers}
+                },
+                # Realized LTV per monthly signup cohort (empty before the RPC is deployed)
+                'cohorts': summary.get('cohorts', [])
             }
             
         except Exception as e:
+            if self.strict:
+                raise
+            self.degraded = True
             print(f"Error calculating revenue metrics: {e}")
             return {
                 'mrr': 0,
                 'arr': 0,
                 'paid_users': 0,
                 'avg_ltv': 0,
-                'tier_breakdown': {'pro': 0, 'enterprise': 0}
+                'tier_breakdown': {'pro': 0, 'enterprise': 0},
+                'cohorts': []
             }
+    
+    def query(self, endpoint: str, params: Dict) -> object:
+        """Run one endpoint; params holds its single-valued options (days, limit, concurrent)"""
+        if endpoint == 'overview':
+            return self.get_overview_stats(str(params.get('concurrent', 'true')).lower() != 'false')
+        if endpoint == 'signups':
+            return self.get_daily_signups(int(params.get('days', 30)))
+        if endpoint == 'funnel':
+            return self.get_conversion_funnel()
+        if endpoint == 'ai_usage':
+            return self.get_ai_usage(int(params.get('days', 30)))
+        if endpoint == 'engagement':
+            return self.get_user_engagement(int(params.get('limit', 100)))
+        if endpoint == 'benchmarks':
+            return self.get_industry_benchmarks()
+        if endpoint == 'churn':
+            return self.get_churn_risk()
+        if endpoint == 'revenue':
+            return self.get_revenue_metrics()
+        raise ValueError(f'Unknown endpoint: {endpoint}')
+    
+    def cached_query(self, endpoint: str, params: Dict) -> Tuple[object, Optional[str]]:
+        """query() through RESULT_CACHE; returns (data, ETag)
+        
+        A degraded result (an upstream error turned into empty data) is
+        neither cached nor given an ETag.
+        """
+        options = {option: str(params[option]) for option in ENDPOINT_OPTIONS.get(endpoint, ()) if option in params}
+        key = cache_key(endpoint, options)
+        view = ENDPOINT_VIEWS.get(endpoint)
+        
+        entry = RESULT_CACHE.get(key)
+        if entry is None:
+            data = self.query(endpoint, params)
+            if self.degraded:
+                return data, None
+            entry = {
+                'data': data,
+                'etag': f'"{cache_key(endpoint, data)[:32]}"',
+                'freshness': self.freshness.get(view)
+            }
+            RESULT_CACHE.set(key, entry)
+        
+        elif entry['freshness']:
+            freshness = dict(entry['freshness'])
+            if freshness.get('refreshed_at'):
+                age = datetime.now(timezone.utc) - parse_timestamp(freshness['refreshed_at'])
+                freshness['age_seconds'] = round(age.total_seconds(), 1)
+            self.freshness[view] = freshness
+        return entry['data'], entry['etag']
+    
+    def query_many(self, queries: List[Dict]) -> Tuple[Dict, Dict, Dict]:
+        """Run several queries concurrently; returns (data, errors, etags) keyed by section name
+        
+        Each query is a params dict with an 'endpoint' and a unique 'name'.
+        One section failing leaves the others intact.
+        """
+        def run(query: Dict):
+            with tracing.span('query', endpoint=query['endpoint']):
+                return self.cached_query(query['endpoint'], query)
+        
+        with ThreadPoolExecutor(max_workers=len(queries)) as pool:
+            futures = {query['name']: pool.submit(tracing.wrap(run), query) for query in queries}
+        
+        data, errors, etags = {}, {}, {}
+        for name, future in futures.items():
+            try:
+                data[name], etags[name] = future.result()
+            except Exception as e:
+                print(f"Error getting {name}: {e}")
+                errors[name] = str(e)
+        return data, errors, etags
 
 class handler(BaseHTTPRequestHandler):
     """Vercel serverless function handler"""
     
+    # HTTP/1.1 so exports can use chunked transfer encoding. Headers and body
+    # go out in separate writes, so on a kept-alive connection Nagle would
+    # hold the body back until the client's delayed ACK (~40ms)
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
     def _send_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
     
-    def _send_response(self, status_code: int, data: dict):
+    def _send_response(self, status_code: int, data: dict, headers: Optional[Dict[str, str]] = None,
+                       fields=None):
+        body, content_headers = encode_response(data, self.headers.get('Accept-Encoding', ''), fields)
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in {**content_headers, **(headers or {})}.items():
+            self.send_header(name, value)
+        self._send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _cache_headers(self, endpoints: List[str], etag: Optional[str], fields=None) -> Dict[str, str]:
+        """ETag and Cache-Control for a response covering these endpoints"""
+        if etag is None:
+            return {'Cache-Control': 'no-store'}
+        if fields:
+            etag = f'"{cache_key(etag, fields)[:32]}"'
+        max_age = min(CACHE_CONTROL[endpoint][0] for endpoint in endpoints)
+        stale = min(CACHE_CONTROL[endpoint][1] for endpoint in endpoints)
+        return {
+            # Weak: the same data goes out gzipped, brotli'd or plain
+            'ETag': f'W/{etag}',
+            # private: superadmin-only data must stay out of shared caches
+            'Cache-Control': f'private, max-age={max_age}, stale-while-revalidate={stale}',
+            'Vary': 'Authorization, Accept-Encoding'
+        }
+    
+    def _send_not_modified(self, headers: Dict[str, str]) -> bool:
+        """Answer 304 if the client's If-None-Match already names this ETag"""
+        etag = headers.get('ETag')
+        candidates = [
+            tag.strip().removeprefix('W/') for tag in self.headers.get('If-None-Match', '').split(',')
+        ]
+        if etag is None or not (etag.removeprefix('W/') in candidates or '*' in candidates):
+            return False
+        self.send_response(304)
+        for name, value in headers.items():
+            self.send_header(name, value)
         self._send_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        return True
+    
+    def end_headers(self):
+        tracing.add_server_timing(self)
+        super().end_headers()
     
     def do_OPTIONS(self):
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self._send_cors_headers()
         self.end_headers()
     
+    def _authorize(self, api: AnalyticsAPI, user_id: Optional[str]) -> bool:
+        """Resolve the caller (verified token, else user_id) and require superadmin
+        
+        Sends the error response and returns False when the caller is refused.
+        """
+        claims = None
+        token = bearer_token(self.headers.get('Authorization', ''))
+        if token and SUPABASE_JWT_SECRET:
+            try:
+                claims = verify_jwt(token, SUPABASE_JWT_SECRET)
+            except InvalidToken as e:
+                self._send_response(401, {
+                    'success': False,
+                    'error': str(e)
+                })
+                return False
+            if user_id and user_id != claims.get('sub'):
+                self._send_response(403, {
+                    'success': False,
+                    'error': 'Token does not belong to user_id'
+                })
+                return False
+            user_id = claims.get('sub')
+        
+        if not user_id:
+            self._send_response(400, {
+                'success': False,
+                'error': 'user_id required'
+            })
+            return False
+        
+        # Check if superadmin
+        with tracing.span('auth'):
+            is_superadmin = api._is_superadmin(user_id, claims)
+        if not is_superadmin:
+            self._send_response(403, {
+                'success': False,
+                'error': 'Access denied. Superadmin only.'
+            })
+            return False
+        return True
+    
+    def _send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+    
+    def _stream_export(self, api: AnalyticsAPI, name: str, fmt: str, since: Optional[str]):
+        """Write an export page by page with chunked encoding
+        
+        The first page is fetched before the headers go out, so an upstream
+        failure there still gets a proper error response. A failure later
+        on ends the connection without the final chunk, which clients see
+        as a truncated transfer rather than a complete file.
+        """
+        pages = api.export_pages(name, since)
+        with tracing.span('export', export=name) as span:
+            first = next(pages, [])
+            encode = ndjson_chunk if fmt == 'ndjson' else CSVChunker()
+            
+            self.send_response(200)
+            self.send_header('Content-Type', EXPORT_FORMATS[fmt])
+            self.send_header('Content-Disposition', f'attachment; filename="{name}.{fmt}"')
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self._send_cors_headers()
+            self.end_headers()
+            
+            rows = 0
+            try:
+                for page in itertools.chain([first] if first else [], pages):
+                    self._send_chunk(encode(page))
+                    rows += len(page)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                print("Client disconnected mid-export")
+                self.close_connection = True
+            except Exception as e:
+                print(f"Error streaming {name} export after {rows} rows: {e}")
+                self.close_connection = True
+            span.set(rows=rows)
+    
+    def _refresh_snapshots(self, api: AnalyticsAPI, requested):
+        """refresh=true: rebuild the snapshots before reading them"""
+        if str(requested).lower() not in ('1', 'true'):
+            return
+        RESULT_CACHE.clear()
+        with tracing.span('refresh'):
+            try:
+                api.refresh_snapshots()
+            except HTTPError as e:
+                if e.code != 404:
+                    raise
+                print("refresh_analytics_snapshots RPC missing, reading live views")
+    
+    def _send_batch(self, api: AnalyticsAPI, queries: List[Dict], fields=None):
+        """Answer several queries in one response, with errors per section"""
+        if len(queries) > MAX_BATCH_QUERIES:
+            self._send_response(400, {
+                'success': False,
+                'error': f'At most {MAX_BATCH_QUERIES} queries per batch'
+            })
+            return
+        
+        names = [query['name'] for query in queries]
+        if len(set(names)) != len(names):
+            self._send_response(400, {
+                'success': False,
+                'error': 'Query names must be unique'
+            })
+            return
+        
+        data, errors, etags = api.query_many(queries)
+        
+        # One ETag over every section; a batch with a failed or degraded section gets none
+        etag = None
+        if not errors and None not in etags.values():
+            etag = f'"{cache_key(sorted(etags.items()))[:32]}"'
+        headers = {}
+        if self.command == 'GET':
+            headers = self._cache_headers([query['endpoint'] for query in queries], etag, fields)
+            if self._send_not_modified(headers):
+                return
+        
+        self._send_response(200, {
+            'success': not errors,
+            'data': data,
+            'errors': errors,
+            'freshness': api.freshness,
+            'timestamp': datetime.now().isoformat()
+        }, headers, fields)
+    
+    @tracing.traced
     def do_GET(self):
         """Handle GET requests for analytics data"""
         try:
@@ -283,61 +915,69 @@ class handler(BaseHTTPRequestHandler):
             parsed_url = urllib.parse.urlparse(self.path)
             query_params = urllib.parse.parse_qs(parsed_url.query)
             
-            # Get user ID from query (should be from auth token in production)
+            # Get user ID from query, or from the verified token when one is sent
             user_id = query_params.get('user_id', [None])[0]
             endpoint = query_params.get('endpoint', ['overview'])[0]
+            params = {key: values[0] for key, values in query_params.items()}
             
-            if not user_id:
-                self._send_response(400, {
-                    'success': False,
-                    'error': 'user_id required'
-                })
+            # export=engagement&format=csv: every row, streamed
+            if 'export' in params:
+                name, fmt = params['export'], params.get('format', 'ndjson')
+                if name not in EXPORTS or fmt not in EXPORT_FORMATS:
+                    self._send_response(400, {
+                        'success': False,
+                        'error': f"export must be one of: {', '.join(EXPORTS)}; "
+                                 f"format one of: {', '.join(EXPORT_FORMATS)}"
+                    })
+                    return
+                api = AnalyticsAPI(strict=True)
+                if self._authorize(api, user_id):
+                    self._stream_export(api, name, fmt, params.get('since'))
+                return
+            
+            # endpoint=overview,funnel,churn: authorize once, run them together
+            endpoints = list(dict.fromkeys(name.strip() for name in endpoint.split(',') if name.strip()))
+            if len(endpoints) > 1:
+                api = AnalyticsAPI(strict=True)
+                if self._authorize(api, user_id):
+                    self._refresh_snapshots(api, params.get('refresh'))
+                    self._send_batch(
+                        api, [dict(params, endpoint=name, name=name) for name in endpoints], params.get('fields')
+                    )
                 return
             
             # Initialize API
             api = AnalyticsAPI()
-            
-            # Check if superadmin
-            if not api._is_superadmin(user_id):
-                self._send_response(403, {
-                    'success': False,
-                    'error': 'Access denied. Superadmin only.'
-                })
+            if not self._authorize(api, user_id):
                 return
             
-            # Route to appropriate endpoint
-            if endpoint == 'overview':
-                data = api.get_overview_stats()
-            elif endpoint == 'signups':
-                days = int(query_params.get('days', [30])[0])
-                data = api.get_daily_signups(days)
-            elif endpoint == 'funnel':
-                data = api.get_conversion_funnel()
-            elif endpoint == 'ai_usage':
-                days = int(query_params.get('days', [30])[0])
-                data = api.get_ai_usage(days)
-            elif endpoint == 'engagement':
-                limit = int(query_params.get('limit', [100])[0])
-                data = api.get_user_engagement(limit)
-            elif endpoint == 'benchmarks':
-                data = api.get_industry_benchmarks()
-            elif endpoint == 'churn':
-                data = api.get_churn_risk()
-            elif endpoint == 'revenue':
-                data = api.get_revenue_metrics()
-            else:
+            endpoint = endpoints[0] if endpoints else endpoint
+            if endpoint not in ENDPOINTS:
                 self._send_response(400, {
                     'success': False,
                     'error': f'Unknown endpoint: {endpoint}'
                 })
                 return
             
+            # Route to appropriate endpoint
+            self._refresh_snapshots(api, params.get('refresh'))
+            with tracing.span('query', endpoint=endpoint):
+                data, etag = api.cached_query(endpoint, params)
+            
+            # Unchanged since the client's copy: headers only
+            headers = self._cache_headers([endpoint], etag, params.get('fields'))
+            if self._send_not_modified(headers):
+                return
+            
             # Return data
-            self._send_response(200, {
+            response = {
                 'success': True,
                 'data': data,
                 'timestamp': datetime.now().isoformat()
-            })
+            }
+            if api.freshness:
+                response['freshness'] = api.freshness
+            self._send_response(200, response, headers, params.get('fields'))
             
         except Exception as e:
             print(f"Error: {e}")
@@ -346,6 +986,92 @@ class handler(BaseHTTPRequestHandler):
                 'error': str(e)
             })
     
+    def _handle_query_batch(self, data: Dict, queries: List[Dict]):
+        """POST form of the batch: per-query options, and the same endpoint
+        may appear twice under different names"""
+        if not isinstance(queries, list) or not queries or not all(
+            isinstance(query, dict) and isinstance(query.get('endpoint'), str) for query in queries
+        ):
+            self._send_response(400, {
+                'success': False,
+                'error': 'queries must be a non-empty list of {"endpoint": ...} objects'
+            })
+            return
+        
+        api = AnalyticsAPI(strict=True)
+        if self._authorize(api, data.get('user_id')):
+            self._refresh_snapshots(api, data.get('refresh'))
+            self._send_batch(api, [
+                dict(query, name=str(query.get('name') or query['endpoint'])) for query in queries
+            ], data.get('fields'))
+    
+    def _note_role_change(self, event: Dict):
+        if event.get('event_type') in ROLE_CHANGE_EVENTS:
+            payload = event.get('payload') or {}
+            invalidate_superadmin(payload.get('target_user_id') or event.get('user_id'))
+    
+    def _ingest_events(self, events, mode: str):
+        """Validate a list of events and write the valid ones in one insert
+        (direct) or hand them to the buffer (buffered)
+        
+        In direct mode, events the database still refuses (e.g. a user_id
+        with no account) are split out of the insert and reported in
+        'rejected' with the rest written.
+        """
+        if not isinstance(events, list) or not events:
+            self._send_response(400, {
+                'success': False,
+                'error': 'events must be a non-empty list'
+            })
+            return
+        if len(events) > MAX_EVENTS_PER_REQUEST:
+            self._send_response(413, {
+                'success': False,
+                'error': f'At most {MAX_EVENTS_PER_REQUEST} events per request'
+            })
+            return
+        
+        rows, accepted, indices, rejected = [], [], [], []
+        for index, event in enumerate(events):
+            try:
+                rows.append(normalize_event(event))
+                accepted.append(event)
+                indices.append(index)
+            except ValueError as e:
+                rejected.append({'index': index, 'error': str(e)})
+        
+        if not rows:
+            self._send_response(400, {
+                'success': False,
+                'error': 'No valid events',
+                'rejected': rejected
+            })
+            return
+        
+        with tracing.span('ingest', mode=mode, events=len(rows)):
+            if mode == 'buffered':
+                EVENT_BUFFER.add(rows)
+                written = accepted
+            else:
+                refused, unwritten = insert_isolating(insert_events, rows)
+                failed = {position: rejection_message(error) for position, error in refused}
+                failed.update((position, 'Not written, try again') for position in unwritten)
+                rejected.extend({'index': indices[position], 'error': error} for position, error in failed.items())
+                rejected.sort(key=lambda item: item['index'])
+                written = [event for position, event in enumerate(accepted) if position not in failed]
+        
+        for event in written:
+            self._note_role_change(event)
+        
+        status = 202 if mode == 'buffered' else 200 if written else 400
+        self._send_response(status, {
+            'success': bool(written),
+            'accepted': len(written),
+            'rejected': rejected,
+            'buffered': mode == 'buffered'
+        })
+    
+    @tracing.traced
     def do_POST(self):
         """Handle POST for tracking events"""
         try:
@@ -354,56 +1080,57 @@ class handler(BaseHTTPRequestHandler):
             body = self.rfile.read(content_length).decode('utf-8')
             data = json.loads(body) if body else {}
             
-            # Extract event data
-            user_id = data.get('user_id')
-            event_type = data.get('event_type')
-            payload = data.get('payload', {})
+            # {"user_id", "queries": [{"endpoint", "name"?, "days"?, "limit"?}]}
+            queries = data.get('queries')
+            if queries is not None:
+                self._handle_query_batch(data, queries)
+                return
             
-            if not user_id or not event_type:
+            mode = data.get('mode', INGEST_MODE)
+            if mode not in INGEST_MODES:
                 self._send_response(400, {
                     'success': False,
-                    'error': 'user_id and event_type required'
+                    'error': f"mode must be one of: {', '.join(INGEST_MODES)}"
                 })
                 return
             
-            # Prepare event record
-            event = {
-                'user_id': user_id,
-                'event_type': event_type,
-                'ts': data.get('ts', datetime.now().isoformat()),
-                'session_id': data.get('session_id'),
-                'page': data.get('page'),
-                'utm_source': data.get('utm_source'),
-                'utm_campaign': data.get('utm_campaign'),
-                'country': data.get('country'),
-                'region': data.get('region'),
-                'device_class': data.get('device_class'),
-                'payload': json.dumps(payload)
-            }
+            # {"events": [{"user_id", "event_type", ...}, ...], "mode"?}
+            events = data.get('events')
+            if events is not None:
+                self._ingest_events(events, mode)
+                return
             
-            # Insert into Supabase
-            url = f"{SUPABASE_URL}/rest/v1/events"
-            event_data = json.dumps(event).encode('utf-8')
-            
-            req = urllib.request.Request(
-                url,
-                data=event_data,
-                headers={
-                    'Content-Type': 'application/json',
-                    'apikey': SUPABASE_KEY,
-                    'Authorization': f'Bearer {SUPABASE_KEY}',
-                    'Prefer': 'return=minimal'
-                },
-                method='POST'
-            )
+            # Single event
+            try:
+                event = normalize_event(data)
+            except ValueError as e:
+                self._send_response(400, {
+                    'success': False,
+                    'error': str(e)
+                })
+                return
             
-            with urllib.request.urlopen(req) as response:
+            if mode == 'buffered':
+                EVENT_BUFFER.add([event])
+                success = True
+            else:
+                # Insert into Supabase
+                response = supabase_client(SUPABASE_URL, SUPABASE_KEY).post(
+                    "/rest/v1/events",
+                    json_body=event,
+                    headers={'Prefer': 'return=minimal'}
+                )
                 success = response.status == 201
             
-            self._send_response(200 if success else 500, {
+            self._note_role_change(data)
+            
+            result = {
                 'success': success,
-                'event_type': event_type
-            })
+                'event_type': event['event_type']
+            }
+            if mode == 'buffered':
+                result['buffered'] = True
+            self._send_response((202 if mode == 'buffered' else 200) if success else 500, result)
             
         except Exception as e:
             print(f"Error tracking event: {e}")
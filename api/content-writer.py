@@ -6,156 +6,342 @@ Simple: User types what they want, AI writes it.
 from http.server import BaseHTTPRequestHandler
 import json
 import os
-import urllib.parse
-import urllib.request
+import sys
 from datetime import datetime
+from typing import Iterator, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib import tracing
+from _lib.cache import MinHashIndex, build_cache, cache_key, normalize_text
+from _lib.encoding import encode_response
+from _lib.http_client import gemini_client, supabase_client
 
 # Environment variables
 GEMINI_API_KEY = os.environ.get('GOOGLE_GEMINI_API_KEY', '')
 SUPABASE_URL = os.environ.get('VITE_SUPABASE_URL', '')
-SUPABASE_KEY = os.environ.get('VITE_SUPABASE_ANON_KEY', '')
+# The quota RPCs are granted to service_role only: the anon key ships to
+# the browser, so anyone holding it could spend or refund any user's slots
+SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
+
+CONTENT_TYPES = ('blog', 'social', 'email', 'ad', 'general')
+
+# Bump when the prompts change so cached content from old prompts is not reused
+PROMPT_VERSION = 'v1'
+
+# 'off', 'exact' or 'similar' - callers can override per request with "cache"
+CACHE_DEFAULT_MODE = os.environ.get('CONTENT_CACHE_MODE', 'exact')
+
+# Exact matches on content type + normalized prompt; set CONTENT_CACHE_DB
+# (e.g. /tmp/content-cache.sqlite3) to add a persistent tier
+CONTENT_CACHE = build_cache(
+    max_entries=512,
+    ttl=24 * 3600,
+    persistent_path=os.environ.get('CONTENT_CACHE_DB', '')
+)
+
+# Near-duplicate prompts ("write a facebook post about our fall sale!")
+SIMILAR_PROMPTS = MinHashIndex(threshold=0.85, max_entries=512, ttl=24 * 3600)
 
 class ContentWriter:
     """Dead simple AI content generator"""
     
     def __init__(self):
-        self.gemini_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+        self.gemini_path = "/v1beta/models/gemini-pro:generateContent"
+        self.gemini_stream_path = "/v1beta/models/gemini-pro:streamGenerateContent"
+        self.db = supabase_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+        self.gemini = gemini_client()
     
-    def check_usage_limit(self, user_id: str) -> dict:
-        """Check if user has generations remaining"""
+    def reserve_usage(self, user_id: str) -> dict:
+        """Atomically check the user's limit and reserve one generation slot
+        
+        Single round-trip to the reserve_generation RPC; the conditional
+        UPDATE inside it stops parallel requests from overrunning the limit.
+        A counted slot comes back with a reservation_id for refund_usage.
+        """
         try:
-            url = f"{SUPABASE_URL}/rest/v1/user_profiles?id=eq.{user_id}&select=generation_count,generation_limit,role"
-            
-            req = urllib.request.Request(url)
-            req.add_header('apikey', SUPABASE_KEY)
-            req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
-            
-            if data and len(data) > 0:
-                profile = data[0]
-                is_superadmin = profile.get('role') == 'superadmin'
-                
-                if is_superadmin:
-                    return {'allowed': True, 'remaining': 999999, 'is_superadmin': True}
-                
-                remaining = profile.get('generation_limit', 3) - profile.get('generation_count', 0)
-                return {
-                    'allowed': remaining > 0,
-                    'remaining': remaining,
-                    'is_superadmin': False
-                }
+            result = self.db.post(
+                "/rest/v1/rpc/reserve_generation",
+                json_body={'user_uuid': user_id}
+            ).json()
             
-            return {'allowed': False, 'remaining': 0, 'is_superadmin': False, 'error': 'Profile not found'}
+            return {
+                'allowed': bool(result.get('allowed')),
+                'remaining': result.get('remaining', 0),
+                'is_superadmin': bool(result.get('is_superadmin')),
+                'reservation_id': result.get('reservation_id'),
+                **({'error': result['error']} if result.get('error') else {})
+            }
             
         except Exception as e:
-            print(f"Error checking usage: {e}")
+            print(f"Error reserving usage: {e}")
             return {'allowed': False, 'remaining': 0, 'is_superadmin': False, 'error': str(e)}
     
-    def increment_usage(self, user_id: str) -> bool:
-        """Increment user's generation count"""
+    def refund_usage(self, usage: dict) -> Optional[int]:
+        """Give back the slot reserve_usage took after a failed generation
+        
+        Returns the remaining count, or None if there was nothing to refund
+        (superadmin, or the reservation was already refunded).
+        """
+        if not usage.get('reservation_id'):
+            return None
         try:
-            # First check if superadmin
-            check_url = f"{SUPABASE_URL}/rest/v1/user_profiles?id=eq.{user_id}&select=role"
-            req = urllib.request.Request(check_url)
-            req.add_header('apikey', SUPABASE_KEY)
-            req.add_header('Authorization', f'Bearer {SUPABASE_KEY}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
-            
-            if data and len(data) > 0 and data[0].get('role') == 'superadmin':
-                return True  # Don't increment for superadmin
-            
-            # Increment for regular users
-            url = f"{SUPABASE_URL}/rest/v1/rpc/increment_generation_count"
-            payload = json.dumps({'user_uuid': user_id}).encode('utf-8')
-            
-            req = urllib.request.Request(
-                url,
-                data=payload,
-                headers={
-                    'Content-Type': 'application/json',
-                    'apikey': SUPABASE_KEY,
-                    'Authorization': f'Bearer {SUPABASE_KEY}'
-                },
-                method='POST'
-            )
-            
-            with urllib.request.urlopen(req) as response:
-                return response.status == 200
+            return self.db.post(
+                "/rest/v1/rpc/refund_generation",
+                json_body={'reservation_uuid': usage['reservation_id']}
+            ).json()
             
         except Exception as e:
-            print(f"Error incrementing usage: {e}")
-            return False
+            print(f"Error refunding usage: {e}")
+            return None
     
-    def generate_content(self, prompt: str, content_type: str = 'general') -> str:
-        """Generate content using Gemini AI - SIMPLE"""
-        try:
-            # Build the AI prompt based on content type
-            prompts = {
-                'blog': f"Write a professional blog post about: {prompt}\n\nMake it engaging, informative, and SEO-friendly. Include an introduction, main points, and conclusion.",
-                'social': f"Write a catchy social media post about: {prompt}\n\nKeep it short, engaging, with emojis. Perfect for Facebook or Instagram.",
-                'email': f"Write a professional email about: {prompt}\n\nInclude subject line, greeting, body, and closing.",
-                'ad': f"Write compelling ad copy for: {prompt}\n\nMake it attention-grabbing and persuasive. Include a strong call-to-action.",
-                'general': f"Write professional content about: {prompt}\n\nMake it clear, concise, and useful."
+    def release_for_cache_hit(self, usage: dict) -> dict:
+        """Hand back the slot reserved for a request the cache answered
+        
+        Cache hits never reach Gemini, so they don't count against the
+        user; returns the usage with the refunded remaining count and no
+        reservation left to refund.
+        """
+        refunded = self.refund_usage(usage)
+        return dict(
+            usage,
+            reservation_id=None,
+            remaining=refunded if refunded is not None else usage['remaining']
+        )
+    
+    def _build_prompt(self, prompt: str, content_type: str) -> str:
+        """Build the AI prompt based on content type"""
+        prompts = {
+            'blog': f"Write a professional blog post about: {prompt}\n\nMake it engaging, informative, and SEO-friendly. Include an introduction, main points, and conclusion.",
+            'social': f"Write a catchy social media post about: {prompt}\n\nKeep it short, engaging, with emojis. Perfect for Facebook or Instagram.",
+            'email': f"Write a professional email about: {prompt}\n\nInclude subject line, greeting, body, and closing.",
+            'ad': f"Write compelling ad copy for: {prompt}\n\nMake it attention-grabbing and persuasive. Include a strong call-to-action.",
+            'general': f"Write professional content about: {prompt}\n\nMake it clear, concise, and useful."
+        }
+        
+        return prompts.get(content_type, prompts['general'])
+    
+    def _request_content(self, prompt: str, content_type: str) -> Optional[str]:
+        """Call Gemini; raises on upstream errors, None if no candidates"""
+        payload = {
+            "contents": [{
+                "parts": [{"text": self._build_prompt(prompt, content_type)}]
+            }],
+            "generationConfig": {
+                "temperature": 0.7,
+                "maxOutputTokens": 1000,
             }
-            
-            full_prompt = prompts.get(content_type, prompts['general'])
-            
-            # Call Gemini API
-            payload = {
-                "contents": [{
-                    "parts": [{"text": full_prompt}]
-                }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "maxOutputTokens": 1000,
+        }
+        
+        result = self.gemini.post(
+            self.gemini_path,
+            params={'key': GEMINI_API_KEY},
+            json_body=payload
+        ).json()
+        
+        # Extract generated text
+        if 'candidates' in result and len(result['candidates']) > 0:
+            generated_text = result['candidates'][0]['content']['parts'][0]['text']
+            return generated_text.strip()
+        
+        return None
+    
+    def cached_content(self, prompt: str, content_type: str, cache_mode: str) -> Optional[dict]:
+        """Cache lookup for generate/stream; None on a miss or when caching is off"""
+        if cache_mode not in ('exact', 'similar'):
+            return None
+        
+        cached = CONTENT_CACHE.get(cache_key(content_type, normalize_text(prompt), PROMPT_VERSION))
+        if cached is not None:
+            return {'success': True, 'content': cached, 'cached': True, 'cache_match': 'exact'}
+        
+        if cache_mode == 'similar':
+            cached, similarity = SIMILAR_PROMPTS.query(content_type, prompt)
+            if cached is not None:
+                return {
+                    'success': True,
+                    'content': cached,
+                    'cached': True,
+                    'cache_match': 'similar',
+                    'similarity': similarity
                 }
-            }
-            
-            data = json.dumps(payload).encode('utf-8')
-            req = urllib.request.Request(
-                f"{self.gemini_url}?key={GEMINI_API_KEY}",
-                data=data,
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode())
-            
-            # Extract generated text
-            if 'candidates' in result and len(result['candidates']) > 0:
-                generated_text = result['candidates'][0]['content']['parts'][0]['text']
-                return generated_text.strip()
-            
-            return "Sorry, I couldn't generate content right now. Please try again."
-            
+        
+        return None
+    
+    def remember_content(self, prompt: str, content_type: str, cache_mode: str, content: str):
+        """Store freshly generated content for later cache hits"""
+        if cache_mode == 'off':
+            return
+        CONTENT_CACHE.set(cache_key(content_type, normalize_text(prompt), PROMPT_VERSION), content)
+        SIMILAR_PROMPTS.add(content_type, prompt, content)
+    
+    def generate(self, prompt: str, content_type: str = 'general', cache_mode: str = CACHE_DEFAULT_MODE) -> dict:
+        """Generate content, serving repeated prompts from the cache
+        
+        cache_mode: 'off', 'exact' (same content type + normalized prompt),
+        or 'similar' (also accept a near-duplicate prompt via MinHash).
+        Cache hits never call Gemini.
+        """
+        if content_type not in CONTENT_TYPES:
+            content_type = 'general'
+        
+        cached = self.cached_content(prompt, content_type, cache_mode)
+        if cached is not None:
+            return cached
+        
+        try:
+            generated_text = self._request_content(prompt, content_type)
         except Exception as e:
             print(f"Error generating content: {e}")
-            return f"Error: {str(e)}"
+            return {'success': False, 'content': f"Error: {str(e)}", 'cached': False}
+        
+        if not generated_text:
+            return {
+                'success': False,
+                'content': "Sorry, I couldn't generate content right now. Please try again.",
+                'cached': False
+            }
+        
+        self.remember_content(prompt, content_type, cache_mode, generated_text)
+        return {'success': True, 'content': generated_text, 'cached': False}
+    
+    def stream_content(self, prompt: str, content_type: str = 'general') -> Iterator[str]:
+        """Yield text chunks from Gemini's streaming endpoint as they arrive; raises on errors"""
+        payload = {
+            "contents": [{
+                "parts": [{"text": self._build_prompt(prompt, content_type)}]
+            }],
+            "generationConfig": {
+                "temperature": 0.7,
+                "maxOutputTokens": 1000,
+            }
+        }
+        
+        with self.gemini.stream(
+            'POST',
+            self.gemini_stream_path,
+            params={'alt': 'sse', 'key': GEMINI_API_KEY},
+            json_body=payload
+        ) as response:
+            for line in response:
+                line = line.strip()
+                if not line.startswith(b'data:'):
+                    continue
+                event = json.loads(line[5:].decode())
+                for candidate in event.get('candidates', [])[:1]:
+                    for part in candidate.get('content', {}).get('parts', []):
+                        if part.get('text'):
+                            yield part['text']
+    
+    def generate_content(self, prompt: str, content_type: str = 'general') -> str:
+        """Generate content using Gemini AI - SIMPLE"""
+        return self.generate(prompt, content_type)['content']
 
 class handler(BaseHTTPRequestHandler):
     """Vercel serverless function handler"""
     
+    # HTTP/1.1 so streamed responses can use chunked transfer encoding. Each
+    # SSE frame is its own small write, so Nagle would hold it back until the
+    # client's delayed ACK (~40ms) and stall time-to-first-byte
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
     def _send_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
     
     def _send_response(self, status_code: int, data: dict):
+        body, headers = encode_response(data, self.headers.get('Accept-Encoding', ''))
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
         self._send_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
+    
+    def end_headers(self):
+        # Streamed responses only get the stages before the first byte
+        tracing.add_server_timing(self)
+        super().end_headers()
+    
+    def _send_event(self, event: str, data: dict):
+        """Write one Server-Sent Event as an HTTP chunk"""
+        frame = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+        self.wfile.write(f"{len(frame):X}\r\n".encode() + frame + b"\r\n")
+        self.wfile.flush()
+    
+    def _stream_generation(self, writer: ContentWriter, usage: dict,
+                           prompt: str, content_type: str, cache_mode: str):
+        """Relay Gemini's output to the client as SSE while it is generated
+        
+        The slot reserved up front only sticks once Gemini's stream
+        completes; it is refunded on a cache hit, or if Gemini fails or the
+        client goes away mid-stream.
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('X-Accel-Buffering', 'no')
+        self._send_cors_headers()
+        self.end_headers()
+        
+        completed = False
+        try:
+            cached = writer.cached_content(prompt, content_type, cache_mode)
+            if cached is not None:
+                self._send_event('chunk', {'text': cached['content']})
+                content = cached['content']
+                usage = writer.release_for_cache_hit(usage)
+            else:
+                parts = []
+                for text in writer.stream_content(prompt, content_type):
+                    parts.append(text)
+                    self._send_event('chunk', {'text': text})
+                content = ''.join(parts).strip()
+                if not content:
+                    raise ValueError('Empty response from Gemini')
+                writer.remember_content(prompt, content_type, cache_mode, content)
+            
+            completed = True
+            self._send_event('done', {
+                'success': True,
+                'cached': cached is not None,
+                'cache_match': cached.get('cache_match') if cached else None,
+                'remaining': usage['remaining']
+            })
+        
+        except (BrokenPipeError, ConnectionResetError):
+            print("Client disconnected mid-stream")
+        
+        except Exception as e:
+            print(f"Error streaming content: {e}")
+            try:
+                self._send_event('error', {
+                    'success': False,
+                    'error': "Sorry, I couldn't generate content right now. Please try again."
+                })
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        
+        finally:
+            if not completed:
+                writer.refund_usage(usage)
+            try:
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
     
     def do_OPTIONS(self):
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self._send_cors_headers()
         self.end_headers()
     
+    @tracing.traced
     def do_POST(self):
         """Handle POST requests"""
         try:
@@ -193,28 +379,67 @@ class handler(BaseHTTPRequestHandler):
                 })
                 return
             
-            # Check usage limit
-            usage_check = writer.check_usage_limit(user_id)
+            if not SUPABASE_SERVICE_KEY:
+                # Without it every reservation is refused; say so rather than blame the quota
+                print("SUPABASE_SERVICE_ROLE_KEY is not set; cannot reserve generations")
+                self._send_response(500, {
+                    'success': False,
+                    'error': 'Content writer is not configured (missing SUPABASE_SERVICE_ROLE_KEY)'
+                })
+                return
+            
+            # Check usage limit and reserve a slot in one round-trip
+            with tracing.span('reserve'):
+                usage = writer.reserve_usage(user_id)
             
-            if not usage_check['allowed']:
+            if not usage['allowed']:
                 self._send_response(403, {
                     'success': False,
-                    'error': f"You've used all {usage_check.get('remaining', 0)} free tries! Please upgrade to continue.",
+                    'error': f"You've used all {usage.get('remaining', 0)} free tries! Please upgrade to continue.",
                     'remaining': 0
                 })
                 return
             
             # Generate content
-            content = writer.generate_content(prompt, content_type)
+            cache_mode = data.get('cache', CACHE_DEFAULT_MODE)
+            if cache_mode not in ('off', 'exact', 'similar'):
+                cache_mode = CACHE_DEFAULT_MODE
+            
+            # Streaming mode: {"stream": true} or Accept: text/event-stream
+            if data.get('stream') or 'text/event-stream' in self.headers.get('Accept', ''):
+                if content_type not in CONTENT_TYPES:
+                    content_type = 'general'
+                with tracing.span('stream', cache_mode=cache_mode):
+                    self._stream_generation(writer, usage, prompt, content_type, cache_mode)
+                return
+            
+            with tracing.span('generate', cache_mode=cache_mode) as span:
+                generation = writer.generate(prompt, content_type, cache_mode)
+                span.set(cached=generation.get('cached', False))
             
-            # Increment usage count
-            writer.increment_usage(user_id)
+            if not generation['success']:
+                # Failed generations don't count against the user
+                with tracing.span('refund'):
+                    refunded = writer.refund_usage(usage)
+                remaining = refunded if refunded is not None else usage['remaining']
+                self._send_response(502, {
+                    'success': False,
+                    'error': "Sorry, I couldn't generate content right now. Please try again.",
+                    'remaining': remaining
+                })
+                return
+            
+            if generation['cached']:
+                with tracing.span('refund'):
+                    usage = writer.release_for_cache_hit(usage)
             
             # Return success
             self._send_response(200, {
                 'success': True,
-                'content': content,
-                'remaining': usage_check['remaining'] - 1 if not usage_check['is_superadmin'] else 999999
+                'content': generation['content'],
+                'cached': generation['cached'],
+                'cache_match': generation.get('cache_match'),
+                'remaining': usage['remaining']
             })
         
         except Exception as e:
@@ -224,10 +449,16 @@ class handler(BaseHTTPRequestHandler):
                 'error': 'Something went wrong. Please try again!'
             })
     
+    @tracing.traced
     def do_GET(self):
         """Handle GET requests"""
         self._send_response(200, {
             'service': 'AI Content Writer API',
             'version': '1.0.0',
-            'usage': 'POST with {user_id, prompt, content_type}'
+            'usage': 'POST with {user_id, prompt, content_type, cache?: off|exact|similar, stream?: true}',
+            'cache': {
+                'default_mode': CACHE_DEFAULT_MODE,
+                'exact': CONTENT_CACHE.stats(),
+                'similar': SIMILAR_PROMPTS.stats()
+            }
         })
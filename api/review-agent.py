@@ -7,9 +7,18 @@ from http.server import BaseHTTPRequestHandler
 import json
 import os
 from datetime import datetime
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
+import sys
+import time
 import urllib.parse
-import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib import tracing
+from _lib.cache import build_cache, cache_key, normalize_text
+from _lib.encoding import encode_response
+from _lib.http_client import HTTPError, gemini_client, google_places_client, supabase_client, yelp_client
 
 # Environment variables
 GEMINI_API_KEY = os.environ.get('GOOGLE_GEMINI_API_KEY', '')
@@ -18,21 +27,56 @@ YELP_API_KEY = os.environ.get('YELP_API_KEY', '')
 SUPABASE_URL = os.environ.get('VITE_SUPABASE_URL', '')
 SUPABASE_KEY = os.environ.get('VITE_SUPABASE_ANON_KEY', '')
 
+# Parallel Gemini calls for bulk-generate (callers may ask for fewer)
+BULK_DEFAULT_CONCURRENCY = 5
+BULK_MAX_CONCURRENCY = 10
+
+# Reviews packed into one Gemini prompt when bulk-generate is batched
+BATCH_MAX_SIZE = 20
+BATCH_MAX_OUTPUT_TOKENS = 8192
+
+# Platforms the review_responses CHECK constraint accepts
+REVIEW_PLATFORMS = ('google', 'yelp', 'facebook')
+
+# save_responses_to_db's reason for a row the unique constraint left unwritten
+DUPLICATE_RESPONSE = 'Already saved (duplicate review)'
+
+# Bump when the prompts change so cached replies from old prompts are not reused
+PROMPT_VERSION = 'v1'
+
+# Generated replies keyed by normalized review content; set REVIEW_CACHE_DB
+# (e.g. /tmp/review-cache.sqlite3) to add a persistent tier
+REVIEW_CACHE = build_cache(
+    max_entries=2048,
+    ttl=30 * 24 * 3600,
+    persistent_path=os.environ.get('REVIEW_CACHE_DB', '')
+)
+
+def review_cache_key(review_text: str, rating, business_name: str) -> str:
+    """Near-identical one-liners with the same rating share a cached reply"""
+    try:
+        rating = int(rating or 0)
+    except (TypeError, ValueError):
+        # e.g. "4 stars" - generation falls back to the default reply anyway
+        rating = 0
+    return cache_key(normalize_text(review_text), rating, business_name, PROMPT_VERSION)
+
 class ReviewAgent:
     """Handle review fetching and AI response generation"""
     
     def __init__(self):
-        self.gemini_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
+        self.gemini_path = "/v1beta/models/gemini-pro:generateContent"
+        self.db = supabase_client(SUPABASE_URL, SUPABASE_KEY)
+        self.gemini = gemini_client()
     
     def fetch_google_reviews(self, place_id: str) -> List[Dict]:
         """Fetch reviews from Google Places API"""
         try:
-            url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={place_id}&fields=reviews&key={GOOGLE_PLACES_API_KEY}"
+            data = google_places_client().get(
+                "/maps/api/place/details/json",
+                params={'place_id': place_id, 'fields': 'reviews', 'key': GOOGLE_PLACES_API_KEY}
+            ).json()
             
-            req = urllib.request.Request(url)
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
-                
             if data.get('status') == 'OK' and 'result' in data:
                 reviews = data['result'].get('reviews', [])
                 return [{
@@ -53,13 +97,9 @@ class ReviewAgent:
     def fetch_yelp_reviews(self, business_id: str) -> List[Dict]:
         """Fetch reviews from Yelp Fusion API"""
         try:
-            url = f"https://api.yelp.com/v3/businesses/{business_id}/reviews"
-            
-            req = urllib.request.Request(url)
-            req.add_header('Authorization', f'Bearer {YELP_API_KEY}')
-            
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
+            data = yelp_client(YELP_API_KEY).get(
+                f"/v3/businesses/{urllib.parse.quote(business_id)}/reviews"
+            ).json()
             
             reviews = data.get('reviews', [])
             return [{
@@ -75,13 +115,11 @@ class ReviewAgent:
             print(f"Error fetching Yelp reviews: {e}")
             return []
     
-    def generate_ai_response(self, review_text: str, rating: int, business_name: str = "your business") -> str:
-        """Generate AI response to review using Google Gemini"""
-        try:
-            # Create context-aware prompt
-            tone = "warm and appreciative" if rating >= 4 else "empathetic and solution-focused"
-            
-            prompt = f"""You are a professional customer service representative for {business_name}.
+    def _build_prompt(self, review_text: str, rating: int, business_name: str) -> str:
+        """Create context-aware prompt for a single review"""
+        tone = "warm and appreciative" if rating >= 4 else "empathetic and solution-focused"
+        
+        return f"""You are a professional customer service representative for {business_name}.
             
 Generate a {tone} response to this {rating}-star review:
 "{review_text}"
@@ -95,32 +133,86 @@ Guidelines:
 - Use a friendly, professional tone
 
 Response:"""
-            
-            # Call Gemini API
-            payload = {
-                "contents": [{
-                    "parts": [{"text": prompt}]
-                }],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "maxOutputTokens": 200,
-                }
-            }
-            
-            data = json.dumps(payload).encode('utf-8')
-            req = urllib.request.Request(
-                f"{self.gemini_url}?key={GEMINI_API_KEY}",
-                data=data,
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode())
-            
-            # Extract generated text
-            if 'candidates' in result and len(result['candidates']) > 0:
-                generated_text = result['candidates'][0]['content']['parts'][0]['text']
-                return generated_text.strip()
+    
+    def _build_batch_prompt(self, reviews: List[Dict], business_name: str) -> str:
+        """Pack several reviews into one prompt that asks for a JSON array back"""
+        packed = json.dumps([{
+            'index': i,
+            'rating': review.get('rating', 5),
+            'text': review.get('text', '')
+        } for i, review in enumerate(reviews)], ensure_ascii=False)
+        
+        return f"""You are a professional customer service representative for {business_name}.
+
+Write one response for each of the reviews below.
+
+Guidelines:
+- Be authentic and personal, not corporate
+- Thank them for the review
+- For 4-5 star reviews, be warm and appreciative and express genuine gratitude
+- For 1-3 star reviews, be empathetic and solution-focused: address their concerns specifically and offer a solution
+- Keep each response under 100 words
+- End with an invitation to return or continue the conversation
+- Use a friendly, professional tone
+
+Reviews (JSON):
+{packed}
+
+Return ONLY a JSON array with one object per review, in the same order:
+[{{"index": 0, "response": "..."}}]"""
+    
+    def _call_gemini(self, prompt: str, max_tokens: int, json_mode: bool = False) -> Tuple[Optional[str], Dict]:
+        """Call Gemini; returns (text or None if no candidates, token usage). Raises on upstream errors"""
+        generation_config = {
+            "temperature": 0.7,
+            "maxOutputTokens": max_tokens,
+        }
+        if json_mode:
+            generation_config["responseMimeType"] = "application/json"
+        
+        payload = {
+            "contents": [{
+                "parts": [{"text": prompt}]
+            }],
+            "generationConfig": generation_config
+        }
+        
+        result = self.gemini.post(
+            self.gemini_path,
+            params={'key': GEMINI_API_KEY},
+            json_body=payload
+        ).json()
+        
+        usage = result.get('usageMetadata', {})
+        usage = {
+            'prompt_tokens': usage.get('promptTokenCount', 0),
+            'output_tokens': usage.get('candidatesTokenCount', 0)
+        }
+        
+        # Extract generated text
+        if 'candidates' in result and len(result['candidates']) > 0:
+            generated_text = result['candidates'][0]['content']['parts'][0]['text']
+            return generated_text.strip(), usage
+        
+        return None, usage
+    
+    def _request_ai_response(self, review_text: str, rating: int, business_name: str) -> Optional[str]:
+        """Call Gemini for one review; raises on upstream errors, None if no candidates"""
+        text, _ = self._call_gemini(self._build_prompt(review_text, rating, business_name), 200)
+        return text
+    
+    def generate_ai_response(self, review_text: str, rating: int, business_name: str = "your business") -> str:
+        """Generate AI response to review using Google Gemini"""
+        key = review_cache_key(review_text, rating, business_name)
+        cached = REVIEW_CACHE.get(key)
+        if cached is not None:
+            return cached
+        
+        try:
+            generated_text = self._request_ai_response(review_text, rating, business_name)
+            if generated_text:
+                REVIEW_CACHE.set(key, generated_text)
+                return generated_text
             
             return "Thank you for your review! We appreciate your feedback."
             
@@ -128,42 +220,310 @@ Response:"""
             print(f"Error generating AI response: {e}")
             return "Thank you for your review! We appreciate your feedback and would love to hear more about your experience."
     
+    def _response_row(self, user_id: str, review_data: Dict, ai_response: str) -> Dict:
+        """Build a review_responses row"""
+        return {
+            "user_id": user_id,
+            "platform": review_data.get('platform'),
+            "review_id": review_data.get('review_id'),
+            "review_text": review_data.get('text'),
+            "review_rating": review_data.get('rating'),
+            "ai_response": ai_response,
+            "author_name": review_data.get('author'),
+            "published": False,
+            "created_at": datetime.utcnow().isoformat()
+        }
+    
     def save_response_to_db(self, user_id: str, review_data: Dict, ai_response: str) -> bool:
         """Save generated response to Supabase"""
         try:
-            url = f"{SUPABASE_URL}/rest/v1/review_responses"
-            
-            payload = {
-                "user_id": user_id,
-                "platform": review_data.get('platform'),
-                "review_id": review_data.get('review_id'),
-                "review_text": review_data.get('text'),
-                "review_rating": review_data.get('rating'),
-                "ai_response": ai_response,
-                "author_name": review_data.get('author'),
-                "published": False,
-                "created_at": datetime.utcnow().isoformat()
-            }
-            
-            data = json.dumps(payload).encode('utf-8')
-            req = urllib.request.Request(
-                url,
-                data=data,
-                headers={
-                    'Content-Type': 'application/json',
-                    'apikey': SUPABASE_KEY,
-                    'Authorization': f'Bearer {SUPABASE_KEY}',
-                    'Prefer': 'return=minimal'
-                },
-                method='POST'
+            response = self.db.post(
+                "/rest/v1/review_responses",
+                json_body=self._response_row(user_id, review_data, ai_response),
+                headers={'Prefer': 'return=minimal'}
             )
-            
-            with urllib.request.urlopen(req) as response:
-                return response.status == 201
+            return response.status == 201
             
         except Exception as e:
             print(f"Error saving to database: {e}")
             return False
+    
+    def _row_error(self, row: Dict) -> Optional[str]:
+        """Why a review_responses row would break the table's constraints, None if it would not"""
+        if row['platform'] not in REVIEW_PLATFORMS:
+            return f"Invalid platform: {row['platform']!r}"
+        if not row['review_id']:
+            return 'Missing review_id'
+        if not isinstance(row['review_text'], str) or not row['review_text'].strip():
+            return 'Missing review text'
+        rating = row['review_rating']
+        if isinstance(rating, float) and rating.is_integer():
+            rating = row['review_rating'] = int(rating)
+        if isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 5:
+            return f"Rating must be a whole number from 1 to 5, got {rating!r}"
+        return None
+    
+    def _insert_responses(self, rows) -> Counter:
+        """POST review_responses rows; raises HTTPError if PostgREST refuses them
+        
+        Already-answered reviews are skipped rather than failing the insert,
+        so the (platform, review_id) of each row actually written is returned.
+        """
+        written = self.db.post(
+            "/rest/v1/review_responses?on_conflict=user_id,platform,review_id&select=platform,review_id",
+            json_body=rows,
+            headers={'Prefer': 'return=representation,resolution=ignore-duplicates'}
+        ).json()
+        return Counter((row['platform'], row['review_id']) for row in written)
+    
+    def _mark_skipped(self, rows: List[Dict], indices: List[int], written: Counter, errors: List[Optional[str]]):
+        """Record rows PostgREST left out as duplicates of an existing reply"""
+        for i in indices:
+            key = (rows[i]['platform'], rows[i]['review_id'])
+            if written[key]:
+                written[key] -= 1
+            else:
+                errors[i] = DUPLICATE_RESPONSE
+    
+    def save_responses_to_db(self, rows: List[Dict]) -> List[Optional[str]]:
+        """Save many review_responses rows in one bulk PostgREST insert
+        
+        Returns one entry per row: None if it was saved, otherwise why not
+        (DUPLICATE_RESPONSE if the review already had a saved reply).
+        Rows that would break the table's constraints are left out up front,
+        and if PostgREST still rejects the insert with a 4xx the rows are
+        retried one at a time, so a bad row only loses itself.
+        """
+        errors = [self._row_error(row) for row in rows]
+        valid = [i for i, error in enumerate(errors) if error is None]
+        if not valid:
+            return errors
+        try:
+            written = self._insert_responses([rows[i] for i in valid])
+            self._mark_skipped(rows, valid, written, errors)
+            return errors
+        except HTTPError as e:
+            if not 400 <= e.status < 500:
+                print(f"Error bulk saving to database: {e}")
+                return [error or str(e) for error in errors]
+            print(f"Bulk insert rejected ({e}), retrying row by row")
+        except Exception as e:
+            print(f"Error bulk saving to database: {e}")
+            return [error or str(e) for error in errors]
+        
+        for i in valid:
+            try:
+                self._mark_skipped(rows, [i], self._insert_responses(rows[i]), errors)
+            except Exception as e:
+                print(f"Error saving {rows[i]['review_id']} to database: {e}")
+                errors[i] = str(e)
+        return errors
+    
+    def _generate_one(self, review: Dict, business_name: str) -> Tuple[Dict, Dict]:
+        """Generate one reply; returns (per-review result, call stats)"""
+        result = {
+            'review_id': review.get('review_id'),
+            'platform': review.get('platform'),
+        }
+        stats = {'calls': 1, 'prompt_tokens': 0, 'output_tokens': 0}
+        try:
+            prompt = self._build_prompt(review.get('text', ''), review.get('rating', 5), business_name)
+            ai_response, usage = self._call_gemini(prompt, 200)
+            stats.update(usage)
+            if not ai_response:
+                raise ValueError('Empty response from Gemini')
+            REVIEW_CACHE.set(review_cache_key(review.get('text', ''), review.get('rating', 5), business_name), ai_response)
+            result.update(success=True, ai_response=ai_response)
+        except Exception as e:
+            print(f"Error generating AI response for {result['review_id']}: {e}")
+            result.update(success=False, ai_response=None, error=str(e))
+        return result, stats
+    
+    def _parse_batch_output(self, text: Optional[str], expected: int) -> Optional[List[str]]:
+        """Parse the JSON array from a batched call; None if it is malformed"""
+        if not text:
+            return None
+        text = text.strip()
+        if text.startswith('```'):
+            text = text.strip('`')
+            text = text[text.find('['):] if '[' in text else text
+        try:
+            items = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(items, list) or len(items) != expected:
+            return None
+        
+        responses = [None] * expected
+        for position, item in enumerate(items):
+            if isinstance(item, dict):
+                index, response = item.get('index', position), item.get('response')
+            else:
+                index, response = position, item
+            if not isinstance(index, int) or not 0 <= index < expected:
+                return None
+            if not isinstance(response, str) or not response.strip():
+                return None
+            responses[index] = response.strip()
+        
+        return responses if all(responses) else None
+    
+    def _generate_batch(self, batch: List[Dict], business_name: str) -> Tuple[List[Dict], Dict]:
+        """Generate replies for several reviews with one Gemini call
+        
+        Falls back to one call per review if the batched output is malformed.
+        """
+        stats = {'size': len(batch), 'calls': 1, 'prompt_tokens': 0, 'output_tokens': 0, 'fallback': False}
+        try:
+            text, usage = self._call_gemini(
+                self._build_batch_prompt(batch, business_name),
+                min(200 * len(batch), BATCH_MAX_OUTPUT_TOKENS),
+                json_mode=True
+            )
+            stats['prompt_tokens'] += usage['prompt_tokens']
+            stats['output_tokens'] += usage['output_tokens']
+            responses = self._parse_batch_output(text, len(batch))
+        except Exception as e:
+            print(f"Error generating batched AI responses: {e}")
+            responses = None
+        
+        if responses is not None:
+            for review, response in zip(batch, responses):
+                REVIEW_CACHE.set(review_cache_key(review.get('text', ''), review.get('rating', 5), business_name), response)
+            return [{
+                'review_id': review.get('review_id'),
+                'platform': review.get('platform'),
+                'success': True,
+                'ai_response': response
+            } for review, response in zip(batch, responses)], stats
+        
+        stats['fallback'] = True
+        results = []
+        for review in batch:
+            result, single_stats = self._generate_one(review, business_name)
+            stats['calls'] += single_stats['calls']
+            stats['prompt_tokens'] += single_stats['prompt_tokens']
+            stats['output_tokens'] += single_stats['output_tokens']
+            results.append(result)
+        return results, stats
+    
+    def bulk_generate(self, reviews: List[Dict], business_name: str, user_id: str = '',
+                      concurrency: int = BULK_DEFAULT_CONCURRENCY, batch_size: int = 0) -> Dict:
+        """Generate responses for many reviews in parallel, then save them in one insert
+        
+        Each response reports whether its row was saved, and 'skipped' if
+        the review already had a saved reply; 'saved' is true only if every
+        generated reply was written.
+        
+        With batch_size > 1, reviews are packed batch_size at a time into a
+        single Gemini prompt so the guidelines preamble is sent once per batch.
+        """
+        started = time.perf_counter()
+        concurrency = max(1, min(int(concurrency), BULK_MAX_CONCURRENCY))
+        batch_size = max(0, min(int(batch_size or 0), BATCH_MAX_SIZE))
+        
+        # Serve repeated reviews from the cache; only one copy of each
+        # distinct miss goes to Gemini
+        responses = [None] * len(reviews)
+        pending = {}  # cache key -> indices of reviews sharing it
+        for i, review in enumerate(reviews):
+            key = review_cache_key(review.get('text', ''), review.get('rating', 5), business_name)
+            if key in pending:
+                pending[key].append(i)
+                continue
+            cached = REVIEW_CACHE.get(key)
+            if cached is None:
+                pending[key] = [i]
+            else:
+                responses[i] = {
+                    'review_id': review.get('review_id'),
+                    'platform': review.get('platform'),
+                    'success': True,
+                    'ai_response': cached,
+                    'cached': True
+                }
+        unique = [indices[0] for indices in pending.values()]
+        cache_hits = len(reviews) - sum(len(indices) for indices in pending.values())
+        
+        if batch_size > 1:
+            chunks = [unique[i:i + batch_size] for i in range(0, len(unique), batch_size)]
+            work = lambda indices: self._generate_batch([reviews[i] for i in indices], business_name)
+        else:
+            chunks = [[i] for i in unique]
+            work = lambda indices: self._generate_one(reviews[indices[0]], business_name)
+        
+        if chunks:
+            with tracing.span('generate', reviews=len(unique), calls=len(chunks)), \
+                    ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as pool:
+                outputs = list(pool.map(tracing.wrap(work), chunks))
+        else:
+            outputs = []
+        
+        generated = {}
+        for indices, (results, _) in zip(chunks, outputs):
+            if batch_size <= 1:
+                results = [results]
+            generated.update(zip(indices, results))
+        for indices in pending.values():
+            result = generated[indices[0]]
+            responses[indices[0]] = result
+            for i in indices[1:]:
+                responses[i] = dict(
+                    result,
+                    review_id=reviews[i].get('review_id'),
+                    platform=reviews[i].get('platform'),
+                    duplicate=True
+                )
+        
+        call_stats = [stats for _, stats in outputs]
+        
+        saved = False
+        saved_count = skipped_count = 0
+        if user_id:
+            to_save = [result for result in responses if result['success']]
+            rows = [
+                self._response_row(user_id, review, result['ai_response'])
+                for review, result in zip(reviews, responses)
+                if result['success']
+            ]
+            with tracing.span('save', rows=len(rows)):
+                errors = self.save_responses_to_db(rows)
+            for result in responses:
+                result['saved'] = False
+            for result, error in zip(to_save, errors):
+                result['saved'] = error is None
+                if error == DUPLICATE_RESPONSE:
+                    result['skipped'] = True
+                if error:
+                    result['save_error'] = error
+            saved_count = sum(1 for error in errors if error is None)
+            skipped_count = errors.count(DUPLICATE_RESPONSE)
+            saved = saved_count == len(rows)
+        
+        succeeded = sum(1 for result in responses if result['success'])
+        summary = {
+            'responses': responses,
+            'count': len(responses),
+            'succeeded': succeeded,
+            'failed': len(responses) - succeeded,
+            # Served from REVIEW_CACHE vs. copied from an identical review in this request
+            'cache_hits': cache_hits,
+            'duplicates': len(reviews) - cache_hits - len(unique),
+            'saved': saved,
+            'saved_count': saved_count,
+            'skipped_count': skipped_count,
+            'concurrency': concurrency,
+            'gemini_calls': sum(stats['calls'] for stats in call_stats),
+            'token_usage': {
+                'prompt_tokens': sum(stats['prompt_tokens'] for stats in call_stats),
+                'output_tokens': sum(stats['output_tokens'] for stats in call_stats)
+            },
+            'wall_time_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+        if batch_size > 1:
+            summary['batch_size'] = batch_size
+            summary['batches'] = call_stats
+        return summary
 
 class handler(BaseHTTPRequestHandler):
     """Vercel serverless function handler"""
@@ -176,11 +536,19 @@ class handler(BaseHTTPRequestHandler):
     
     def _send_response(self, status_code: int, data: Dict):
         """Send JSON response"""
+        body, headers = encode_response(data, self.headers.get('Accept-Encoding', ''))
         self.send_response(status_code)
         self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
         self._send_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
+    
+    def end_headers(self):
+        tracing.add_server_timing(self)
+        super().end_headers()
     
     def do_OPTIONS(self):
         """Handle preflight requests"""
@@ -188,6 +556,7 @@ class handler(BaseHTTPRequestHandler):
         self._send_cors_headers()
         self.end_headers()
     
+    @tracing.traced
     def do_POST(self):
         """Handle POST requests"""
         try:
@@ -213,9 +582,11 @@ class handler(BaseHTTPRequestHandler):
                     return
                 
                 if platform == 'google':
-                    reviews = agent.fetch_google_reviews(identifier)
+                    with tracing.span('fetch', platform=platform):
+                        reviews = agent.fetch_google_reviews(identifier)
                 elif platform == 'yelp':
-                    reviews = agent.fetch_yelp_reviews(identifier)
+                    with tracing.span('fetch', platform=platform):
+                        reviews = agent.fetch_yelp_reviews(identifier)
                 else:
                     self._send_response(400, {'error': 'Invalid platform'})
                     return
@@ -238,11 +609,13 @@ class handler(BaseHTTPRequestHandler):
                     return
                 
                 # Generate response
-                ai_response = agent.generate_ai_response(review_text, rating, business_name)
+                with tracing.span('generate'):
+                    ai_response = agent.generate_ai_response(review_text, rating, business_name)
                 
                 # Save to database
                 if user_id:
-                    agent.save_response_to_db(user_id, data, ai_response)
+                    with tracing.span('save', rows=1):
+                        agent.save_response_to_db(user_id, data, ai_response)
                 
                 self._send_response(200, {
                     'success': True,
@@ -255,30 +628,17 @@ class handler(BaseHTTPRequestHandler):
                 business_name = data.get('business_name', 'your business')
                 user_id = data.get('user_id', '')
                 
-                responses = []
-                for review in reviews:
-                    ai_response = agent.generate_ai_response(
-                        review.get('text', ''),
-                        review.get('rating', 5),
-                        business_name
-                    )
-                    
-                    response_data = {
-                        'review_id': review.get('review_id'),
-                        'platform': review.get('platform'),
-                        'ai_response': ai_response
-                    }
-                    
-                    # Save to DB
-                    if user_id:
-                        agent.save_response_to_db(user_id, review, ai_response)
-                    
-                    responses.append(response_data)
+                result = agent.bulk_generate(
+                    reviews,
+                    business_name,
+                    user_id,
+                    data.get('concurrency', BULK_DEFAULT_CONCURRENCY),
+                    data.get('batch_size', 0)
+                )
                 
                 self._send_response(200, {
                     'success': True,
-                    'responses': responses,
-                    'count': len(responses)
+                    **result
                 })
             
             else:
@@ -288,6 +648,7 @@ class handler(BaseHTTPRequestHandler):
             print(f"Error: {e}")
             self._send_response(500, {'error': str(e)})
     
+    @tracing.traced
     def do_GET(self):
         """Handle GET requests"""
         self._send_response(200, {
@@ -297,5 +658,9 @@ class handler(BaseHTTPRequestHandler):
                 'POST /fetch-reviews - Fetch reviews from platforms',
                 'POST /generate-response - Generate AI response for single review',
                 'POST /bulk-generate - Generate responses for multiple reviews'
-            ]
+            ],
+            'cache': {
+                'prompt_version': PROMPT_VERSION,
+                **REVIEW_CACHE.stats()
+            }
         })
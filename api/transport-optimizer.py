@@ -7,10 +7,40 @@ Built for: Demo Portfolio Project
 from http.server import BaseHTTPRequestHandler
 import json
 import math
+import os
+import sys
+import time
+import urllib.parse
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 import random
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _lib import tracing
+from _lib.encoding import encode_response
+from _lib.transport.assignment import assign_trips
+from _lib.transport.fleet import compile_driver, compile_trip, rejection_reasons
+from _lib.transport.routing import load_travel_engine
+from _lib.transport.scoring import (
+    PROXIMITY_CUTOFF_MILES, SCORE_WEIGHTS, max_score_beyond, rank_fleet, score_fleet
+)
+from _lib.transport.state import FleetSnapshot, FleetState
+
+# Batch assignment: latency budget for the whole plan (scoring pairs, then
+# the exact solver) and the largest trips x seats matrix it will attempt
+# before planning greedily
+ASSIGN_BUDGET_MS = float(os.environ.get('TRANSPORT_ASSIGN_BUDGET_MS', 1000))
+ASSIGN_MAX_CELLS = int(os.environ.get('TRANSPORT_ASSIGN_MAX_CELLS', 9_000_000))
+ASSIGN_MIN_CANDIDATES = 20  # per trip, so a booked-out neighbourhood still has alternatives
+MAX_BATCH_TRIPS = 5000
+
+# Times a pruned search doubles its radius before scoring the whole fleet
+MAX_SEARCH_WIDENINGS = 2
+
+# Road network routing when a local graph file (OSM extract or compiled
+# .csr) is configured, otherwise straight-line haversine estimates
+TRAVEL_ENGINE = load_travel_engine(os.environ.get('TRANSPORT_ROAD_GRAPH', ''))
+
 # Sample data for demo
 DEMO_DRIVERS = [
     {
@@ -126,44 +156,45 @@ def calculate_load_balance_score(current_load: int, max_capacity: int) -> float:
     else:
         return 30  # Nearly full
 
-def is_compatible(driver: Dict, trip: Dict) -> Tuple[bool, List[str]]:
-    """Check if driver is compatible with trip requirements"""
-    reasons = []
-    
-    # Status check
-    if driver["status"] not in ["available", "on-route"]:
-        reasons.append(f"Driver is {driver['status']}")
-        return False, reasons
-    
-    # Vehicle type
-    required_type = trip["requirements"]["vehicleType"]
-    if required_type not in driver["vehicle"]["type"]:
-        reasons.append(f"Vehicle doesn't support {required_type}")
-        return False, reasons
-    
-    # Oxygen
-    if trip["requirements"]["oxygenRequired"] and not driver["vehicle"]["oxygenEquipped"]:
-        reasons.append("Vehicle lacks oxygen equipment")
-        return False, reasons
-    
-    # Capacity
-    if driver["currentLoad"] >= driver["vehicle"]["capacity"]:
-        reasons.append("Driver at full capacity")
-        return False, reasons
-    
-    # Certifications
-    if trip["requirements"]["attendantNeeded"]:
-        if "medical-attendant" not in driver["certifications"]:
-            reasons.append("Driver lacks medical attendant certification")
-            return False, reasons
-    
-    return True, []
+def is_compatible(
+    driver: Dict,
+    trip: Dict,
+    driver_mask: Optional[int] = None,
+    trip_mask: Optional[int] = None
+) -> Tuple[bool, List[str]]:
+    """Check if driver is compatible with trip requirements
+    
+    Pass the fleet store's precompiled `driver_mask` (and the trip's mask,
+    compiled once per trip) to skip recompiling them for every pair.
+    """
+    if driver_mask is None:
+        driver_mask = compile_driver(driver)
+    if trip_mask is None:
+        trip_mask = compile_trip(trip)
+    if driver_mask & trip_mask == trip_mask:
+        return True, []
+    
+    # Only incompatible pairs pay for decoding; report the first unmet requirement
+    return False, rejection_reasons(driver, trip, driver_mask, trip_mask)[:1]
 
-def calculate_driver_match(driver: Dict, trip: Dict) -> Dict:
-    """Calculate comprehensive match score for driver-trip pair"""
+def calculate_driver_match(
+    driver: Dict,
+    trip: Dict,
+    now: Optional[datetime] = None,
+    travel_minutes: Optional[float] = None,
+    driver_mask: Optional[int] = None,
+    trip_mask: Optional[int] = None
+) -> Dict:
+    """Calculate comprehensive match score for driver-trip pair
+    
+    `travel_minutes` (e.g. a road network estimate) replaces the
+    straight-line 30 mph estimate for arrival time; the masks are passed
+    through to is_compatible.
+    """
+    now = now or datetime.now()
     
     # Check compatibility first
-    compatible, incompatibility_reasons = is_compatible(driver, trip)
+    compatible, incompatibility_reasons = is_compatible(driver, trip, driver_mask, trip_mask)
     if not compatible:
         return {
             "driverId": driver["id"],
@@ -181,9 +212,9 @@ def calculate_driver_match(driver: Dict, trip: Dict) -> Dict:
         trip["pickup"]["coordinates"]["lng"]
     )
     
-    # Estimate travel time (assuming 30 mph average)
-    travel_time_minutes = (distance / 30) * 60
-    estimated_arrival = datetime.now() + timedelta(minutes=travel_time_minutes)
+    # Estimate travel time (assuming 30 mph average) unless routed
+    travel_time_minutes = (distance / 30) * 60 if travel_minutes is None else travel_minutes
+    estimated_arrival = now + timedelta(minutes=travel_time_minutes)
     
     # Calculate component scores
     proximity_score = calculate_proximity_score(distance)
@@ -204,11 +235,11 @@ def calculate_driver_match(driver: Dict, trip: Dict) -> Dict:
     
     # Calculate weighted total score
     total_score = (
-        proximity_score * 0.40 +
-        route_deviation_score * 0.20 +
-        time_window_score * 0.25 +
-        load_balance_score * 0.10 +
-        100 * 0.05  # Compatibility bonus
+        proximity_score * SCORE_WEIGHTS["proximity"] +
+        route_deviation_score * SCORE_WEIGHTS["routeDeviation"] +
+        time_window_score * SCORE_WEIGHTS["timeWindow"] +
+        load_balance_score * SCORE_WEIGHTS["loadBalance"] +
+        100 * SCORE_WEIGHTS["compatibility"]  # Compatibility bonus
     )
     
     return {
@@ -231,7 +262,234 @@ def calculate_driver_match(driver: Dict, trip: Dict) -> Dict:
         "vehicle": driver["vehicle"]
     }
 
+# Live fleet: takes driver events and hands out versioned snapshots
+FLEET = FleetState(DEMO_DRIVERS)
+
+def load_fleet(drivers: List[Dict]):
+    """Replace the live fleet (store, score arrays and spatial index)"""
+    global FLEET
+    FLEET = FleetState(drivers)
+
+def update_driver_location(driver_id: str, lat: float, lng: float) -> bool:
+    """Apply a position report to the live fleet"""
+    try:
+        FLEET.ping(driver_id, lat, lng)
+    except KeyError:
+        return False
+    return True
+
+def routed_minutes(fleet: FleetSnapshot, rows: List[int], trip: Dict) -> Optional[List[float]]:
+    """Road travel minutes from each row's driver to the pickup (None on the haversine engine)
+    
+    Incompatible drivers score 0 whatever their arrival time, so only
+    compatible ones are routed.
+    """
+    if not TRAVEL_ENGINE.road:
+        return None
+    trip_mask = compile_trip(trip)
+    store = fleet.store
+    compatible = [row for row in rows if store.mask[row] & trip_mask == trip_mask]
+    pickup = trip["pickup"]["coordinates"]
+    minutes = dict(zip(compatible, TRAVEL_ENGINE.travel_minutes(
+        [(store.lat[row], store.lng[row]) for row in compatible],
+        (pickup["lat"], pickup["lng"])
+    )))
+    return [minutes.get(row, 0.0) for row in rows]
+
+def score_rows(fleet: FleetSnapshot, rows: List[int], trip: Dict, limit: Optional[int], now: datetime) -> List[Dict]:
+    """Match dicts for the given driver rows, highest score first"""
+    minutes = routed_minutes(fleet, rows, trip)
+    by_row = dict(zip(rows, minutes)) if minutes is not None else {}
+    trip_mask = compile_trip(trip)
+    masks = fleet.store.mask
+    if fleet.arrays is not None:
+        top = rank_fleet(fleet.arrays, trip, limit, now, rows=rows, travel_minutes=minutes)
+        return [
+            calculate_driver_match(fleet.drivers[i], trip, now, by_row.get(i), masks[i], trip_mask)
+            for i in top
+        ]
+    
+    matches = [
+        calculate_driver_match(fleet.drivers[i], trip, now, by_row.get(i), masks[i], trip_mask)
+        for i in rows
+    ]
+    matches.sort(key=lambda x: x['score'], reverse=True)
+    return matches[:limit] if limit else matches
+
+def candidate_rows(fleet: FleetSnapshot, trip: Dict, radius_miles: float, min_count: int) -> List[int]:
+    """Driver rows near the pickup, in ascending order so ties match a full-fleet scan"""
+    pickup = trip["pickup"]["coordinates"]
+    return sorted(fleet.index.candidates(pickup["lat"], pickup["lng"], radius_miles, min_count=min_count))
+
+def compatible_scores(fleet: FleetSnapshot, rows: List[int], trip: Dict, now: datetime) -> List[Tuple[int, float]]:
+    """(row, score) for every compatible driver among the given rows"""
+    minutes = routed_minutes(fleet, rows, trip)
+    if fleet.arrays is not None:
+        scored = score_fleet(fleet.arrays.take(rows), trip, now, minutes)
+        return [
+            (row, score)
+            for row, ok, score in zip(rows, scored["compatible"].tolist(), scored["score"].tolist())
+            if ok
+        ]
+    
+    trip_mask = compile_trip(trip)
+    masks = fleet.store.mask
+    return [
+        (row, calculate_driver_match(
+            fleet.drivers[row], trip, now, minutes[i] if minutes else None, masks[row], trip_mask
+        )["score"])
+        for i, row in enumerate(rows)
+        if masks[row] & trip_mask == trip_mask
+    ]
+
+def pruned_search(
+    fleet: FleetSnapshot,
+    trip: Dict,
+    radius_miles: float,
+    min_count: int,
+    now: datetime,
+    score: Callable[[List[int]], Tuple[object, Optional[float]]]
+) -> Tuple[object, List[int]]:
+    """Score drivers near the pickup, widening until the result provably matches a full scan
+    
+    `score(rows)` returns (result, threshold): the lowest compatible score
+    that must be exact, e.g. the best one or the k-th best, or None when
+    there are too few compatible drivers. Every driver left out is further
+    than the search radius, so none of them can beat
+    max_score_beyond(radius); once the threshold does, no driver outside
+    could have displaced the matches at or above it. Otherwise the radius
+    doubles, up to MAX_SEARCH_WIDENINGS times, and then the whole fleet is
+    scored. Returns (result, rows scored).
+    """
+    radius = radius_miles
+    for _ in range(MAX_SEARCH_WIDENINGS + 1):
+        rows = candidate_rows(fleet, trip, radius, min_count)
+        if len(rows) >= len(fleet):
+            break
+        result, threshold = score(rows)
+        # Scores are rounded to cents; a strict margin also keeps ties on the full-scan order
+        if threshold is not None and threshold > max_score_beyond(radius, trip, now, TRAVEL_ENGINE.road) + 0.01:
+            return result, rows
+        radius *= 2
+    
+    rows = list(range(len(fleet)))
+    return score(rows)[0], rows
+
+def find_matches(
+    trip: Dict,
+    limit: Optional[int] = None,
+    now: Optional[datetime] = None,
+    radius_miles: float = PROXIMITY_CUTOFF_MILES,
+    fleet: Optional[FleetSnapshot] = None
+) -> Tuple[List[Dict], int]:
+    """Best driver matches for a trip, highest score first, plus how many drivers were scored
+    
+    Starts from the drivers the spatial index puts within `radius_miles`
+    of the pickup (topped up with the nearest drivers to fill `limit`) and
+    widens the search until no driver left out could outscore the
+    `limit`-th match (the best match when there is no limit), so those
+    top matches are exactly what a full-fleet scan returns. Without a
+    limit, only the drivers actually scored are listed.
+    Reads one snapshot of the live fleet throughout.
+    """
+    now = now or datetime.now()
+    fleet = fleet or FLEET.snapshot()
+    k = limit or 1
+    
+    def score(rows):
+        matches = score_rows(fleet, rows, trip, limit, now)
+        kth = matches[k - 1] if len(matches) >= k else None
+        return matches, kth["score"] if kth and kth["compatible"] else None
+    
+    matches, rows = pruned_search(fleet, trip, radius_miles, k, now, score)
+    return matches, len(rows)
+
+def plan_trips(
+    trips: List[Dict],
+    now: Optional[datetime] = None,
+    budget_ms: float = ASSIGN_BUDGET_MS,
+    radius_miles: float = PROXIMITY_CUTOFF_MILES,
+    fleet: Optional[FleetSnapshot] = None
+) -> Dict:
+    """Assign a batch of trips to drivers as one consistent plan
+    
+    Builds the trip x driver score matrix from the same factors as
+    calculate_driver_match (incompatible pairs left out) and hands it to
+    the capacity-aware solver, which never books a driver past their free
+    seats. Candidates are pruned like find_matches: each trip keeps its
+    nearest drivers (at least ASSIGN_MIN_CANDIDATES) and always its best
+    driver from a full-fleet scan, but lower-scoring drivers further away
+    may be left out.
+    """
+    now = now or datetime.now()
+    fleet = fleet or FLEET.snapshot()
+    start = time.perf_counter()
+    
+    def score(trip, rows):
+        scores = compatible_scores(fleet, rows, trip, now)
+        return scores, max((score for _, score in scores), default=None)
+    
+    pairs = []
+    for index, trip in enumerate(trips):
+        scores, _ = pruned_search(
+            fleet, trip, radius_miles, ASSIGN_MIN_CANDIDATES, now, lambda rows: score(trip, rows)
+        )
+        pairs.extend((index, row, score) for row, score in scores)
+    
+    slots = {row: fleet.store.free_seats(row) for _, row, _ in pairs}
+    remaining_ms = max(0.0, budget_ms - (time.perf_counter() - start) * 1000)
+    plan, solver, fallback_reason = assign_trips(pairs, slots, remaining_ms, ASSIGN_MAX_CELLS)
+    
+    assignments = []
+    unassigned = []
+    for index, trip in enumerate(trips):
+        trip_id = trip.get("id", index)
+        if index not in plan:
+            unassigned.append(trip_id)
+            continue
+        minutes = routed_minutes(fleet, [plan[index]], trip)
+        row = plan[index]
+        match = calculate_driver_match(
+            fleet.drivers[row], trip, now, minutes[0] if minutes else None, fleet.store.mask[row]
+        )
+        assignments.append({
+            "tripId": trip_id,
+            "driverId": match["driverId"],
+            "score": match["score"],
+            "match": match
+        })
+    
+    return {
+        "assignments": assignments,
+        "unassigned": unassigned,
+        "tripsAssigned": len(assignments),
+        "totalScore": round(sum(a["score"] for a in assignments), 2),
+        "solver": solver,
+        "fallbackReason": fallback_reason,
+        "fleetVersion": fleet.version,
+        "pairsScored": len(pairs),
+        "budgetMs": budget_ms,
+        "solveMs": round((time.perf_counter() - start) * 1000, 2)
+    }
+
 class handler(BaseHTTPRequestHandler):
+    def _send_json(self, data: Dict, fields=None):
+        """fields: optional sparse-response spec, e.g. "-trip,-matches.vehicle,-matches.breakdown" """
+        body, headers = encode_response(data, self.headers.get('Accept-Encoding', ''), fields)
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def end_headers(self):
+        tracing.add_server_timing(self)
+        super().end_headers()
+    
+    @tracing.traced
     def do_POST(self):
         """Handle POST request for route optimization"""
         try:
@@ -240,19 +498,31 @@ class handler(BaseHTTPRequestHandler):
             body = self.rfile.read(content_length)
             request_data = json.loads(body.decode('utf-8'))
             
+            events = request_data.get('fleetEvents')
+            if events is not None:
+                self._handle_fleet_events(events)
+                return
+            
+            trips = request_data.get('trips')
+            if trips is not None:
+                self._handle_batch(request_data, trips)
+                return
+            
             trip = request_data.get('trip')
             if not trip:
                 self.send_error(400, "Missing trip data")
                 return
             
-            # Calculate matches for all drivers
-            matches = []
-            for driver in DEMO_DRIVERS:
-                match = calculate_driver_match(driver, trip)
-                matches.append(match)
-            
-            # Sort by score (highest first)
-            matches.sort(key=lambda x: x['score'], reverse=True)
+            # Score nearby drivers, keeping the best `limit` matches (all by default)
+            limit = request_data.get('limit')
+            radius = float(request_data.get('radiusMiles') or PROXIMITY_CUTOFF_MILES)
+            with tracing.span('snapshot'):
+                fleet = FLEET.snapshot()
+            with tracing.span('match') as span:
+                matches, candidates_scored = find_matches(
+                    trip, int(limit) if limit else None, radius_miles=radius, fleet=fleet
+                )
+                span.set(candidates=candidates_scored)
             
             # Get best match
             best_match = matches[0] if matches else None
@@ -266,26 +536,80 @@ class handler(BaseHTTPRequestHandler):
                 "timestamp": datetime.now().isoformat(),
                 "optimization": {
                     "algorithm": "Proximity-Based Multi-Factor Scoring",
-                    "weights": {
-                        "proximity": 0.40,
-                        "routeDeviation": 0.20,
-                        "timeWindow": 0.25,
-                        "loadBalance": 0.10,
-                        "compatibility": 0.05
-                    }
+                    "weights": SCORE_WEIGHTS,
+                    "vectorized": fleet.arrays is not None,
+                    "travelTimeEngine": TRAVEL_ENGINE.name,
+                    "searchRadiusMiles": radius,
+                    "candidatesScored": candidates_scored,
+                    "fleetSize": len(fleet),
+                    "fleetVersion": fleet.version
                 }
             }
             
             # Send response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
+            self._send_json(response, request_data.get('fields'))
             
         except Exception as e:
             self.send_error(500, f"Internal error: {str(e)}")
     
+    def _handle_batch(self, request_data: Dict, trips: List[Dict]):
+        """Plan many trips at once without double-booking drivers"""
+        if not isinstance(trips, list) or not trips:
+            self.send_error(400, "trips must be a non-empty list")
+            return
+        if len(trips) > MAX_BATCH_TRIPS:
+            self.send_error(400, f"At most {MAX_BATCH_TRIPS} trips per batch")
+            return
+        
+        budget_ms = float(request_data.get('budgetMs') or ASSIGN_BUDGET_MS)
+        radius = float(request_data.get('radiusMiles') or PROXIMITY_CUTOFF_MILES)
+        with tracing.span('snapshot'):
+            fleet = FLEET.snapshot()
+        with tracing.span('plan', trips=len(trips)) as span:
+            plan = plan_trips(trips, budget_ms=budget_ms, radius_miles=radius, fleet=fleet)
+            span.set(solver=plan['solver'], pairs=plan['pairsScored'])
+        
+        response = {
+            "success": True,
+            "plan": plan,
+            "timestamp": datetime.now().isoformat(),
+            "optimization": {
+                "algorithm": "Capacity-Aware Global Assignment",
+                "weights": SCORE_WEIGHTS,
+                "vectorized": fleet.arrays is not None,
+                "travelTimeEngine": TRAVEL_ENGINE.name,
+                "searchRadiusMiles": radius,
+                "fleetSize": len(fleet)
+            }
+        }
+        
+        self._send_json(response, request_data.get('fields'))
+    
+    def _handle_fleet_events(self, events: List[Dict]):
+        """Apply driver pings, status changes and trip accept/complete events"""
+        if not isinstance(events, list):
+            self.send_error(400, "fleetEvents must be a list")
+            return
+        
+        applied = 0
+        errors = []
+        with tracing.span('events', count=len(events)):
+            for i, event in enumerate(events):
+                try:
+                    FLEET.apply(event)
+                    applied += 1
+                except (KeyError, ValueError, TypeError) as e:
+                    errors.append({"index": i, "error": str(e)})
+        
+        response = {
+            "success": not errors,
+            "applied": applied,
+            "errors": errors,
+            "fleetVersion": FLEET.version
+        }
+        
+        self._send_json(response)
+    
     def do_OPTIONS(self):
         """Handle CORS preflight"""
         self.send_response(200)
@@ -294,6 +618,7 @@ class handler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
     
+    @tracing.traced
     def do_GET(self):
         """Handle GET request - return demo info"""
         response = {
@@ -301,21 +626,26 @@ class handler(BaseHTTPRequestHandler):
             "version": "1.0.0",
             "description": "AI-powered proximity-based driver assignment system",
             "endpoints": {
-                "POST /api/transport-optimizer": "Calculate optimal driver for trip"
+                "POST /api/transport-optimizer": "Calculate optimal driver for trip",
+                "POST /api/transport-optimizer (trips[])": "Assign a batch of trips as one global plan",
+                "POST /api/transport-optimizer (fleetEvents[])": "Apply driver pings and trip accept/complete events"
             },
-            "demoDrivers": len(DEMO_DRIVERS),
+            "demoDrivers": len(FLEET.store),
             "features": [
                 "Real-time proximity calculation",
                 "Multi-factor scoring algorithm",
                 "Vehicle compatibility checking",
                 "Time window validation",
                 "Load balancing",
-                "Haversine distance formula"
-            ]
+                "Haversine distance formula",
+                "Road network travel times (local OSM extract)",
+                "Spatial grid candidate pruning",
+                "Capacity-aware multi-trip assignment",
+                "Live fleet state with versioned snapshots"
+            ],
+            "fleet": FLEET.stats(),
+            "travelTime": TRAVEL_ENGINE.stats()
         }
         
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(response, indent=2).encode())
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        self._send_json(response, query.get('fields', [None])[0])
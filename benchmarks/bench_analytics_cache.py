@@ -0,0 +1,88 @@
+"""
+Analytics dashboard polling: uncached vs result cache vs conditional 304
+
+Polls the analytics handler the way an auto-refreshing dashboard does (the
+8-section batch, and a single slow view) against the PostgREST stub:
+
+  uncached     result cache emptied before every poll (the old behavior)
+  cached       result cache warm, no validator: full 200 from memory
+  conditional  result cache warm and If-None-Match set to the last ETag: 304
+
+Reports p50/p95 latency, upstream calls and response bytes per poll.
+
+Usage: python benchmarks/bench_analytics_cache.py [--polls 100] [--latency-ms 20]
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import sys
+import time
+
+import stubs
+from bench_handlers import percentile, serve
+
+PATHS = {
+    'dashboard': '/api/analytics?user_id=admin&endpoint=overview,signups,funnel,ai_usage,engagement,benchmarks,churn,revenue',
+    'funnel': '/api/analytics?user_id=admin&endpoint=funnel',
+}
+
+
+def poll(conn, path, etag=None):
+    """One GET on a keep-alive connection; returns (status, ms, body bytes, ETag)"""
+    start = time.perf_counter()
+    conn.request('GET', path, headers={'If-None-Match': etag} if etag else {})
+    response = conn.getresponse()
+    body = response.read()
+    return response.status, (time.perf_counter() - start) * 1000, len(body), response.getheader('ETag')
+
+
+def run(port, module, supabase, path, mode, polls):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    etag = poll(conn, path)[3]  # warm-up, and the ETag a dashboard would hold
+    supabase.reset_stats()
+    results = []
+    for _ in range(polls):
+        if mode == 'uncached':
+            module.RESULT_CACHE.clear()
+        results.append(poll(conn, path, etag if mode == 'conditional' else None))
+    conn.close()
+
+    latencies = [ms for _, ms, _, _ in results]
+    return {
+        'status': sorted({status for status, _, _, _ in results}),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+        },
+        'upstream_calls_per_poll': round(supabase.stats['requests'] / polls, 2),
+        'response_bytes_per_poll': round(sum(size for _, _, size, _ in results) / polls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--polls', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=20, help='added latency per upstream call')
+    args = parser.parse_args()
+
+    upstream = stubs.start_stubs(latency_ms=args.latency_ms)
+    results = {'config': vars(args), 'paths': {}}
+    with contextlib.redirect_stdout(sys.stderr):
+        server = serve('analytics.py')
+        for name, path in PATHS.items():
+            results['paths'][name] = {
+                mode: run(server.server_port, server.module, upstream['supabase'], path, mode, args.polls)
+                for mode in ('uncached', 'cached', 'conditional')
+            }
+        server.shutdown()
+        server.server_close()
+
+    print(json.dumps(results, indent=2))
+    for stub in upstream.values():
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Transport optimizer batch assignment benchmark
+
+Plans batches of random trips onto random fleets three ways: each trip
+independently taking its best match (the single-trip endpoint), the greedy
+global plan, and the exact capacity-aware plan. Reports trips served,
+total score, drivers booked past their free seats, and planning latency.
+
+Usage: python benchmarks/bench_assignment.py [--sizes 100x1000,1000x5000,3000x10000] [--budget-ms 1000]
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+from datetime import datetime
+
+from bench_transport import make_fleet, make_trip
+from stubs import load_handler_module
+
+
+def overbooked(optimizer, driver_ids):
+    """Drivers given more trips than they have free seats"""
+    drivers = {d['id']: d for d in optimizer.FLEET.store.drivers}
+    return sum(
+        1 for driver_id, count in Counter(driver_ids).items()
+        if count > drivers[driver_id]['vehicle']['capacity'] - drivers[driver_id]['currentLoad']
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='100x1000,1000x5000,3000x10000')
+    parser.add_argument('--budget-ms', type=float, default=1000)
+    args = parser.parse_args()
+
+    optimizer = load_handler_module('transport-optimizer.py')
+    now = datetime.now()
+    results = []
+    for size in args.sizes.split(','):
+        trip_count, driver_count = (int(x) for x in size.split('x'))
+        optimizer.load_fleet(make_fleet(driver_count))
+        trips = [make_trip(seed, now) for seed in range(trip_count)]
+
+        start = time.perf_counter()
+        independent = [optimizer.find_matches(trip, 1, now)[0] for trip in trips]
+        independent_ms = (time.perf_counter() - start) * 1000
+        picks = [m[0] for m in independent if m and m[0]['compatible']]
+
+        row = {
+            'trips': trip_count,
+            'drivers': driver_count,
+            'independent': {
+                'served': len(picks),
+                'total_score': round(sum(m['score'] for m in picks), 2),
+                'overbooked_drivers': overbooked(optimizer, [m['driverId'] for m in picks]),
+                'ms': round(independent_ms, 1),
+            },
+        }
+        for mode, max_cells in (('greedy', 0), ('exact', optimizer.ASSIGN_MAX_CELLS)):
+            optimizer.ASSIGN_MAX_CELLS = max_cells
+            plan = optimizer.plan_trips(trips, now, budget_ms=args.budget_ms)
+            row[mode] = {
+                'solver': plan['solver'],
+                'served': plan['tripsAssigned'],
+                'total_score': plan['totalScore'],
+                'overbooked_drivers': overbooked(optimizer, [a['driverId'] for a in plan['assignments']]),
+                'ms': plan['solveMs'],
+            }
+            if plan['fallbackReason'] and mode == 'exact':
+                row[mode]['fallback_reason'] = plan['fallbackReason']
+        results.append(row)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Time-to-first-byte benchmark for the content writer: buffered JSON vs SSE
+
+Starts api/content-writer.py under a local HTTPServer with stubbed
+Supabase/Gemini (Gemini "generates" its reply in timed chunks) and
+measures time to the first response byte and to the full response.
+
+Usage: python benchmarks/bench_content_stream.py [--requests 10] [--chunk-delay-ms 200]
+"""
+
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import stubs
+
+
+def timed_post(url, body):
+    """Return (ttfb_ms, total_ms, response bytes)"""
+    req = urllib.request.Request(url, data=json.dumps(body).encode(), headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(req) as response:
+        first = response.read(1)
+        ttfb = time.perf_counter() - start
+        rest = response.read()
+    return ttfb * 1000, (time.perf_counter() - start) * 1000, first + rest
+
+
+def run(url, n, stream):
+    ttfb, total = [], []
+    for i in range(n):
+        # Unique prompts so every request reaches Gemini
+        first_ms, total_ms, _ = timed_post(url, {
+            'user_id': 'u1',
+            'prompt': f'a facebook post about our fall sale number {i} {stream}',
+            'content_type': 'social',
+            'cache': 'off',
+            'stream': stream
+        })
+        ttfb.append(first_ms)
+        total.append(total_ms)
+    return {
+        'ttfb_ms_p50': round(statistics.median(ttfb), 1),
+        'total_ms_p50': round(statistics.median(total), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--chunk-delay-ms', type=float, default=200)
+    args = parser.parse_args()
+
+    stubs.GEMINI_CHUNK_DELAY_MS = args.chunk_delay_ms
+    upstream = stubs.start_stubs()
+    module = stubs.load_handler_module('content-writer.py')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), module.handler)
+    module.handler.log_message = lambda *a: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/content-writer"
+
+    print(json.dumps({
+        'buffered': run(url, args.requests, False),
+        'streamed': run(url, args.requests, True),
+    }, indent=2))
+
+    server.shutdown()
+    for stub in upstream.values():
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Response encoding per endpoint: bytes on the wire and encode time
+
+Fetches a real response from each handler (local upstream stubs), then
+encodes it the old way (json.dumps with default whitespace; indent=2 for
+the optimizer GET), compactly with the stdlib, with orjson if installed,
+sparse with a fields= spec where one applies, and gzip/brotli on top.
+Reports body bytes and encode time for each variant. The on-the-wire
+sizes the handler actually sends are also checked, without
+Accept-Encoding and with `gzip, br`.
+
+Usage: python benchmarks/bench_encoding.py [--repeat 200]
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import sys
+import time
+
+import stubs
+from bench_handlers import SCENARIOS, serve
+from bench_transport import make_trip
+
+# Drops the echoed trip and the per-match vehicle and score breakdown
+OPTIMIZER_FIELDS = '-trip,-matches.vehicle,-matches.breakdown,-bestMatch.vehicle,-bestMatch.breakdown'
+
+# name -> (handler file, method, path, body, legacy indent, sparse fields spec)
+ENDPOINTS = {
+    'optimizer_match': ('transport-optimizer.py', 'POST', '/api/transport-optimizer',
+                        {'trip': make_trip(seed=3)}, None, OPTIMIZER_FIELDS),
+    'optimizer_batch': ('transport-optimizer.py', 'POST', '/api/transport-optimizer',
+                        {'trips': [make_trip(seed=i) for i in range(20)]}, None, None),
+    'optimizer_info': ('transport-optimizer.py', 'GET', '/api/transport-optimizer', None, 2, None),
+    'analytics_dashboard': ('analytics.py', *SCENARIOS['dashboard'][1](0), None, None),
+    'review_bulk_generate': ('review-agent.py', *SCENARIOS['bulk_generate'][1](0), None, None),
+    'content': ('content-writer.py', *SCENARIOS['content'][1](0), None, None),
+}
+
+
+def fetch(port, method, path, body, accept_encoding=None):
+    """(status, raw body bytes, Content-Encoding)"""
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    if accept_encoding:
+        headers['Accept-Encoding'] = accept_encoding
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        conn.request(method, path, body=json.dumps(body).encode() if body is not None else None, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read(), response.getheader('Content-Encoding')
+    finally:
+        conn.close()
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) * 1e6 / repeat
+
+
+def variants(encoding, data, indent, fields):
+    out = {
+        'legacy_json': lambda: json.dumps(data, indent=indent).encode(),
+        'compact_json': lambda: json.dumps(data, separators=(',', ':'), default=str).encode(),
+    }
+    if encoding.orjson is not None:
+        out['orjson'] = lambda: encoding.orjson.dumps(data, default=str)
+    if fields:
+        out['sparse'] = lambda: encoding.dumps(encoding.select_fields(data, fields))
+    out['gzip'] = lambda: encoding.compress(encoding.dumps(data), 'gzip')
+    if encoding.brotli is not None:
+        out['brotli'] = lambda: encoding.compress(encoding.dumps(data), 'br')
+    if fields:
+        out['sparse_gzip'] = lambda: encoding.compress(encoding.dumps(encoding.select_fields(data, fields)), 'gzip')
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=200, help='encodes per variant for the timing')
+    args = parser.parse_args()
+
+    upstream = stubs.start_stubs()
+    sys.path.insert(0, stubs.API_DIR)
+    from _lib import encoding
+
+    results = {'json_backend': encoding.JSON_BACKEND, 'brotli': encoding.brotli is not None, 'endpoints': {}}
+    servers = {}
+    with contextlib.redirect_stdout(sys.stderr):
+        for name, (filename, method, path, body, indent, fields) in ENDPOINTS.items():
+            if filename not in servers:
+                servers[filename] = serve(filename)
+            port = servers[filename].server_port
+            status, plain, _ = fetch(port, method, path, body)
+            _, wire, coding = fetch(port, method, path, body, 'gzip, br')
+            data = json.loads(plain)
+
+            report = {
+                'status': status,
+                'wire': {'plain': len(plain), 'accept_gzip_br': len(wire), 'content_encoding': coding},
+            }
+            for variant, fn in variants(encoding, data, indent, fields).items():
+                encoded, micros = timed(fn, args.repeat)
+                report[variant] = {'bytes': len(encoded), 'encode_us': round(micros, 1)}
+            results['endpoints'][name] = report
+
+        for server in servers.values():
+            server.shutdown()
+            server.server_close()
+
+    print(json.dumps(results, indent=2))
+    for stub in upstream.values():
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
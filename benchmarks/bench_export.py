@@ -0,0 +1,95 @@
+"""
+Analytics export memory: load-then-encode vs the streamed export
+
+Exports the stub events table (--rows rows) from the analytics handler as
+NDJSON and CSV, streamed page by page over chunked encoding, and compares
+that with the pattern of the regular endpoints: every page collected into
+one list, then json.dumps'd into a single response body. Reports rows/s,
+response bytes and the tracemalloc peak for each, at each row count, so
+flat memory shows up as a peak that does not grow with the rows.
+
+Usage: python benchmarks/bench_export.py [--rows 10000,100000] [--page-size 1000]
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import stubs
+from bench_handlers import serve
+
+
+def streamed(port, fmt):
+    """GET the export, reading the body in 64 KiB pieces; returns bytes received"""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        conn.request('GET', f'/api/analytics?user_id=admin&export=events&format={fmt}')
+        response = conn.getresponse()
+        assert response.status == 200, response.status
+        received = 0
+        while True:
+            piece = response.read(64 * 1024)
+            if not piece:
+                return received
+            received += len(piece)
+    finally:
+        conn.close()
+
+
+def buffered(module):
+    """The regular endpoints' pattern: all rows in memory, then one body"""
+    api = module.AnalyticsAPI(strict=True)
+    rows = [row for page in api.export_pages('events') for row in page]
+    return len(json.dumps({'success': True, 'data': rows}).encode())
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(stubs.EVENT_ROWS / elapsed),
+        'response_bytes': size,
+        'peak_mib': round(peak / 2 ** 20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', default='10000,100000')
+    parser.add_argument('--page-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    upstream = stubs.start_stubs()
+    os.environ['ANALYTICS_EXPORT_PAGE_SIZE'] = str(args.page_size)
+
+    results = {'page_size': args.page_size, 'rows': {}}
+    with contextlib.redirect_stdout(sys.stderr):
+        server = serve('analytics.py')
+        port = server.server_port
+        for rows in (int(n) for n in args.rows.split(',')):
+            stubs.EVENT_ROWS = rows
+            results['rows'][rows] = {
+                'buffered_json': measure(lambda: buffered(server.module)),
+                'streamed_ndjson': measure(lambda: streamed(port, 'ndjson')),
+                'streamed_csv': measure(lambda: streamed(port, 'csv')),
+            }
+        server.shutdown()
+        server.server_close()
+
+    print(json.dumps(results, indent=2))
+    for stub in upstream.values():
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Live fleet state benchmark with a ping simulator
+
+Replays a stream of driver events (position pings as a random walk, plus
+trip accept/complete and status changes) into FleetState from one writer
+thread while reader threads run find_matches against snapshots. Reports
+event throughput and apply latency, snapshot build cost next to a full
+rebuild of the fleet, match latency under write load, and a consistency
+check that every match reflects the snapshot it was computed from.
+
+Usage: python benchmarks/bench_fleet_state.py [--drivers 10000] [--seconds 5] [--rate 0] [--readers 2]
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import datetime
+
+from bench_transport import make_fleet, make_trip
+from stubs import load_handler_module
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class PingSimulator:
+    """Generates driver events; rate 0 means as fast as the store takes them"""
+
+    def __init__(self, drivers, rate=0, seed=9):
+        self.rng = random.Random(seed)
+        self.positions = {d['id']: (d['location']['lat'], d['location']['lng']) for d in drivers}
+        self.ids = list(self.positions)
+        self.rate = rate
+
+    def next_event(self):
+        driver_id = self.ids[self.rng.randrange(len(self.ids))]
+        roll = self.rng.random()
+        if roll < 0.9:
+            lat, lng = self.positions[driver_id]
+            lat += self.rng.uniform(-0.002, 0.002)
+            lng += self.rng.uniform(-0.002, 0.002)
+            self.positions[driver_id] = (lat, lng)
+            return {'type': 'ping', 'driverId': driver_id, 'lat': lat, 'lng': lng}
+        if roll < 0.95:
+            return {'type': 'accept', 'driverId': driver_id}
+        if roll < 0.99:
+            return {'type': 'complete', 'driverId': driver_id}
+        return {'type': 'status', 'driverId': driver_id,
+                'status': self.rng.choice(['available', 'break', 'off-duty'])}
+
+    def run(self, fleet, stop, latencies):
+        interval = 1 / self.rate if self.rate else 0
+        next_at = time.perf_counter()
+        while not stop.is_set():
+            event = self.next_event()
+            start = time.perf_counter()
+            try:
+                fleet.apply(event)
+            except ValueError:
+                pass  # accept on a full driver
+            latencies.append((time.perf_counter() - start) * 1e6)
+            if interval:
+                next_at += interval
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--drivers', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rate', type=float, default=0, help='events per second (0 = unthrottled)')
+    parser.add_argument('--readers', type=int, default=2)
+    args = parser.parse_args()
+
+    optimizer = load_handler_module('transport-optimizer.py')
+
+    drivers = make_fleet(args.drivers)
+    start = time.perf_counter()
+    optimizer.load_fleet(drivers)
+    rebuild_ms = (time.perf_counter() - start) * 1000
+    fleet = optimizer.FLEET
+
+    now = datetime.now()
+    trips = [make_trip(seed, now) for seed in range(50)]
+    stop = threading.Event()
+    apply_us, match_ms, snapshot_ms = [], [], []
+    violations = [0]
+
+    def reader(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            start = time.perf_counter()
+            snapshot = fleet.snapshot()
+            snapshot_ms.append((time.perf_counter() - start) * 1000)
+            matches, _ = optimizer.find_matches(trips[rng.randrange(len(trips))], 5, now, fleet=snapshot)
+            match_ms.append((time.perf_counter() - start) * 1000)
+            for match in matches:
+                driver = snapshot.drivers[snapshot.rows[match['driverId']]]
+                if match['compatible'] and match['currentLocation'] != driver['location']:
+                    violations[0] += 1
+
+    simulator = PingSimulator(drivers, args.rate)
+    threads = [threading.Thread(target=simulator.run, args=(fleet, stop, apply_us))]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    version_before = fleet.version
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps({
+        'drivers': args.drivers,
+        'events_applied': fleet.version - version_before,
+        'events_per_second': round((fleet.version - version_before) / args.seconds),
+        'apply_us': {'p50': round(percentile(apply_us, 50), 1), 'p99': round(percentile(apply_us, 99), 1)},
+        'snapshot_ms': {'p50': round(percentile(snapshot_ms, 50), 3), 'p99': round(percentile(snapshot_ms, 99), 3)},
+        'snapshots_built': fleet.snapshots_built,
+        'full_rebuild_ms': round(rebuild_ms, 1),
+        'matches': len(match_ms),
+        'match_ms': {'p50': round(percentile(match_ms, 50), 2), 'p99': round(percentile(match_ms, 99), 2)},
+        'consistency_violations': violations[0],
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""
+Load test for the Python API handlers against local upstream stubs
+
+Serves each api/*.py `handler` class from a local ThreadingHTTPServer, with
+Supabase PostgREST, Gemini, Google Places and Yelp replaced by the stubs in
+stubs.py (latency and failure rate configurable). Each scenario is driven
+at every concurrency level for a fixed number of requests and reports
+p50/p95/p99 latency, throughput, status codes, upstream calls and bytes
+per request. Request bodies are unique per request so the handlers'
+response caches never serve a hit.
+
+Write the results with --output and pass them back as --baseline on a
+later commit to get p95 and throughput ratios for every scenario.
+
+Usage: python benchmarks/bench_handlers.py [--scenarios overview,dashboard,bulk_generate,content,optimizer]
+           [--concurrency 1,8,32] [--requests 200] [--latency-ms 20] [--failure-rate 0]
+           [--output results.json] [--baseline previous.json]
+"""
+
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import stubs
+from bench_transport import make_trip
+
+
+def _overview(i):
+    return 'GET', '/api/analytics?user_id=admin&endpoint=overview', None
+
+
+def _dashboard(i):
+    endpoints = 'overview,signups,funnel,ai_usage,engagement,benchmarks,churn,revenue'
+    return 'GET', f'/api/analytics?user_id=admin&endpoint={endpoints}', None
+
+
+def _bulk_generate(i):
+    reviews = [{
+        'review_id': f'r{i}-{j}',
+        'text': f'Great service on visit {i}, reviewer {j}. Friendly staff and quick turnaround!',
+        'rating': 5 - (j % 3),
+        'platform': 'google'
+    } for j in range(10)]
+    return 'POST', '/api/review-agent/bulk-generate', {
+        'reviews': reviews,
+        'business_name': 'Bench Bakery',
+        'user_id': 'u1'
+    }
+
+
+def _content(i):
+    return 'POST', '/api/content-writer', {
+        'user_id': 'u1',
+        'prompt': f'a facebook post about our fall sale number {i}',
+        'content_type': 'social',
+        'cache': 'off'
+    }
+
+
+def _optimizer(i):
+    return 'POST', '/api/transport-optimizer', {'trip': make_trip(seed=i), 'limit': 5}
+
+
+# name -> (handler file, request factory(i) -> (method, path, json body))
+SCENARIOS = {
+    'overview': ('analytics.py', _overview),
+    'dashboard': ('analytics.py', _dashboard),
+    'bulk_generate': ('review-agent.py', _bulk_generate),
+    'content': ('content-writer.py', _content),
+    'optimizer': ('transport-optimizer.py', _optimizer),
+}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def serve(filename):
+    """Start one handler module on an ephemeral port (loaded module on server.module)"""
+    module = stubs.load_handler_module(filename)
+    module.handler.log_message = lambda *a: None
+    server = stubs.BenchServer(('127.0.0.1', 0), module.handler)
+    server.module = module
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def send(port, method, path, body):
+    """One request on a fresh connection; returns (status, ms, bytes_sent, bytes_received)"""
+    data = json.dumps(body).encode() if body is not None else None
+    headers = {'Content-Type': 'application/json'} if data is not None else {}
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    start = time.perf_counter()
+    try:
+        conn.request(method, path, body=data, headers=headers)
+        response = conn.getresponse()
+        payload = response.read()
+        status = response.status
+    except (OSError, http.client.HTTPException):
+        status, payload = 0, b''
+    finally:
+        conn.close()
+    return status, (time.perf_counter() - start) * 1000, len(data or b''), len(payload)
+
+
+def run_level(port, factory, upstream, concurrency, n, first=0):
+    requests = [factory(i) for i in range(first, first + n)]
+    for stub in upstream.values():
+        stub.reset_stats()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda request: send(port, *request), requests))
+    elapsed = time.perf_counter() - start
+
+    latencies = [ms for _, ms, _, _ in results]
+    calls = {name: stub.stats['requests'] for name, stub in upstream.items() if stub.stats['requests']}
+    return {
+        'concurrency': concurrency,
+        'requests': n,
+        'status': dict(Counter(str(status) for status, _, _, _ in results)),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(max(latencies), 2),
+        },
+        'throughput_rps': round(n / elapsed, 1),
+        'upstream_calls_per_request': round(sum(calls.values()) / n, 2),
+        'upstream_calls_by_service': calls,
+        'bytes_per_request': {
+            'request': round(sum(r[2] for r in results) / n),
+            'response': round(sum(r[3] for r in results) / n),
+            'upstream_sent': round(sum(s.stats['bytes_in'] for s in upstream.values()) / n),
+            'upstream_received': round(sum(s.stats['bytes_out'] for s in upstream.values()) / n),
+        },
+    }
+
+
+def compare(results, baseline):
+    """p95 and throughput of this run relative to a baseline run (>1 p95 = slower)"""
+    previous = {
+        (scenario, level['concurrency']): level
+        for scenario, levels in baseline.get('scenarios', {}).items()
+        for level in levels
+    }
+    ratios = {}
+    for scenario, levels in results['scenarios'].items():
+        for level in levels:
+            before = previous.get((scenario, level['concurrency']))
+            if not before:
+                continue
+            ratios[f"{scenario}@{level['concurrency']}"] = {
+                'p95': round(level['latency_ms']['p95'] / max(before['latency_ms']['p95'], 1e-9), 3),
+                'throughput': round(level['throughput_rps'] / max(before['throughput_rps'], 1e-9), 3),
+            }
+    return {'commit': baseline.get('commit'), 'ratios': ratios}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=stubs.API_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--requests', type=int, default=200, help='requests per concurrency level')
+    parser.add_argument('--latency-ms', type=float, default=20, help='added latency per upstream call')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of upstream calls answered 503')
+    parser.add_argument('--output', help='also write the results JSON here')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    args = parser.parse_args()
+
+    names = args.scenarios.split(',')
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    # Stubs first: the handlers read their upstream URLs at import time
+    upstream = stubs.start_stubs(latency_ms=args.latency_ms, failure_rate=args.failure_rate)
+    # Measure the uncached path; bench_analytics_cache.py covers the result cache
+    os.environ['ANALYTICS_RESULT_TTL'] = '0'
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'config': {
+            'requests': args.requests,
+            'latency_ms': args.latency_ms,
+            'failure_rate': args.failure_rate,
+        },
+        'scenarios': {},
+    }
+
+    # Handlers print upstream errors; keep stdout for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        for name in names:
+            filename, factory = SCENARIOS[name]
+            server = serve(filename)
+            send(server.server_port, *factory(-1))  # warm-up: imports, pooled connections
+            results['scenarios'][name] = [
+                run_level(server.server_port, factory, upstream, level, args.requests, first=i * args.requests)
+                for i, level in enumerate(levels)
+            ]
+            server.shutdown()
+            server.server_close()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results['vs_baseline'] = compare(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    for stub in upstream.values():
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Connection reuse benchmark: urllib.urlopen vs the shared pooled client
+
+Replays the upstream calls a content-writer generation used to make
+(profile lookup, Gemini call, role lookup, increment RPC) against local
+stubs and counts how many TCP connections (handshakes) each approach opens.
+
+Usage: python benchmarks/bench_http_pool.py [--requests 50] [--latency-ms 5]
+"""
+
+import argparse
+import json
+import sys
+import time
+import urllib.request
+
+from stubs import API_DIR, start_stubs
+
+sys.path.insert(0, API_DIR)
+from _lib.http_client import PooledHTTPClient
+
+CALLS = [
+    ('GET', 'supabase', "/rest/v1/user_profiles?id=eq.u1&select=generation_count,generation_limit,role", None),
+    ('POST', 'gemini', "/v1beta/models/gemini-pro:generateContent?key=k", b'{}'),
+    ('GET', 'supabase', "/rest/v1/user_profiles?id=eq.u1&select=role", None),
+    ('POST', 'supabase', "/rest/v1/rpc/increment_generation_count", b'{"user_uuid": "u1"}'),
+]
+
+
+def run_urllib(stubs, n):
+    headers = {
+        'apikey': 'stub-anon-key',
+        'Authorization': 'Bearer stub-anon-key',
+        'Content-Type': 'application/json'
+    }
+    for _ in range(n):
+        for method, service, path, body in CALLS:
+            req = urllib.request.Request(stubs[service].url + path, data=body, headers=headers, method=method)
+            with urllib.request.urlopen(req) as response:
+                response.read()
+
+
+def run_pooled(stubs, n):
+    clients = {
+        'supabase': PooledHTTPClient(stubs['supabase'].url, {
+            'apikey': 'stub-anon-key',
+            'Authorization': 'Bearer stub-anon-key'
+        }),
+        'gemini': PooledHTTPClient(stubs['gemini'].url),
+    }
+    for _ in range(n):
+        for method, service, path, body in CALLS:
+            clients[service].request(method, path, data=body, headers={'Content-Type': 'application/json'})
+
+
+def measure(stubs, fn, n):
+    for stub in stubs.values():
+        stub.reset_stats()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    connections = sum(stub.stats['connections'] for stub in stubs.values())
+    requests = sum(stub.stats['requests'] for stub in stubs.values())
+    return {
+        'requests': n,
+        'upstream_calls': requests,
+        'connections_opened': connections,
+        'handshakes_per_request': round(connections / n, 3),
+        'ms_per_request': round(elapsed * 1000 / n, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    stubs = start_stubs(latency_ms=args.latency_ms)
+
+    baseline = measure(stubs, lambda: run_urllib(stubs, args.requests), args.requests)
+    pooled = measure(stubs, lambda: run_pooled(stubs, args.requests), args.requests)
+
+    print(json.dumps({
+        'urllib': baseline,
+        'pooled': pooled,
+        'handshakes_saved_per_request': round(
+            baseline['handshakes_per_request'] - pooled['handshakes_per_request'], 3
+        ),
+    }, indent=2))
+
+    for stub in stubs.values():
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Analytics event ingestion throughput: one insert per event vs batches vs the buffer
+
+Posts the same number of events to the analytics handler four ways, against
+the PostgREST stub: one event per request (the original path), arrays of
+--batch-size events per request, and both of those in buffered mode, where
+the handler answers 202 and EventBuffer writes in bulk. Reports accepted
+events per second, request latency, inserts reaching Supabase and, for the
+buffered modes, the time until the buffer has written everything (with
+--failure-rate, its retries and spilled/replayed rows too).
+
+Usage: python benchmarks/bench_ingest.py [--events 2000] [--batch-size 50]
+           [--concurrency 16] [--latency-ms 20] [--failure-rate 0]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import stubs
+from bench_handlers import percentile, send, serve
+
+
+def make_event(i):
+    return {
+        'user_id': f'00000000-0000-4000-8000-{i % 97:012d}',
+        'event_type': 'page_view',
+        'session_id': f'00000000-0000-4000-9000-{i % 31:012d}',
+        'page': f'/dashboard/{i % 7}',
+        'device_class': 'desktop',
+        'payload': {'seq': i}
+    }
+
+
+def requests_for(mode, n, batch_size):
+    """Request bodies carrying n events"""
+    buffered = mode.startswith('buffered')
+    if mode.endswith('single'):
+        return [dict(make_event(i), mode='buffered') if buffered else make_event(i) for i in range(n)]
+    return [
+        {'events': [make_event(i) for i in range(start, min(n, start + batch_size))],
+         'mode': 'buffered' if buffered else 'direct'}
+        for start in range(0, n, batch_size)
+    ]
+
+
+def run_mode(port, module, supabase, mode, args):
+    bodies = requests_for(mode, args.events, args.batch_size)
+    supabase.reset_stats()
+    buffer = module.EVENT_BUFFER
+    before = buffer.stats()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda body: send(port, 'POST', '/api/analytics', body), bodies))
+    acked = time.perf_counter() - start
+
+    ok = [body for body, (status, _, _, _) in zip(bodies, results) if status in (200, 202)]
+    accepted = sum(len(body['events']) if 'events' in body else 1 for body in ok)
+    report = {
+        'requests': len(bodies),
+        'events_accepted': accepted,
+        'status': sorted({status for status, _, _, _ in results}),
+        'latency_ms': {
+            'p50': round(percentile([ms for _, ms, _, _ in results], 50), 2),
+            'p95': round(percentile([ms for _, ms, _, _ in results], 95), 2),
+        },
+        'events_per_second': round(accepted / acked),
+    }
+
+    if mode.startswith('buffered'):
+        # Wait for the background flusher, then force out the remainder
+        deadline = time.perf_counter() + 30
+        while buffer.stats()['queued'] and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        buffer.flush()
+        drained = time.perf_counter() - start
+        after = buffer.stats()
+        report['drained_s'] = round(drained, 3)
+        report['events_written'] = after['written'] - before['written']
+        report['written_per_second'] = round(report['events_written'] / drained)
+        report['buffer'] = {key: after[key] - before[key] for key in ('flushes', 'retried', 'spilled', 'replayed', 'dropped')}
+
+    report['upstream_inserts'] = supabase.stats['requests']
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=50, help='events per request in the batch modes')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=20, help='added latency per upstream call')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of upstream calls answered 503')
+    args = parser.parse_args()
+
+    upstream = stubs.start_stubs(latency_ms=args.latency_ms, failure_rate=args.failure_rate)
+    spill_dir = tempfile.mkdtemp(prefix='bench-ingest-')
+    os.environ['ANALYTICS_EVENT_SPILL'] = os.path.join(spill_dir, 'spill.jsonl')
+    os.environ['ANALYTICS_BUFFER_MAX_AGE'] = '0.2'
+
+    results = {'config': vars(args), 'modes': {}}
+    with contextlib.redirect_stdout(sys.stderr):
+        server = serve('analytics.py')
+        module = server.module
+        module.EVENT_BUFFER.backoff = 0.01
+        send(server.server_port, 'POST', '/api/analytics', make_event(-1))  # warm-up
+        for mode in ('single', 'batch', 'buffered_single', 'buffered_batch'):
+            results['modes'][mode] = run_mode(server.server_port, module, upstream['supabase'], mode, args)
+        server.shutdown()
+        server.server_close()
+
+    print(json.dumps(results, indent=2))
+    for stub in upstream.values():
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Road network travel time benchmark
+
+Writes a synthetic rural road grid around the demo service area as an OSM
+XML extract (no download needed), compiles it into the CSR road graph and
+measures: OSM parse vs compiled .csr load time, single-pair A*, one reverse
+Dijkstra per pickup for all nearby drivers (cold vs cached), and
+find_matches latency on the road engine vs haversine.
+
+Usage: python benchmarks/bench_routing.py [--grid 120] [--drivers 5000] [--trips 10]
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from bench_transport import CENTER, make_fleet, make_trip
+from stubs import load_handler_module
+
+
+def write_grid_osm(path, size, spacing=0.01, seed=5):
+    """size x size grid of roads; every 10th line is a faster secondary road,
+    and a few residential segments are missing to force detours"""
+    rng = random.Random(seed)
+    origin = (CENTER[0] - size * spacing / 2, CENTER[1] - size * spacing / 2)
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for i in range(size):
+            for j in range(size):
+                f.write(f'<node id="{i * size + j + 1}" lat="{origin[0] + i * spacing:.6f}" '
+                        f'lon="{origin[1] + j * spacing:.6f}"/>\n')
+        way_id = 1
+        for i in range(size):
+            for horizontal in (True, False):
+                fast = i % 10 == 0
+                for j in range(size - 1):
+                    if not fast and rng.random() < 0.05:
+                        continue
+                    a, b = (i * size + j + 1, i * size + j + 2) if horizontal else \
+                        (j * size + i + 1, (j + 1) * size + i + 1)
+                    highway = "secondary" if fast else "residential"
+                    f.write(f'<way id="{way_id}"><nd ref="{a}"/><nd ref="{b}"/>'
+                            f'<tag k="highway" v="{highway}"/></way>\n')
+                    way_id += 1
+        f.write('</osm>\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--grid', type=int, default=120)
+    parser.add_argument('--drivers', type=int, default=5000)
+    parser.add_argument('--trips', type=int, default=10)
+    args = parser.parse_args()
+
+    optimizer = load_handler_module('transport-optimizer.py')
+    from _lib.transport.routing import HaversineEngine, RoadGraph, RoadNetworkEngine
+
+    workdir = tempfile.mkdtemp()
+    osm_path = os.path.join(workdir, 'grid.osm')
+    csr_path = os.path.join(workdir, 'grid.csr')
+    write_grid_osm(osm_path, args.grid)
+
+    start = time.perf_counter()
+    graph = RoadGraph.load(osm_path)
+    parse_ms = (time.perf_counter() - start) * 1000
+    graph.save(csr_path)
+    start = time.perf_counter()
+    graph = RoadGraph.load(csr_path)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    now = datetime.now()
+    spread = args.grid * 0.01 / 2
+    optimizer.load_fleet(make_fleet(args.drivers, spread=spread))
+    trips = [make_trip(seed, now, spread=spread * 0.8) for seed in range(args.trips)]
+    engine = RoadNetworkEngine(graph)
+
+    # Single pair: A* vs a reverse Dijkstra that only needs one origin
+    pairs = [(trip['pickup']['coordinates'], optimizer.FLEET.store.drivers[i]['location'])
+             for i, trip in enumerate(trips)]
+    start = time.perf_counter()
+    for pickup, driver in pairs:
+        graph.shortest_seconds(graph.snap((driver['lat'], driver['lng'])), graph.snap((pickup['lat'], pickup['lng'])))
+    astar_ms = (time.perf_counter() - start) * 1000 / len(pairs)
+    start = time.perf_counter()
+    for pickup, driver in pairs:
+        graph.seconds_to(graph.snap((pickup['lat'], pickup['lng'])), [graph.snap((driver['lat'], driver['lng']))])
+    dijkstra_ms = (time.perf_counter() - start) * 1000 / len(pairs)
+
+    results = {
+        'graph': {'nodes': len(graph), 'edges': len(graph.forward[1])},
+        'osm_parse_ms': round(parse_ms, 1),
+        'csr_load_ms': round(load_ms, 1),
+        'single_pair_ms': {'astar': round(astar_ms, 2), 'dijkstra': round(dijkstra_ms, 2)},
+    }
+
+    for label, travel_engine in (('haversine', HaversineEngine()), ('road_cold', engine), ('road_cached', engine)):
+        optimizer.TRAVEL_ENGINE = travel_engine
+        start = time.perf_counter()
+        matches = [optimizer.find_matches(trip, 5, now) for trip in trips]
+        results[f'find_matches_ms_{label}'] = round((time.perf_counter() - start) * 1000 / len(trips), 2)
+        if label == 'road_cold':
+            road_best = [m[0][0] for m in matches if m[0]]
+        if label == 'haversine':
+            haversine_best = [m[0][0] for m in matches if m[0]]
+
+    results['best_match_changed_by_routing'] = sum(
+        1 for a, b in zip(haversine_best, road_best) if a['driverId'] != b['driverId']
+    )
+    results['mean_road_over_straight_eta'] = round(
+        sum(b['estimatedArrivalMinutes'] / max(a['estimatedArrivalMinutes'], 0.1)
+            for a, b in zip(haversine_best, road_best) if a['driverId'] == b['driverId'])
+        / max(1, sum(1 for a, b in zip(haversine_best, road_best) if a['driverId'] == b['driverId'])), 2
+    )
+    results['road_engine'] = engine.stats()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Transport optimizer fleet-scale benchmark
+
+Generates random fleets around the demo service area and compares the
+scalar calculate_driver_match loop, the vectorized batch scorer over the
+whole fleet, and find_matches (spatial index pruning + vectorized scoring
+of the candidates): per-trip latency at each fleet size, a check that the
+scalar and vectorized paths give identical scores, and how often pruning
+keeps the full-fleet best match. Also times the compatibility check per
+driver-trip pair: nested-dict lookups vs compiled bitmask ANDs.
+
+Usage: python benchmarks/bench_transport.py [--sizes 10,100,1000,10000,100000] [--trips 5]
+"""
+
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from stubs import load_handler_module
+
+CENTER = (40.2732, -76.8867)
+VEHICLE_TYPES = ["standard", "wheelchair", "stretcher"]
+STATUSES = ["available", "available", "available", "on-route", "break", "off-duty"]
+
+
+def make_fleet(n, seed=7, spread=1.5):
+    """n random drivers within roughly +/- spread degrees of the demo area"""
+    rng = random.Random(seed)
+    drivers = []
+    for i in range(n):
+        capacity = rng.randint(1, 3)
+        types = ["standard"] + [t for t in VEHICLE_TYPES[1:] if rng.random() < 0.5]
+        certifications = ["basic"] + (["medical-attendant"] if rng.random() < 0.6 else [])
+        drivers.append({
+            "id": f"driver-{i}",
+            "name": f"Driver {i}",
+            "status": rng.choice(STATUSES),
+            "location": {
+                "lat": CENTER[0] + rng.uniform(-spread, spread),
+                "lng": CENTER[1] + rng.uniform(-spread, spread)
+            },
+            "vehicle": {
+                "type": types,
+                "oxygenEquipped": rng.random() < 0.5,
+                "capacity": capacity
+            },
+            "currentLoad": rng.randint(0, capacity),
+            "certifications": certifications
+        })
+    return drivers
+
+
+def make_trip(seed=11, now=None, spread=0.5):
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    earliest = now + timedelta(minutes=rng.randint(0, 60))
+    return {
+        "id": f"trip-{seed}",
+        "pickup": {
+            "coordinates": {
+                "lat": CENTER[0] + rng.uniform(-spread, spread),
+                "lng": CENTER[1] + rng.uniform(-spread, spread)
+            },
+            "timeWindow": {
+                "earliest": earliest.isoformat(),
+                "latest": (earliest + timedelta(minutes=30)).isoformat()
+            }
+        },
+        "requirements": {
+            "vehicleType": rng.choice(VEHICLE_TYPES[:2]),
+            "oxygenRequired": rng.random() < 0.3,
+            "attendantNeeded": rng.random() < 0.3
+        }
+    }
+
+
+def legacy_is_compatible(driver, trip):
+    """is_compatible before compiled bitmasks: list membership on nested dicts"""
+    if driver["status"] not in ["available", "on-route"]:
+        return False, [f"Driver is {driver['status']}"]
+    required_type = trip["requirements"]["vehicleType"]
+    if required_type not in driver["vehicle"]["type"]:
+        return False, [f"Vehicle doesn't support {required_type}"]
+    if trip["requirements"]["oxygenRequired"] and not driver["vehicle"]["oxygenEquipped"]:
+        return False, ["Vehicle lacks oxygen equipment"]
+    if driver["currentLoad"] >= driver["vehicle"]["capacity"]:
+        return False, ["Driver at full capacity"]
+    if trip["requirements"]["attendantNeeded"]:
+        if "medical-attendant" not in driver["certifications"]:
+            return False, ["Driver lacks medical attendant certification"]
+    return True, []
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10,100,1000,10000,100000')
+    parser.add_argument('--trips', type=int, default=5)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    optimizer = load_handler_module('transport-optimizer.py')
+    from _lib.transport.fleet import compile_trip
+    from _lib.transport.scoring import FleetArrays, score_fleet, rank_fleet
+    rng = random.Random(3)
+
+    now = datetime.now()
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        drivers = make_fleet(size)
+        fleet = FleetArrays(drivers)
+        trips = [make_trip(seed, now) for seed in range(args.trips)]
+
+        start = time.perf_counter()
+        optimizer.load_fleet(drivers)
+        index_build_ms = (time.perf_counter() - start) * 1000
+
+        scalar_ms = vector_ms = indexed_ms = 0.0
+        dict_ms = mask_ms = mask_vector_ms = 0.0
+        mismatches = best_kept = candidates = 0
+        for trip in trips:
+            ms, matches = timed(lambda: sorted(
+                (optimizer.calculate_driver_match(d, trip, now) for d in drivers),
+                key=lambda m: m['score'], reverse=True
+            )[:args.top_k], 1)
+            scalar_ms += ms
+            ms, top = timed(lambda: [
+                optimizer.calculate_driver_match(drivers[i], trip, now)
+                for i in rank_fleet(fleet, trip, args.top_k, now)
+            ], 3)
+            vector_ms += ms
+            ms, (pruned, scored) = timed(lambda: optimizer.find_matches(trip, args.top_k, now), 3)
+            indexed_ms += ms
+            candidates += scored
+            best_kept += bool(pruned) and pruned[0]['score'] == matches[0]['score']
+
+            scalar_scores = [optimizer.calculate_driver_match(d, trip, now)['score'] for d in drivers]
+            vector_scores = score_fleet(fleet, trip, now)['score'].tolist()
+            mismatches += sum(1 for a, b in zip(scalar_scores, vector_scores) if abs(a - b) > 1e-9)
+            if [m['driverId'] for m in matches] != [m['driverId'] for m in top]:
+                mismatches += 1
+
+            ms, legacy = timed(lambda: [legacy_is_compatible(d, trip) for d in drivers], 1)
+            dict_ms += ms
+            required = compile_trip(trip)
+            masks = optimizer.FLEET.store.mask
+            ms, _ = timed(lambda: [m & required == required for m in masks], 1)
+            mask_ms += ms
+            ms, _ = timed(lambda: (fleet.mask & required) == required, 3)
+            mask_vector_ms += ms
+            mismatches += sum(
+                1 for d, expected in zip(drivers, legacy) if optimizer.is_compatible(d, trip) != expected
+            )
+
+        # Incremental position updates, as drivers report in
+        moves = min(size, 1000)
+        start = time.perf_counter()
+        for _ in range(moves):
+            driver = drivers[rng.randrange(size)]
+            optimizer.update_driver_location(
+                driver['id'],
+                driver['location']['lat'] + rng.uniform(-0.01, 0.01),
+                driver['location']['lng'] + rng.uniform(-0.01, 0.01)
+            )
+        update_us = (time.perf_counter() - start) * 1e6 / moves
+
+        results.append({
+            'drivers': size,
+            'scalar_ms_per_trip': round(scalar_ms / len(trips), 3),
+            'vectorized_ms_per_trip': round(vector_ms / len(trips), 3),
+            'indexed_ms_per_trip': round(indexed_ms / len(trips), 3),
+            'candidates_per_trip': round(candidates / len(trips), 1),
+            'score_mismatches': mismatches,
+            'best_match_kept': f"{best_kept}/{len(trips)}",
+            'compat_ns_per_pair': {
+                'dict': round(dict_ms * 1e6 / (len(trips) * size), 1),
+                'bitmask': round(mask_ms * 1e6 / (len(trips) * size), 1),
+                'bitmask_vectorized': round(mask_vector_ms * 1e6 / (len(trips) * size), 2),
+            },
+            'index_build_ms': round(index_build_ms, 1),
+            'location_update_us': round(update_us, 2),
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Local stand-ins for the upstream services the Python API handlers call
+(Supabase PostgREST, Gemini, Google Places, Yelp) so benchmarks run offline.
+"""
+
+import importlib.util
+import json
+import os
+import random
+import sys
+import threading
+import time
+import types
+import urllib.parse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api')
+
+class BenchServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer with a listen backlog deep enough for load tests
+
+    The default backlog of 5 overflows under concurrent connects and the
+    client's SYN retry shows up as a spurious ~1s tail latency.
+    """
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+# responder(method, path, headers, body) -> (status, extra_headers, json_payload)
+Responder = Callable[[str, str, Dict[str, str], bytes], Tuple[int, Dict[str, str], object]]
+
+
+# Rows in the stub events table, served to keyset-paged reads (exports)
+EVENT_ROWS = 0
+
+
+def _event_page(path):
+    query = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)
+    limit = int(query.get('limit', ['1000'])[0])
+    after = query.get('event_id', [''])[0]
+    start = int(after[len('gt.'):]) + 1 if after.startswith('gt.') else 0
+    return [{
+        'event_id': f'{i:012d}',
+        'ts': '2025-10-23T12:00:00+00:00',
+        'user_id': f'u{i % 97}',
+        'session_id': f's{i % 31}',
+        'event_type': 'page_view',
+        'page': f'/dashboard/{i % 7}',
+        'utm_source': None,
+        'payload': {'seq': i, 'referrer': 'https://example.com/some/longer/path'}
+    } for i in range(start, min(EVENT_ROWS, start + limit))]
+
+
+def postgrest_responder(method, path, headers, body):
+    """Minimal PostgREST: counts via Content-Range, empty row sets, 201 on insert (echoing rows on request)"""
+    if method == 'GET' and path.startswith('/rest/v1/events?') and 'limit=' in path:
+        return 200, {}, _event_page(path)
+    if '/rpc/reserve_generation' in path:
+        return 200, {}, {'allowed': True, 'remaining': 2, 'is_superadmin': False,
+                         'reservation_id': '00000000-0000-4000-8000-000000000001'}
+    if '/rpc/refresh_analytics_snapshots' in path or 'analytics_snapshot_state' in path:
+        state = {'refreshed': True, 'refreshed_at': datetime.now(timezone.utc).isoformat(), 'users_updated': 0}
+        return 200, {}, state if method == 'POST' else [state]
+    if '/rpc/analytics_revenue' in path:
+        request = json.loads(body or b'{}')
+        cohorts = [
+            {'cohort': '2025-09', 'users': 30, 'paid_users': 4, 'mrr': 396, 'revenue_to_date': 792, 'ltv': 26.4},
+            {'cohort': '2025-10', 'users': 12, 'paid_users': 1, 'mrr': 499, 'revenue_to_date': 499, 'ltv': 41.58},
+        ]
+        return 200, {}, {
+            'tiers': [
+                {'tier': 'enterprise', 'users': 1, 'mrr': 499, 'generations': 120},
+                {'tier': 'pro', 'users': 4, 'mrr': 396, 'generations': 310},
+            ],
+            'cohorts': cohorts if request.get('include_cohorts') else []
+        }
+    if method == 'POST' and '/rpc/' in path:
+        return 200, {}, 0
+    if method == 'POST' and 'return=representation' in headers.get('Prefer', ''):
+        rows = json.loads(body or b'[]')
+        return 201, {}, rows if isinstance(rows, list) else [rows]
+    if method == 'POST':
+        return 201, {}, None
+    if 'select=count' in path:
+        return 200, {'Content-Range': '0-0/42'}, [{'count': 42}]
+    if 'select=role' in path:
+        # Only the "admin" user is a superadmin
+        return 200, {}, [{'role': 'superadmin' if 'id=eq.admin' in path else 'user'}]
+    if 'select=generation_count' in path:
+        return 200, {}, [{'generation_count': 0, 'generation_limit': 3, 'role': 'user'}]
+    return 200, {}, []
+
+
+# Simulated generation speed: the reply arrives as GEMINI_CHUNKS pieces,
+# each taking GEMINI_CHUNK_DELAY_MS to "generate"
+GEMINI_CHUNKS = 5
+GEMINI_CHUNK_DELAY_MS = 0
+
+
+def _gemini_sse(text):
+    words = text.split(' ')
+    size = max(1, -(-len(words) // GEMINI_CHUNKS))
+    for i in range(0, len(words), size):
+        time.sleep(GEMINI_CHUNK_DELAY_MS / 1000)
+        piece = ' '.join(words[i:i + size]) + (' ' if i + size < len(words) else '')
+        event = {'candidates': [{'content': {'parts': [{'text': piece}]}}]}
+        yield f"data: {json.dumps(event)}\r\n\r\n".encode()
+
+
+def gemini_responder(method, path, headers, body):
+    text = "Thank you so much for the kind words! We can't wait to see you again."
+    if 'streamGenerateContent' in path:
+        return 200, {'Content-Type': 'text/event-stream'}, _gemini_sse(text)
+    time.sleep(GEMINI_CHUNKS * GEMINI_CHUNK_DELAY_MS / 1000)
+    request = json.loads(body or b'{}')
+    if request.get('generationConfig', {}).get('responseMimeType') == 'application/json':
+        # Batched review prompt: answer every packed review
+        prompt = request['contents'][0]['parts'][0]['text']
+        count = prompt.count('"index": ') - 1  # minus the format example
+        text = json.dumps([{'index': i, 'response': text} for i in range(count)])
+    return 200, {}, {
+        'candidates': [{'content': {'parts': [{'text': text}]}}],
+        'usageMetadata': {'promptTokenCount': 120, 'candidatesTokenCount': 24, 'totalTokenCount': 144}
+    }
+
+
+def places_responder(method, path, headers, body):
+    reviews = [{
+        'author_name': f'Reviewer {i}',
+        'rating': 5 - (i % 3),
+        'text': 'Great service, friendly staff!',
+        'time': 1700000000 + i,
+        'profile_photo_url': ''
+    } for i in range(5)]
+    return 200, {}, {'status': 'OK', 'result': {'reviews': reviews}}
+
+
+def yelp_responder(method, path, headers, body):
+    reviews = [{
+        'id': f'yelp-{i}',
+        'user': {'name': f'Yelper {i}', 'image_url': ''},
+        'rating': 4,
+        'text': 'Solid experience overall.',
+        'time_created': '2025-01-01 12:00:00'
+    } for i in range(3)]
+    return 200, {}, {'reviews': reviews}
+
+
+class StubService:
+    """Threaded keep-alive HTTP server with configurable latency and failures"""
+
+    def __init__(self, name: str, responder: Responder, latency_ms: float = 0,
+                 failure_rate: float = 0.0, seed: Optional[int] = None):
+        self.name = name
+        self.responder = responder
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+        service = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                service._record(connections=1)
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length) if length else b''
+                if service.latency_ms:
+                    time.sleep(service.latency_ms / 1000)
+
+                with service._lock:
+                    failed = service._random.random() < service.failure_rate
+                if failed:
+                    status, extra, payload = 503, {}, {'message': 'stub failure'}
+                else:
+                    status, extra, payload = service.responder(self.command, self.path, dict(self.headers), body)
+
+                if isinstance(payload, types.GeneratorType):
+                    self._send_chunked(status, extra, payload, length)
+                    return
+
+                data = b'' if payload is None else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in extra.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                service._record(requests=1, bytes_in=length, bytes_out=len(data))
+                self.wfile.write(data)
+
+            def _send_chunked(self, status, extra, chunks, length):
+                """Stream a generator of byte chunks with chunked transfer encoding"""
+                self.send_response(status)
+                self.send_header('Transfer-Encoding', 'chunked')
+                for key, value in extra.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                sent = 0
+                for chunk in chunks:
+                    self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.flush()
+                    sent += len(chunk)
+                service._record(requests=1, bytes_in=length, bytes_out=sent)
+                self.wfile.write(b"0\r\n\r\n")
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+        self.server = BenchServer(('127.0.0.1', 0), _Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _record(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {'connections': 0, 'requests': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def start(self) -> 'StubService':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_stubs(latency_ms: float = 0, failure_rate: float = 0.0) -> Dict[str, StubService]:
+    """Start all four upstream stubs and point the handler env vars at them
+
+    Must run before any handler module is loaded, since the handlers read
+    their upstream URLs at import time.
+    """
+    stubs = {
+        'supabase': StubService('supabase', postgrest_responder, latency_ms, failure_rate).start(),
+        'gemini': StubService('gemini', gemini_responder, latency_ms, failure_rate).start(),
+        'places': StubService('places', places_responder, latency_ms, failure_rate).start(),
+        'yelp': StubService('yelp', yelp_responder, latency_ms, failure_rate).start(),
+    }
+    os.environ['VITE_SUPABASE_URL'] = stubs['supabase'].url
+    os.environ['VITE_SUPABASE_ANON_KEY'] = 'stub-anon-key'
+    os.environ['SUPABASE_SERVICE_ROLE_KEY'] = 'stub-service-key'
+    os.environ['GOOGLE_GEMINI_API_KEY'] = 'stub-gemini-key'
+    os.environ['GEMINI_BASE_URL'] = stubs['gemini'].url
+    os.environ['GOOGLE_PLACES_BASE_URL'] = stubs['places'].url
+    os.environ['YELP_BASE_URL'] = stubs['yelp'].url
+    return stubs
+
+
+def load_handler_module(filename: str):
+    """Import an api/*.py handler (file names contain hyphens)"""
+    if API_DIR not in sys.path:
+        sys.path.insert(0, API_DIR)
+    name = filename[:-3].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(API_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -37,6 +37,14 @@ interface RevenueMetrics {
     pro: number;
     enterprise: number;
   };
+  cohorts: {
+    cohort: string;
+    users: number;
+    paid_users: number;
+    mrr: number;
+    revenue_to_date: number;
+    ltv: number;
+  }[];
 }
 
 const Analytics = () => {
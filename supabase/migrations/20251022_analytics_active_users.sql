@@ -0,0 +1,17 @@
+-- Server-side distinct-user count for the analytics overview
+-- Replaces downloading every recent event row just to count unique users
+
+-- Partial-friendly composite index: range scan on ts, user_id read from the index
+CREATE INDEX IF NOT EXISTS idx_events_ts_user_id ON events(ts DESC, user_id);
+
+-- Count distinct active users since a timestamp
+CREATE OR REPLACE FUNCTION analytics_active_users(since TIMESTAMPTZ)
+RETURNS BIGINT AS $$
+  SELECT COUNT(DISTINCT e.user_id)
+  FROM events e
+  WHERE e.ts >= since
+    AND e.user_id IS NOT NULL;
+$$ LANGUAGE sql STABLE;
+
+-- Grant access for superadmin dashboard (same audience as analytics views)
+GRANT EXECUTE ON FUNCTION analytics_active_users(TIMESTAMPTZ) TO authenticated;
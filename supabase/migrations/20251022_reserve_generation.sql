@@ -0,0 +1,89 @@
+-- Atomic generation quota for the AI content writer
+-- One round-trip checks the limit and reserves a slot; a conditional UPDATE
+-- takes the row lock, so parallel requests cannot overrun generation_limit.
+--
+-- Both functions are SECURITY DEFINER and take a user id, so only the
+-- service role may call them: the content writer API uses the service key
+-- server-side, never the public anon key.
+
+-- One row per reserved slot; a refund consumes its reservation, so each
+-- slot can be given back at most once
+CREATE TABLE IF NOT EXISTS public.generation_reservations (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  refunded_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_generation_reservations_user
+  ON public.generation_reservations(user_id, created_at DESC);
+
+-- No policies: only the service role (which bypasses RLS) touches it
+ALTER TABLE public.generation_reservations ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.reserve_generation(user_uuid UUID)
+RETURNS JSON AS $$
+DECLARE
+  new_remaining INTEGER;
+  profile_role TEXT;
+  new_reservation UUID;
+BEGIN
+  -- Regular users: take a slot only if one is left
+  UPDATE user_profiles
+  SET generation_count = COALESCE(generation_count, 0) + 1
+  WHERE id = user_uuid
+    AND COALESCE(role, 'user') <> 'superadmin'
+    AND COALESCE(generation_count, 0) < COALESCE(generation_limit, 3)
+  RETURNING COALESCE(generation_limit, 3) - generation_count INTO new_remaining;
+
+  IF FOUND THEN
+    INSERT INTO generation_reservations (user_id)
+    VALUES (user_uuid)
+    RETURNING id INTO new_reservation;
+
+    RETURN json_build_object(
+      'allowed', true,
+      'remaining', new_remaining,
+      'is_superadmin', false,
+      'reservation_id', new_reservation
+    );
+  END IF;
+
+  SELECT role INTO profile_role FROM user_profiles WHERE id = user_uuid;
+
+  IF NOT FOUND THEN
+    RETURN json_build_object('allowed', false, 'remaining', 0, 'is_superadmin', false, 'error', 'Profile not found');
+  END IF;
+
+  -- Superadmin is never counted, so there is nothing to refund
+  IF profile_role = 'superadmin' THEN
+    RETURN json_build_object('allowed', true, 'remaining', 999999, 'is_superadmin', true);
+  END IF;
+
+  RETURN json_build_object('allowed', false, 'remaining', 0, 'is_superadmin', false);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Give back a reserved slot when generation fails. Only an unrefunded
+-- reservation gives a slot back; replays return NULL and change nothing.
+CREATE OR REPLACE FUNCTION public.refund_generation(reservation_uuid UUID)
+RETURNS INTEGER AS $$
+  WITH refunded AS (
+    UPDATE generation_reservations
+    SET refunded_at = NOW()
+    WHERE id = reservation_uuid
+      AND refunded_at IS NULL
+    RETURNING user_id
+  )
+  UPDATE user_profiles up
+  SET generation_count = GREATEST(COALESCE(up.generation_count, 0) - 1, 0)
+  FROM refunded
+  WHERE up.id = refunded.user_id
+  RETURNING COALESCE(up.generation_limit, 3) - up.generation_count;
+$$ LANGUAGE sql SECURITY DEFINER SET search_path = public;
+
+-- Functions are executable by PUBLIC by default; keep them server-side only
+REVOKE EXECUTE ON FUNCTION public.reserve_generation(UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.refund_generation(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.reserve_generation(UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION public.refund_generation(UUID) TO service_role;
@@ -0,0 +1,264 @@
+-- Materialized snapshots of the heavy analytics views
+-- analytics_user_engagement, analytics_conversion_funnel, analytics_churn_risk
+-- and analytics_industry_benchmarks join every profile against the whole
+-- events table on each read. Instead, new events are folded into per-user
+-- rollups past a watermark, and the snapshot tables are rebuilt from the
+-- rollups + profiles, so neither refreshes nor reads scan event history.
+
+-- Watermark column: server insert time (ts can be client-supplied and late)
+CREATE INDEX IF NOT EXISTS idx_events_created_at ON events(created_at);
+
+-- Per-user event rollups, maintained incrementally
+CREATE TABLE IF NOT EXISTS analytics_user_rollup (
+  user_id UUID PRIMARY KEY,
+  total_events BIGINT NOT NULL DEFAULT 0,
+  active_days BIGINT NOT NULL DEFAULT 0,
+  last_active TIMESTAMPTZ,
+  integration_attempts BIGINT NOT NULL DEFAULT 0,
+  error_count BIGINT NOT NULL DEFAULT 0,
+  onboarded BOOLEAN NOT NULL DEFAULT FALSE,
+  upgraded BOOLEAN NOT NULL DEFAULT FALSE,
+  -- Counts and epoch sums, enough to reproduce the benchmarks view's
+  -- average over every signup x publish pair
+  signups BIGINT NOT NULL DEFAULT 0,
+  signup_epoch_sum NUMERIC NOT NULL DEFAULT 0,
+  publishes BIGINT NOT NULL DEFAULT 0,
+  publish_epoch_sum NUMERIC NOT NULL DEFAULT 0
+);
+
+-- Distinct active days per user (for active_days)
+CREATE TABLE IF NOT EXISTS analytics_user_active_days (
+  user_id UUID NOT NULL,
+  day DATE NOT NULL,
+  PRIMARY KEY (user_id, day)
+);
+
+-- Snapshot tables: same columns as the views they stand in for
+CREATE TABLE IF NOT EXISTS analytics_user_engagement_snapshot AS
+  SELECT * FROM analytics_user_engagement WITH NO DATA;
+CREATE TABLE IF NOT EXISTS analytics_conversion_funnel_snapshot AS
+  SELECT * FROM analytics_conversion_funnel WITH NO DATA;
+CREATE TABLE IF NOT EXISTS analytics_industry_benchmarks_snapshot AS
+  SELECT * FROM analytics_industry_benchmarks WITH NO DATA;
+CREATE TABLE IF NOT EXISTS analytics_churn_risk_snapshot AS
+  SELECT * FROM analytics_churn_risk WITH NO DATA;
+
+-- Single row: how far events have been folded and when snapshots were rebuilt
+CREATE TABLE IF NOT EXISTS analytics_snapshot_state (
+  id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  watermark TIMESTAMPTZ NOT NULL DEFAULT '-infinity',
+  refreshed_at TIMESTAMPTZ,
+  users_updated BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO analytics_snapshot_state (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+-- Fold new events into the rollups and rebuild the snapshots
+-- Skips the work if the snapshots are younger than max_age (never more
+-- often than every 10 seconds, even when forced). rebuild => TRUE starts
+-- the rollups over from the first event, e.g. after events were deleted.
+CREATE OR REPLACE FUNCTION refresh_analytics_snapshots(
+  max_age INTERVAL DEFAULT INTERVAL '0',
+  rebuild BOOLEAN DEFAULT FALSE
+)
+RETURNS JSON AS $$
+DECLARE
+  state analytics_snapshot_state%ROWTYPE;
+  -- created_at is the inserting transaction's start time, so an event can
+  -- commit well after rows with later created_at. Stop short of the oldest
+  -- transaction still writing, and at least a minute behind NOW(), so no
+  -- in-flight event ends up below the watermark.
+  new_watermark TIMESTAMPTZ := LEAST(
+    NOW() - INTERVAL '1 minute',
+    (SELECT MIN(xact_start) FROM pg_stat_activity
+     WHERE backend_xid IS NOT NULL AND pid <> pg_backend_pid())
+  );
+  updated BIGINT;
+BEGIN
+  -- One refresher at a time; concurrent callers get the current state
+  IF NOT pg_try_advisory_xact_lock(hashtext('refresh_analytics_snapshots')) THEN
+    SELECT * INTO state FROM analytics_snapshot_state WHERE id = 1;
+    RETURN json_build_object('refreshed', false, 'refreshed_at', state.refreshed_at, 'watermark', state.watermark);
+  END IF;
+
+  SELECT * INTO state FROM analytics_snapshot_state WHERE id = 1 FOR UPDATE;
+  IF NOT rebuild AND state.refreshed_at IS NOT NULL
+     AND state.refreshed_at > NOW() - GREATEST(max_age, INTERVAL '10 seconds') THEN
+    RETURN json_build_object('refreshed', false, 'refreshed_at', state.refreshed_at, 'watermark', state.watermark);
+  END IF;
+
+  IF rebuild THEN
+    DELETE FROM analytics_user_rollup;
+    DELETE FROM analytics_user_active_days;
+    state.watermark := '-infinity';
+  END IF;
+
+  -- Incremental part: only events inserted since the last watermark
+  WITH batch AS (
+    SELECT e.user_id, e.ts, e.event_type
+    FROM events e
+    WHERE e.created_at > state.watermark
+      AND e.created_at <= new_watermark
+      AND e.user_id IS NOT NULL
+  ),
+  new_days AS (
+    INSERT INTO analytics_user_active_days (user_id, day)
+    SELECT DISTINCT user_id, DATE(ts) FROM batch
+    ON CONFLICT DO NOTHING
+    RETURNING user_id
+  ),
+  new_day_counts AS (
+    SELECT user_id, COUNT(*) AS days FROM new_days GROUP BY user_id
+  ),
+  per_user AS (
+    SELECT
+      user_id,
+      COUNT(*) AS total_events,
+      MAX(ts) AS last_active,
+      COUNT(*) FILTER (WHERE event_type LIKE 'integration_%') AS integration_attempts,
+      COUNT(*) FILTER (WHERE event_type LIKE '%_error') AS error_count,
+      BOOL_OR(event_type = 'onboarding_completed') AS onboarded,
+      BOOL_OR(event_type = 'subscription_upgraded') AS upgraded,
+      COUNT(*) FILTER (WHERE event_type = 'signup_submitted') AS signups,
+      COALESCE(SUM(EXTRACT(EPOCH FROM ts)) FILTER (WHERE event_type = 'signup_submitted'), 0) AS signup_epoch_sum,
+      COUNT(*) FILTER (WHERE event_type = 'site_published') AS publishes,
+      COALESCE(SUM(EXTRACT(EPOCH FROM ts)) FILTER (WHERE event_type = 'site_published'), 0) AS publish_epoch_sum
+    FROM batch
+    GROUP BY user_id
+  )
+  INSERT INTO analytics_user_rollup AS r (
+    user_id, total_events, active_days, last_active, integration_attempts, error_count,
+    onboarded, upgraded, signups, signup_epoch_sum, publishes, publish_epoch_sum
+  )
+  SELECT
+    u.user_id, u.total_events, COALESCE(d.days, 0), u.last_active, u.integration_attempts, u.error_count,
+    u.onboarded, u.upgraded, u.signups, u.signup_epoch_sum, u.publishes, u.publish_epoch_sum
+  FROM per_user u
+  LEFT JOIN new_day_counts d ON d.user_id = u.user_id
+  ON CONFLICT (user_id) DO UPDATE SET
+    total_events = r.total_events + EXCLUDED.total_events,
+    active_days = r.active_days + EXCLUDED.active_days,
+    last_active = GREATEST(r.last_active, EXCLUDED.last_active),
+    integration_attempts = r.integration_attempts + EXCLUDED.integration_attempts,
+    error_count = r.error_count + EXCLUDED.error_count,
+    onboarded = r.onboarded OR EXCLUDED.onboarded,
+    upgraded = r.upgraded OR EXCLUDED.upgraded,
+    signups = r.signups + EXCLUDED.signups,
+    signup_epoch_sum = r.signup_epoch_sum + EXCLUDED.signup_epoch_sum,
+    publishes = r.publishes + EXCLUDED.publishes,
+    publish_epoch_sum = r.publish_epoch_sum + EXCLUDED.publish_epoch_sum;
+  GET DIAGNOSTICS updated = ROW_COUNT;
+
+  -- Snapshots: same definitions as the views, reading rollups instead of
+  -- events. Readers keep seeing the previous rows until this commits.
+  DELETE FROM analytics_user_engagement_snapshot;
+  INSERT INTO analytics_user_engagement_snapshot
+  SELECT
+    p.user_id,
+    p.naics_code,
+    p.monthly_budget,
+    up.tier,
+    up.generation_count,
+    COALESCE(r.total_events, 0),
+    COALESCE(r.active_days, 0),
+    r.last_active,
+    EXTRACT(EPOCH FROM (NOW() - r.last_active))/86400,
+    COALESCE(r.integration_attempts, 0)
+  FROM user_profiles_extended p
+  JOIN user_profiles up ON p.user_id = up.id
+  LEFT JOIN analytics_user_rollup r ON r.user_id = p.user_id
+  WHERE p.created_at > NOW() - INTERVAL '90 days';
+
+  DELETE FROM analytics_conversion_funnel_snapshot;
+  INSERT INTO analytics_conversion_funnel_snapshot
+  SELECT
+    p.naics_code,
+    p.country,
+    COUNT(DISTINCT p.user_id),
+    COUNT(DISTINCT CASE WHEN r.onboarded THEN p.user_id END),
+    COUNT(DISTINCT CASE WHEN r.publishes > 0 THEN p.user_id END),
+    COUNT(DISTINCT CASE WHEN r.upgraded THEN p.user_id END),
+    ROUND(
+      COUNT(DISTINCT CASE WHEN r.publishes > 0 THEN p.user_id END)::NUMERIC /
+      NULLIF(COUNT(DISTINCT p.user_id), 0) * 100,
+      2
+    )
+  FROM user_profiles_extended p
+  LEFT JOIN analytics_user_rollup r ON r.user_id = p.user_id
+  WHERE p.created_at > NOW() - INTERVAL '90 days'
+  GROUP BY 1, 2
+  HAVING COUNT(DISTINCT p.user_id) >= 5;  -- Privacy: K-anonymity
+
+  -- The view joins each user's signup and publish events, so its averages
+  -- are taken over max(signups, 1) * max(publishes, 1) rows per user
+  DELETE FROM analytics_industry_benchmarks_snapshot;
+  INSERT INTO analytics_industry_benchmarks_snapshot
+  SELECT
+    p.naics_code,
+    p.country,
+    COUNT(DISTINCT p.user_id),
+    SUM(COALESCE(r.signups, 0) * COALESCE(r.publish_epoch_sum, 0) - COALESCE(r.publishes, 0) * COALESCE(r.signup_epoch_sum, 0)) /
+      NULLIF(SUM(COALESCE(r.signups, 0) * COALESCE(r.publishes, 0)), 0) / 86400,
+    COUNT(DISTINCT CASE WHEN r.publishes > 0 THEN p.user_id END)::FLOAT /
+      NULLIF(COUNT(DISTINCT p.user_id), 0),
+    SUM(up.generation_count * GREATEST(COALESCE(r.signups, 0), 1) * GREATEST(COALESCE(r.publishes, 0), 1))::NUMERIC /
+      NULLIF(SUM(GREATEST(COALESCE(r.signups, 0), 1) * GREATEST(COALESCE(r.publishes, 0), 1))
+        FILTER (WHERE up.generation_count IS NOT NULL), 0),
+    COUNT(DISTINCT CASE WHEN up.tier = 'pro' THEN p.user_id END)::FLOAT /
+      NULLIF(COUNT(DISTINCT p.user_id), 0)
+  FROM user_profiles_extended p
+  JOIN user_profiles up ON p.user_id = up.id
+  LEFT JOIN analytics_user_rollup r ON r.user_id = p.user_id
+  WHERE p.created_at > NOW() - INTERVAL '90 days'
+  GROUP BY 1, 2
+  HAVING COUNT(DISTINCT p.user_id) >= 10;  -- K-anonymity threshold
+
+  DELETE FROM analytics_churn_risk_snapshot;
+  INSERT INTO analytics_churn_risk_snapshot
+  SELECT
+    p.user_id,
+    p.company_name,
+    p.naics_code,
+    up.tier,
+    up.generation_count,
+    up.generation_limit,
+    EXTRACT(EPOCH FROM (NOW() - r.last_active))/86400,
+    COALESCE(r.error_count, 0),
+    CASE
+      WHEN EXTRACT(EPOCH FROM (NOW() - r.last_active))/86400 > 14 THEN 'high'
+      WHEN EXTRACT(EPOCH FROM (NOW() - r.last_active))/86400 > 7 THEN 'medium'
+      ELSE 'low'
+    END
+  FROM user_profiles_extended p
+  JOIN user_profiles up ON p.user_id = up.id
+  JOIN analytics_user_rollup r ON r.user_id = p.user_id
+  WHERE up.tier != 'superadmin'
+    AND p.created_at < NOW() - INTERVAL '7 days'
+    AND EXTRACT(EPOCH FROM (NOW() - r.last_active))/86400 > 3;
+
+  UPDATE analytics_snapshot_state
+  SET watermark = new_watermark, refreshed_at = NOW(), users_updated = updated
+  WHERE id = 1;
+
+  RETURN json_build_object('refreshed', true, 'refreshed_at', NOW(), 'watermark', new_watermark, 'users_updated', updated);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Snapshots carry what the views expose, to the same audience; the rollups
+-- are internal
+CREATE INDEX IF NOT EXISTS idx_engagement_snapshot_events ON analytics_user_engagement_snapshot(total_events DESC);
+CREATE INDEX IF NOT EXISTS idx_churn_snapshot_inactive ON analytics_churn_risk_snapshot(days_inactive DESC);
+GRANT SELECT ON analytics_user_engagement_snapshot TO authenticated;
+GRANT SELECT ON analytics_conversion_funnel_snapshot TO authenticated;
+GRANT SELECT ON analytics_industry_benchmarks_snapshot TO authenticated;
+GRANT SELECT ON analytics_churn_risk_snapshot TO authenticated;
+GRANT SELECT ON analytics_snapshot_state TO authenticated;
+REVOKE ALL ON analytics_user_rollup, analytics_user_active_days FROM anon, authenticated;
+-- SECURITY DEFINER and able to wipe the rollups (rebuild => TRUE): the
+-- analytics API calls it with the service role key, pg_cron as its owner
+REVOKE EXECUTE ON FUNCTION refresh_analytics_snapshots(INTERVAL, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION refresh_analytics_snapshots(INTERVAL, BOOLEAN) TO service_role;
+
+-- Scheduled refresh (needs the pg_cron extension); the API also refreshes
+-- in the background when a read finds the snapshots older than
+-- ANALYTICS_SNAPSHOT_MAX_AGE
+-- SELECT cron.schedule('analytics-snapshots', '*/5 * * * *', 'SELECT refresh_analytics_snapshots()');
@@ -0,0 +1,87 @@
+-- Server-side revenue aggregation for the analytics API
+-- Replaces downloading every paid user's profile to count tiers and sum
+-- MRR in Python; the result is one small JSON document.
+
+-- Tier counts: GROUP BY tier reads this index instead of the whole table
+CREATE INDEX IF NOT EXISTS idx_user_profiles_tier ON user_profiles(tier);
+
+-- First upgrade per user, for when cohort revenue starts accruing
+CREATE INDEX IF NOT EXISTS idx_events_upgrades ON events(user_id, ts)
+  WHERE event_type = 'subscription_upgraded';
+
+-- Per-tier users, MRR and generations for every non-free tier, and
+-- optionally monthly signup cohorts with realized LTV.
+--
+-- prices maps tier -> monthly price (the API passes its own table, so
+-- prices live in one place). A cohort's revenue to date charges each
+-- paying user their current price for every month, rounded up, since
+-- their first subscription_upgraded event (signup if there is none);
+-- ltv is that revenue per cohort signup. Superadmin accounts are staff,
+-- not customers, and are left out of the cohorts.
+CREATE OR REPLACE FUNCTION analytics_revenue(
+  prices JSONB DEFAULT '{"pro": 99, "enterprise": 499}',
+  include_cohorts BOOLEAN DEFAULT TRUE
+)
+RETURNS JSON AS $$
+  WITH tiers AS (
+    SELECT
+      up.tier,
+      COUNT(*) AS users,
+      COUNT(*) * COALESCE((prices ->> up.tier)::NUMERIC, 0) AS mrr,
+      COALESCE(SUM(up.generation_count), 0) AS generations
+    FROM user_profiles up
+    WHERE up.tier <> 'free'
+    GROUP BY up.tier
+  ),
+  priced AS (
+    SELECT
+      date_trunc('month', up.created_at) AS cohort,
+      up.tier,
+      COALESCE((prices ->> up.tier)::NUMERIC, 0) AS price,
+      CASE WHEN up.tier <> 'free' THEN COALESCE(
+        (SELECT MIN(e.ts) FROM events e
+          WHERE e.user_id = up.id AND e.event_type = 'subscription_upgraded'),
+        up.created_at
+      ) END AS paid_since
+    FROM user_profiles up
+    WHERE include_cohorts
+      AND COALESCE(up.role, 'user') <> 'superadmin'
+  ),
+  cohorts AS (
+    SELECT
+      cohort,
+      COUNT(*) AS users,
+      COUNT(*) FILTER (WHERE tier <> 'free') AS paid_users,
+      SUM(price) AS mrr,
+      COALESCE(SUM(
+        price * GREATEST(1, CEIL(EXTRACT(EPOCH FROM (NOW() - paid_since)) / (30.44 * 86400)))
+      ) FILTER (WHERE price > 0), 0) AS revenue_to_date
+    FROM priced
+    GROUP BY cohort
+  )
+  SELECT json_build_object(
+    'tiers', COALESCE((
+      SELECT json_agg(json_build_object(
+        'tier', tier,
+        'users', users,
+        'mrr', mrr,
+        'generations', generations
+      ) ORDER BY tier)
+      FROM tiers
+    ), '[]'::JSON),
+    'cohorts', COALESCE((
+      SELECT json_agg(json_build_object(
+        'cohort', to_char(cohort, 'YYYY-MM'),
+        'users', users,
+        'paid_users', paid_users,
+        'mrr', mrr,
+        'revenue_to_date', revenue_to_date,
+        'ltv', ROUND(revenue_to_date / users, 2)
+      ) ORDER BY cohort)
+      FROM cohorts
+    ), '[]'::JSON)
+  );
+$$ LANGUAGE sql STABLE;
+
+-- Grant access for superadmin dashboard (same audience as analytics views)
+GRANT EXECUTE ON FUNCTION analytics_revenue(JSONB, BOOLEAN) TO authenticated;
@@ -0,0 +1,113 @@
+"""
+Shared fixtures for the Python API tests
+Handlers live in api/*.py with hyphenated file names, so they are loaded
+by path; random fleets and trips mirror benchmarks/bench_transport.py.
+"""
+
+import email.message
+import importlib.util
+import io
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api')
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+
+CENTER = (40.2732, -76.8867)
+VEHICLE_TYPES = ["standard", "wheelchair", "stretcher"]
+STATUSES = ["available", "available", "available", "on-route", "break", "off-duty"]
+NOW = datetime(2025, 10, 20, 9, 0)
+
+
+def load_handler_module(filename: str):
+    """Import an api/*.py handler (file names contain hyphens)"""
+    name = filename[:-3].replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(API_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def call_handler(module, method: str, path: str, body=None, headers=None):
+    """Run one request through a handler module in-process: (status, headers, raw body)"""
+    data = b'' if body is None else json.dumps(body).encode()
+    message = email.message.Message()
+    for name, value in {'Content-Length': str(len(data)), **(headers or {})}.items():
+        message[name] = value
+
+    handler = object.__new__(module.handler)
+    handler.command, handler.path = method, path
+    handler.request_version = handler.protocol_version
+    handler.requestline = f'{method} {path} {handler.protocol_version}'
+    handler.client_address = ('127.0.0.1', 0)
+    handler.headers = message
+    handler.rfile, handler.wfile = io.BytesIO(data), io.BytesIO()
+    handler.close_connection = True
+    handler.log_message = lambda *args: None
+    getattr(handler, f'do_{method}')()
+
+    head, _, raw = handler.wfile.getvalue().partition(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    response_headers = dict(line.split(': ', 1) for line in header_lines)
+    return int(status_line.split()[1]), response_headers, raw
+
+
+def make_fleet(n, seed=7, spread=1.5):
+    """n random drivers within roughly +/- spread degrees of the demo area"""
+    rng = random.Random(seed)
+    drivers = []
+    for i in range(n):
+        capacity = rng.randint(1, 3)
+        types = ["standard"] + [t for t in VEHICLE_TYPES[1:] if rng.random() < 0.5]
+        drivers.append({
+            "id": f"driver-{i}",
+            "name": f"Driver {i}",
+            "status": rng.choice(STATUSES),
+            "location": {
+                "lat": CENTER[0] + rng.uniform(-spread, spread),
+                "lng": CENTER[1] + rng.uniform(-spread, spread)
+            },
+            "vehicle": {
+                "type": types,
+                "oxygenEquipped": rng.random() < 0.5,
+                "capacity": capacity
+            },
+            "currentLoad": rng.randint(0, capacity),
+            "certifications": ["basic"] + (["medical-attendant"] if rng.random() < 0.6 else [])
+        })
+    return drivers
+
+
+def make_trip(seed=11, spread=0.5):
+    rng = random.Random(seed)
+    earliest = NOW + timedelta(minutes=rng.randint(0, 60))
+    return {
+        "id": f"trip-{seed}",
+        "pickup": {
+            "coordinates": {
+                "lat": CENTER[0] + rng.uniform(-spread, spread),
+                "lng": CENTER[1] + rng.uniform(-spread, spread)
+            },
+            "timeWindow": {
+                "earliest": earliest.isoformat(),
+                "latest": (earliest + timedelta(minutes=30)).isoformat()
+            }
+        },
+        "requirements": {
+            "vehicleType": rng.choice(VEHICLE_TYPES[:2]),
+            "oxygenRequired": rng.random() < 0.3,
+            "attendantNeeded": rng.random() < 0.3
+        }
+    }
+
+
+@pytest.fixture(scope='module')
+def optimizer():
+    """A fresh api/transport-optimizer.py module (its own live fleet)"""
+    return load_handler_module('transport-optimizer.py')
@@ -0,0 +1,204 @@
+"""Token verification (api/_lib/auth.py) and the analytics superadmin cache"""
+
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+
+from _lib import cache
+from _lib.auth import CLOCK_SKEW_SECONDS, InvalidToken, verify_jwt
+from conftest import load_handler_module
+
+SECRET = 'test-jwt-secret'
+NOW = 1_760_950_800
+USER = '6f1c1c9e-3f0a-4d55-9a57-0c2b8f0d7c11'
+
+
+def b64(value) -> str:
+    raw = value if isinstance(value, bytes) else json.dumps(value).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def sign(header_b64: str, payload_b64: str, secret: str = SECRET) -> str:
+    digest = hmac.new(secret.encode(), f'{header_b64}.{payload_b64}'.encode(), hashlib.sha256).digest()
+    return f'{header_b64}.{payload_b64}.{b64(digest)}'
+
+
+def make_token(claims=None, header=None, secret: str = SECRET) -> str:
+    header = {'alg': 'HS256', 'typ': 'JWT'} if header is None else header
+    claims = {'sub': USER, 'exp': NOW + 3600} if claims is None else claims
+    return sign(b64(header), b64(claims), secret)
+
+
+def test_valid_token_returns_claims():
+    claims = verify_jwt(make_token({'sub': USER, 'app_metadata': {'role': 'superadmin'}}), SECRET, now=NOW)
+    assert claims['app_metadata']['role'] == 'superadmin'
+
+
+def test_bad_signature_is_rejected():
+    with pytest.raises(InvalidToken, match='signature'):
+        verify_jwt(make_token(secret='someone-elses-secret'), SECRET, now=NOW)
+
+    # Same signature, tampered payload
+    header_b64, _, signature_b64 = make_token().split('.')
+    forged = f"{header_b64}.{b64({'sub': USER, 'role': 'superadmin'})}.{signature_b64}"
+    with pytest.raises(InvalidToken, match='signature'):
+        verify_jwt(forged, SECRET, now=NOW)
+
+
+@pytest.mark.parametrize('alg', ['none', 'HS512', 'RS256', None])
+def test_only_hs256_is_accepted(alg):
+    with pytest.raises(InvalidToken, match='algorithm'):
+        verify_jwt(make_token(header={'alg': alg}), SECRET, now=NOW)
+
+
+def test_exp_allows_clock_skew():
+    token = make_token({'sub': USER, 'exp': NOW})
+    assert verify_jwt(token, SECRET, now=NOW + CLOCK_SKEW_SECONDS)['sub'] == USER
+    with pytest.raises(InvalidToken, match='expired'):
+        verify_jwt(token, SECRET, now=NOW + CLOCK_SKEW_SECONDS + 1)
+
+
+def test_nbf_allows_clock_skew():
+    token = make_token({'sub': USER, 'nbf': NOW})
+    assert verify_jwt(token, SECRET, now=NOW - CLOCK_SKEW_SECONDS)['sub'] == USER
+    with pytest.raises(InvalidToken, match='not yet valid'):
+        verify_jwt(token, SECRET, now=NOW - CLOCK_SKEW_SECONDS - 1)
+
+
+@pytest.mark.parametrize('claims', [{'exp': 'soon'}, {'nbf': None}, {'exp': [NOW]}])
+def test_non_numeric_times_are_malformed(claims):
+    with pytest.raises(InvalidToken, match='Malformed'):
+        verify_jwt(make_token(claims), SECRET, now=NOW)
+
+
+@pytest.mark.parametrize('token', [
+    '',
+    'only-one-segment',
+    'two.segments',
+    'a.b.c.d',
+    '!!!.@@@.###',
+    f"{b64(b'not json')}.{b64({'sub': USER})}.{b64(b'sig')}",
+    '.'.join([b64(b'\xff\xfe'), b64({'sub': USER}), b64(b'sig')]),
+])
+def test_malformed_segments_are_rejected(token):
+    with pytest.raises(InvalidToken, match='Malformed'):
+        verify_jwt(token, SECRET, now=NOW)
+
+
+@pytest.mark.parametrize('header', [['HS256'], 'HS256', 256, None])
+def test_non_object_header_is_rejected(header):
+    with pytest.raises(InvalidToken, match='Malformed'):
+        verify_jwt(sign(b64(header), b64({'sub': USER})), SECRET, now=NOW)
+
+
+@pytest.mark.parametrize('claims', [[USER], 'superadmin', 1])
+def test_non_object_claims_are_rejected(claims):
+    with pytest.raises(InvalidToken, match='Malformed'):
+        verify_jwt(sign(b64({'alg': 'HS256'}), b64(claims)), SECRET, now=NOW)
+
+
+class Clock:
+    """Stand-in for the time module as seen by _lib.cache"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Profiles:
+    """Fake PostgREST client serving user_profiles role lookups"""
+
+    def __init__(self, role='superadmin'):
+        self.role, self.lookups, self.fail = role, 0, False
+
+    def get(self, path):
+        self.lookups += 1
+        if self.fail:
+            raise ConnectionError('supabase unavailable')
+        role = self.role
+        return type('Response', (), {'json': lambda _: [{'role': role}] if role else []})()
+
+
+@pytest.fixture
+def analytics(monkeypatch):
+    module = load_handler_module('analytics.py')
+    clock = Clock()
+    monkeypatch.setattr(cache, 'time', clock)
+    module.SUPERADMIN_CACHE.clear()
+    api = module.AnalyticsAPI()
+    api.db = Profiles()
+    yield module, api, clock
+    module.SUPERADMIN_CACHE.clear()
+
+
+def test_superadmin_is_cached_until_ttl(analytics):
+    module, api, clock = analytics
+
+    assert api._is_superadmin(USER) and api._is_superadmin(USER)
+    assert api.db.lookups == 1
+
+    api.db.role = 'user'  # Demoted, but the grant is still cached
+    clock.now += module.SUPERADMIN_CACHE_TTL
+    assert api._is_superadmin(USER)
+    clock.now += 1
+    assert not api._is_superadmin(USER)
+    assert api.db.lookups == 2
+
+
+def test_denial_is_cached_for_the_shorter_negative_ttl(analytics):
+    module, api, clock = analytics
+    api.db.role = 'user'
+
+    assert not api._is_superadmin(USER)
+    api.db.role = 'superadmin'  # Fresh grant
+    assert not api._is_superadmin(USER)
+    assert api.db.lookups == 1
+
+    clock.now += module.SUPERADMIN_NEGATIVE_TTL + 1
+    assert module.SUPERADMIN_NEGATIVE_TTL < module.SUPERADMIN_CACHE_TTL
+    assert api._is_superadmin(USER)
+    assert api.db.lookups == 2
+
+
+def test_missing_profile_is_a_cached_denial(analytics):
+    module, api, _ = analytics
+    api.db.role = None
+
+    assert not api._is_superadmin(USER) and not api._is_superadmin(USER)
+    assert api.db.lookups == 1
+
+
+def test_failed_lookup_is_not_cached(analytics):
+    module, api, _ = analytics
+    api.db.fail = True
+    assert not api._is_superadmin(USER)
+
+    api.db.fail = False
+    assert api._is_superadmin(USER)
+    assert api.db.lookups == 2
+
+
+def test_invalidate_superadmin_forgets_one_user_or_everyone(analytics):
+    module, api, _ = analytics
+    other = '0b7e3a52-9d1e-4c55-8f3a-6a2d9c4e1f00'
+    assert api._is_superadmin(USER) and api._is_superadmin(other)
+
+    api.db.role = 'user'
+    module.invalidate_superadmin(USER)
+    assert not api._is_superadmin(USER)
+    assert api._is_superadmin(other)  # Still cached
+
+    module.invalidate_superadmin()
+    assert not api._is_superadmin(other)
+    assert api.db.lookups == 4
+
+
+def test_verified_role_claim_skips_the_lookup(analytics):
+    _, api, _ = analytics
+    assert not api._is_superadmin(USER, {'app_metadata': {'role': 'user'}})
+    assert api.db.lookups == 0
@@ -0,0 +1,85 @@
+"""Content writer handler (api/content-writer.py): quota and cache interplay"""
+
+import json
+
+import pytest
+
+from conftest import call_handler, load_handler_module
+
+USER = '6f1c1c9e-3f0a-4d55-9a57-0c2b8f0d7c11'
+
+
+class Quota:
+    """In-memory stand-in for the reserve/refund RPCs"""
+
+    def __init__(self, limit=3):
+        self.limit, self.used, self.open = limit, 0, set()
+
+    def reserve(self, user_id):
+        if self.used >= self.limit:
+            return {'allowed': False, 'remaining': 0, 'is_superadmin': False, 'reservation_id': None}
+        self.used += 1
+        reservation = f'r{self.used}'
+        self.open.add(reservation)
+        return {'allowed': True, 'remaining': self.limit - self.used, 'is_superadmin': False,
+                'reservation_id': reservation}
+
+    def refund(self, usage):
+        if usage.get('reservation_id') not in self.open:
+            return None
+        self.open.discard(usage['reservation_id'])
+        self.used -= 1
+        return self.limit - self.used
+
+
+@pytest.fixture
+def writer_module(monkeypatch):
+    module = load_handler_module('content-writer.py')
+    quota = Quota()
+    monkeypatch.setattr(module, 'SUPABASE_SERVICE_KEY', 'test-service-key')
+    monkeypatch.setattr(module.ContentWriter, 'reserve_usage', lambda self, user_id: quota.reserve(user_id))
+    monkeypatch.setattr(module.ContentWriter, 'refund_usage', lambda self, usage: quota.refund(usage))
+    monkeypatch.setattr(module.ContentWriter, '_request_content', lambda self, prompt, content_type: 'Fresh copy')
+    module.quota = quota
+    return module
+
+
+def post(module, **body):
+    return call_handler(module, 'POST', '/api/content-writer',
+                        {'user_id': USER, 'content_type': 'social', **body})
+
+
+def test_cache_hit_leaves_remaining_unchanged(writer_module):
+    prompt = 'a facebook post about our fall sale'
+    status, _, body = post(writer_module, prompt=prompt, cache='exact')
+    first = json.loads(body)
+    assert status == 200 and first['cached'] is False and first['remaining'] == 2
+
+    status, _, body = post(writer_module, prompt=prompt, cache='exact')
+    second = json.loads(body)
+
+    assert status == 200 and second['cached'] is True
+    assert second['remaining'] == 2
+    assert writer_module.quota.used == 1
+
+
+def test_streamed_cache_hit_leaves_remaining_unchanged(writer_module):
+    prompt = 'an email about our winter hours'
+    post(writer_module, prompt=prompt, cache='exact')
+
+    status, _, body = post(writer_module, prompt=prompt, cache='exact', stream=True)
+    done = body.split(b'event: done\ndata: ')[1].split(b'\n')[0]
+
+    assert status == 200
+    assert json.loads(done)['remaining'] == 2
+    assert writer_module.quota.used == 1
+
+
+def test_missing_service_key_is_a_configuration_error(writer_module, monkeypatch):
+    monkeypatch.setattr(writer_module, 'SUPABASE_SERVICE_KEY', '')
+
+    status, _, body = post(writer_module, prompt='a post about our spring menu')
+
+    assert status == 500
+    assert 'SUPABASE_SERVICE_ROLE_KEY' in json.loads(body)['error']
+    assert writer_module.quota.used == 0
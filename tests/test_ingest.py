@@ -0,0 +1,84 @@
+"""Analytics event validation and bulk insert isolation (api/_lib/ingest.py)"""
+
+import json
+
+import pytest
+
+from _lib.http_client import HTTPError
+from _lib.ingest import EventBuffer, insert_isolating, normalize_event
+
+USER = '6f1c1c9e-3f0a-4d55-9a57-0c2b8f0d7c11'
+
+
+def event(**fields):
+    return dict({'user_id': USER, 'event_type': 'page_view'}, **fields)
+
+
+def test_valid_event_becomes_a_full_row():
+    row = normalize_event(event(session_id=USER.upper(), country='US', device_class='mobile',
+                                ts='2025-10-20T09:00:00Z', payload={'a': 1}))
+
+    assert row['user_id'] == USER
+    assert row['session_id'] == USER
+    assert row['country'] == 'US' and row['device_class'] == 'mobile'
+    assert row['page'] is None
+    assert json.loads(row['payload']) == {'a': 1}
+
+
+@pytest.mark.parametrize('fields', [
+    {'user_id': 'u1'},
+    {'session_id': 's1'},
+    {'event_type': 'x' * 51},
+    {'page': '/' + 'p' * 255},
+    {'utm_source': 'x' * 101},
+    {'country': 'USA'},
+    {'device_class': 'watch'},
+    {'ts': 'yesterday'},
+    {'payload': []},
+])
+def test_values_the_events_table_would_refuse_are_rejected(fields):
+    with pytest.raises(ValueError):
+        normalize_event(event(**fields))
+
+
+class FakeTable:
+    """insert() that refuses any batch holding a row marked bad, like a constraint violation"""
+
+    def __init__(self, transient_after=None):
+        self.rows = []
+        self.calls = 0
+        self.transient_after = transient_after
+
+    def insert(self, rows):
+        self.calls += 1
+        if self.transient_after is not None and self.calls > self.transient_after:
+            raise HTTPError(503, 'Service Unavailable')
+        if any(row.get('bad') for row in rows):
+            raise HTTPError(409, 'Conflict', b'{"message": "violates foreign key constraint"}')
+        self.rows.extend(rows)
+
+
+def test_insert_isolating_drops_only_the_bad_rows():
+    table = FakeTable()
+    rows = [{'n': i, 'bad': i in (3, 17)} for i in range(40)]
+
+    rejected, unwritten = insert_isolating(table.insert, rows)
+
+    assert [position for position, _ in rejected] == [3, 17]
+    assert unwritten == []
+    assert sorted(row['n'] for row in table.rows) == [i for i in range(40) if i not in (3, 17)]
+
+
+def test_transient_error_on_the_whole_insert_is_raised():
+    with pytest.raises(HTTPError):
+        insert_isolating(FakeTable(transient_after=0).insert, [{'n': 1}])
+
+
+def test_buffer_keeps_other_events_when_one_is_refused():
+    table = FakeTable()
+    buffer = EventBuffer(table.insert, max_events=100, retries=0)
+    buffer.add([{'n': i, 'bad': i == 5} for i in range(50)])
+
+    assert buffer.flush() == 49
+    assert len(table.rows) == 49
+    assert buffer.stats()['dropped'] == 1
@@ -0,0 +1,89 @@
+"""Review agent bulk generation (api/review-agent.py): cache and save accounting"""
+
+import pytest
+
+from conftest import load_handler_module
+
+USER = '6f1c1c9e-3f0a-4d55-9a57-0c2b8f0d7c11'
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    module = load_handler_module('review-agent.py')
+    calls = []
+
+    def call_gemini(self, prompt, max_tokens, json_mode=False):
+        calls.append(prompt)
+        return f'Thanks! (reply {len(calls)})', {'prompt_tokens': 10, 'output_tokens': 5}
+
+    monkeypatch.setattr(module.ReviewAgent, '_call_gemini', call_gemini)
+    agent = module.ReviewAgent()
+    agent.gemini_calls = calls
+    return agent
+
+
+def review(review_id, text, rating=5):
+    return {'review_id': review_id, 'platform': 'google', 'text': text, 'rating': rating}
+
+
+def test_in_request_duplicates_are_not_cache_hits(agent):
+    reviews = [review('g1', 'Great food!'), review('g2', 'great food'), review('g3', 'Slow service', 2)]
+
+    summary = agent.bulk_generate(reviews, 'Cafe')
+
+    assert len(agent.gemini_calls) == 2
+    assert summary['cache_hits'] == 0 and summary['duplicates'] == 1
+    assert summary['responses'][1]['duplicate'] is True
+    assert summary['responses'][1]['ai_response'] == summary['responses'][0]['ai_response']
+
+
+def test_replies_from_review_cache_are_cache_hits(agent):
+    agent.bulk_generate([review('g1', 'Great food!')], 'Cafe')
+
+    summary = agent.bulk_generate(
+        [review('g2', 'Great food!'), review('g3', 'GREAT FOOD'), review('g4', 'Cold coffee', 3)], 'Cafe')
+
+    assert len(agent.gemini_calls) == 2
+    assert summary['cache_hits'] == 2 and summary['duplicates'] == 0
+    assert [r.get('cached', False) for r in summary['responses']] == [True, True, False]
+
+
+class ReviewResponses:
+    """Fake PostgREST insert into review_responses with its unique constraint"""
+
+    def __init__(self, existing=()):
+        self.keys = set(existing)
+
+    def post(self, path, json_body=None, headers=None):
+        assert 'return=representation' in headers['Prefer']
+        written = []
+        for row in json_body if isinstance(json_body, list) else [json_body]:
+            key = (row['platform'], row['review_id'])
+            if key not in self.keys:
+                self.keys.add(key)
+                written.append({'platform': row['platform'], 'review_id': row['review_id']})
+        return type('Response', (), {'json': lambda _: written})()
+
+
+def test_conflicting_rows_are_reported_skipped_not_saved(agent):
+    agent.db = ReviewResponses(existing={('google', 'g2')})
+    reviews = [review('g1', 'Great food!'), review('g2', 'Lovely staff'), review('g3', 'Slow service', 2)]
+
+    summary = agent.bulk_generate(reviews, 'Cafe', user_id=USER)
+
+    first, second, third = summary['responses']
+    assert first['saved'] and third['saved']
+    assert second['saved'] is False and second['skipped'] is True
+    assert second['save_error'] == 'Already saved (duplicate review)'
+    assert summary['saved_count'] == 2 and summary['skipped_count'] == 1
+    assert summary['saved'] is False
+
+
+def test_rows_repeated_within_one_insert_are_written_once(agent):
+    agent.db = ReviewResponses()
+    reviews = [review('g1', 'Great food!'), review('g1', 'Great food!')]
+
+    summary = agent.bulk_generate(reviews, 'Cafe', user_id=USER)
+
+    assert [r['saved'] for r in summary['responses']] == [True, False]
+    assert summary['skipped_count'] == 1
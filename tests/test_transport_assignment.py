@@ -0,0 +1,32 @@
+"""Capacity-aware batch assignment (api/_lib/transport/assignment.py)"""
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from _lib.transport import assignment  # noqa: E402
+
+
+def test_exact_plan_respects_free_seats():
+    # Both trips prefer driver 0, who has one seat
+    pairs = [(0, 0, 90.0), (0, 1, 80.0), (1, 0, 85.0), (1, 1, 40.0)]
+
+    plan, solver, reason = assignment.assign_trips(pairs, {0: 1, 1: 1}, 1000, 10_000)
+
+    assert solver == 'hungarian' and reason is None
+    assert plan == {0: 1, 1: 0}
+
+
+def test_group_too_large_for_budget_is_planned_greedily(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('exact solver started despite the size estimate')
+
+    monkeypatch.setattr(assignment, 'exact_assignment', fail)
+    monkeypatch.setattr(assignment, 'estimated_solve_ms', lambda trips, cells: 10_000.0)
+    pairs = [(0, 0, 90.0), (1, 0, 85.0), (1, 1, 40.0)]
+
+    plan, solver, reason = assignment.assign_trips(pairs, {0: 1, 1: 1}, 1000, 10_000)
+
+    assert solver == 'greedy'
+    assert 'too large for the remaining budget' in reason
+    assert plan == {0: 0, 1: 1}
@@ -0,0 +1,34 @@
+"""Compiled compatibility bitmasks (api/_lib/transport/fleet.py)"""
+
+from conftest import make_fleet, make_trip
+
+from _lib.transport import fleet
+
+
+def test_unknown_trip_vehicle_types_do_not_allocate_bits(optimizer):
+    allocated = dict(fleet._vehicle_type_bits)
+    driver = make_fleet(1)[0]
+    driver["status"], driver["currentLoad"] = "available", 0
+
+    for i in range(100):
+        trip = make_trip(i)
+        trip["requirements"]["vehicleType"] = f"hovercraft-{i}"
+        mask = fleet.compile_trip(trip)
+
+        assert mask & fleet.UNKNOWN_VEHICLE_TYPE
+        assert optimizer.is_compatible(driver, trip) == (False, [f"Vehicle doesn't support hovercraft-{i}"])
+
+    assert fleet._vehicle_type_bits == allocated
+
+
+def test_precompiled_masks_agree_with_compiling_per_pair(optimizer):
+    drivers = make_fleet(200)
+    store = fleet.FleetStore(drivers)
+    for seed in range(5):
+        trip = make_trip(seed)
+        trip_mask = fleet.compile_trip(trip)
+        for row, driver in enumerate(drivers):
+            assert (
+                optimizer.is_compatible(driver, trip, store.mask[row], trip_mask)
+                == optimizer.is_compatible(driver, trip)
+            )
@@ -0,0 +1,51 @@
+"""Spatially pruned find_matches against a full-fleet scan"""
+
+import pytest
+
+from conftest import NOW, make_fleet, make_trip
+
+
+def full_scan(optimizer, drivers, trip, limit):
+    matches = sorted(
+        (optimizer.calculate_driver_match(d, trip, NOW) for d in drivers),
+        key=lambda m: m['score'], reverse=True
+    )
+    return matches[:limit]
+
+
+@pytest.mark.parametrize('size,spread', [(1000, 1.5), (3000, 1.5), (200, 3.0)])
+@pytest.mark.parametrize('radius', [2.0, 10.0])
+def test_best_match_matches_full_scan(optimizer, size, spread, radius):
+    drivers = make_fleet(size, spread=spread)
+    optimizer.load_fleet(drivers)
+
+    for seed in range(20):
+        trip = make_trip(seed)
+        matches, scored = optimizer.find_matches(trip, None, NOW, radius_miles=radius)
+        expected = full_scan(optimizer, drivers, trip, 1)[0]
+
+        assert matches[0]['driverId'] == expected['driverId']
+        assert matches[0]['score'] == expected['score']
+        assert scored <= size
+
+
+@pytest.mark.parametrize('limit', [1, 5, 20])
+def test_top_matches_match_full_scan(optimizer, limit):
+    drivers = make_fleet(2000)
+    optimizer.load_fleet(drivers)
+
+    for seed in range(20):
+        trip = make_trip(seed)
+        matches, _ = optimizer.find_matches(trip, limit, NOW)
+        expected = full_scan(optimizer, drivers, trip, limit)
+
+        assert [(m['driverId'], m['score']) for m in matches] == \
+            [(m['driverId'], m['score']) for m in expected]
+
+
+def test_pruning_scores_fewer_drivers_in_a_dense_fleet(optimizer):
+    optimizer.load_fleet(make_fleet(5000, spread=0.5))
+
+    _, scored = optimizer.find_matches(make_trip(1), 5, NOW)
+
+    assert scored < 5000
@@ -0,0 +1,40 @@
+"""Vectorized scorer (api/_lib/transport/scoring.py) against the scalar calculate_driver_match"""
+
+import pytest
+
+from conftest import NOW, make_fleet, make_trip
+
+np = pytest.importorskip('numpy')
+
+from _lib.transport.scoring import FleetArrays, rank_fleet, score_fleet  # noqa: E402
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_scores_match_scalar_path(optimizer, seed):
+    drivers = make_fleet(500, seed=seed)
+    trip = make_trip(seed)
+    scored = score_fleet(FleetArrays(drivers), trip, NOW)
+
+    for i, driver in enumerate(drivers):
+        match = optimizer.calculate_driver_match(driver, trip, NOW)
+        assert scored['compatible'][i] == match['compatible']
+        assert scored['score'][i] == match['score']
+        if match['compatible']:
+            assert scored['distance'][i] == match['distance']
+            assert scored['proximityScore'][i] == match['breakdown']['proximityScore']
+            assert scored['timeWindowScore'][i] == match['breakdown']['timeWindowScore']
+            assert scored['loadBalanceScore'][i] == match['breakdown']['loadBalanceScore']
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_rank_fleet_matches_sorted_scalar_scores(optimizer, seed):
+    drivers = make_fleet(300, seed=seed)
+    trip = make_trip(seed)
+    scalar = sorted(
+        (optimizer.calculate_driver_match(d, trip, NOW) for d in drivers),
+        key=lambda m: m['score'], reverse=True
+    )
+
+    top = rank_fleet(FleetArrays(drivers), trip, 10, NOW)
+
+    assert [drivers[i]['id'] for i in top] == [m['driverId'] for m in scalar[:10]]
@@ -0,0 +1,40 @@
+"""Live fleet state (api/_lib/transport/state.py)"""
+
+import pytest
+
+from conftest import NOW, make_fleet, make_trip
+
+from _lib.transport.state import FleetState
+
+
+def fleet_shape(fleet):
+    snapshot = fleet.snapshot()
+    return len(fleet.store), dict(fleet.rows), len(fleet.index), len(snapshot), fleet.version
+
+
+@pytest.mark.parametrize('driver', [
+    {'id': 'x'},
+    {'id': 'x', 'status': 'available', 'location': {'lat': 40.0}},
+    {**make_fleet(1)[0], 'id': 'x', 'currentLoad': 'one'},
+    {**make_fleet(1)[0], 'id': 'x', 'vehicle': {'type': 'standard', 'oxygenEquipped': False, 'capacity': 2}},
+    'not a driver',
+])
+def test_malformed_add_leaves_the_fleet_unchanged(optimizer, driver):
+    fleet = FleetState(make_fleet(4))
+    before = fleet_shape(fleet)
+
+    with pytest.raises(ValueError):
+        fleet.apply({'type': 'add', 'driver': driver})
+
+    assert fleet_shape(fleet) == before
+    optimizer.find_matches(make_trip(1), None, NOW, radius_miles=0.01, fleet=fleet.snapshot())
+
+
+def test_add_after_a_rejected_add_gets_the_next_row():
+    fleet = FleetState(make_fleet(4))
+    with pytest.raises(ValueError):
+        fleet.apply({'type': 'add', 'driver': {'id': 'x'}})
+
+    fleet.apply({'type': 'add', 'driver': {**make_fleet(1)[0], 'id': 'x'}})
+
+    assert len(fleet.store) == 5 and fleet.rows['x'] == 4 and len(fleet.index) == 5